@@ -42,6 +42,18 @@ BACKEND_ALLOCATOR_MODULE = "synnefo.logic.allocators.default_allocator"
 # Refresh backend statistics timeout, in minutes, used in backend allocation
 BACKEND_REFRESH_MIN = 15
 
+# Seconds to wait for the Ganeti RAPI of a backend before giving up on a
+# request, or None to wait forever (the behaviour before this setting was
+# introduced). Each pooled RAPI client keeps its connections open across
+# requests.
+GANETI_RAPI_TIMEOUT = 60
+# Times to retry a RAPI GET request that failed to connect or timed out,
+# waiting GANETI_RAPI_RETRY_BACKOFF seconds before the first retry and
+# twice as long before each following one. Job submissions are never
+# retried.
+GANETI_RAPI_RETRIES = 3
+GANETI_RAPI_RETRY_BACKOFF = 0.5
+
 # Maximum number of NICs per Ganeti instance. This value must be less or equal
 # than 'max:nic-count' option of Ganeti's ipolicy.
 GANETI_MAX_NICS_PER_INSTANCE = 8
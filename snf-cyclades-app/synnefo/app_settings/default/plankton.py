@@ -6,6 +6,12 @@
 # Backend settings
 BACKEND_DB_CONNECTION = 'sqlite:////usr/share/synnefo/pithos/backend.db'
 PITHOS_BACKEND_POOL_SIZE = 8
+# Database connections kept in a pool shared by all backend instances,
+# checked out per transaction. Set to 0 for a connection per instance.
+PITHOS_BACKEND_DB_POOL_SIZE = 0
+PITHOS_BACKEND_DB_POOL_MAX_OVERFLOW = 10
+PITHOS_BACKEND_DB_POOL_RECYCLE = 3600
+PITHOS_BACKEND_DB_POOL_PRE_PING = True
 
 # The Pithos container where images will be stored by default
 DEFAULT_PLANKTON_CONTAINER = 'images'
@@ -27,3 +33,11 @@ PITHOS_BACKEND_XSEG_POOL_SIZE = 8
 
 # The maximum interval (in seconds) for consequent backend object map checks
 PITHOS_BACKEND_MAP_CHECK_INTERVAL = 1
+
+# The maximum amount of memory (in bytes) each process may use
+# to cache recently read image blocks. Set to 0 to disable the cache.
+PITHOS_BACKEND_BLOCK_CACHE_SIZE = 0
+
+# The maximum number of paths whose permissions each process may
+# cache across requests. Set to 0 to disable the cache.
+PITHOS_BACKEND_PERMISSIONS_CACHE_SIZE = 0
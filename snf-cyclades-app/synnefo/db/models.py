@@ -119,6 +119,11 @@ class Backend(models.Model):
                                             null=False)
     ctotal = models.PositiveIntegerField('Total number of logical processors',
                                          default=0, null=False)
+    # Watermarks of the incremental reconciliation of servers: the latest
+    # modification time of the reconciled Ganeti instances and the time of
+    # the last full reconciliation
+    reconciliation_mtime = models.DateTimeField(null=True)
+    full_reconciliation_time = models.DateTimeField(null=True)
 
     HYPERVISORS = (
         ("kvm", "Linux KVM hypervisor"),
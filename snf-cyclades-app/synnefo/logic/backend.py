@@ -1258,6 +1258,19 @@ def get_jobs(backend, bulk=True):
         return c.GetJobs(bulk=bulk)
 
 
+def query(backend, what, fields, qfilter=None):
+    """Query the Ganeti backend for some fields of its resources.
+
+    Return a list of dictionaries, one for each resource of type 'what'
+    that matches the query filter, mapping the fields to their values.
+
+    """
+    with pooled_rapi_client(backend) as c:
+        result = c.Query(what, fields, qfilter)
+    return [dict(zip(fields, [value for _, value in row]))
+            for row in result["data"]]
+
+
 def get_physical_resources(backend):
     """ Get the physical resources of a backend.
 
@@ -39,6 +39,8 @@ import time
 import json
 import socket
 import traceback
+import threading
+import Queue
 import daemon
 import daemon.runner
 from lockfile import LockTimeout
@@ -69,6 +71,16 @@ LOGGERS = [log, log_amqp, log_logic]
 DISPATCHER_RECONNECT_TIMEOUT = 600
 
 
+# Messages handled by each worker, before the acknowledgments of the ones
+# processed are sent.
+PREFETCH_PER_WORKER = 5
+# Progress messages are small and the superseded ones are dropped, so more
+# of them are fetched to be coalesced.
+PROGRESS_PREFETCH_PER_WORKER = 25
+# Seconds between sending the acknowledgments of messages processed by
+# workers, while waiting for new messages.
+WORKERS_ACK_INTERVAL = 0.1
+
 # Time out after S Seconds while waiting messages from Ganeti clusters to
 # arrive. Warning: During this period snf-dispatcher will not consume any other
 # messages.
@@ -87,13 +99,183 @@ def get_hostname():
     return socket.gethostbyaddr(socket.gethostname())[0]
 
 
+def get_connection(client):
+    """Return the broker connection currently used by an AMQP client.
+
+    The AMQP clients transparently replace their connection when they
+    reconnect after a connection error.
+    """
+    return (getattr(client, "client", None) or
+            getattr(client, "connection", None))
+
+
+class WorkerClient(object):
+    """AMQP client stand-in for the callbacks run by MessageWorkers.
+
+    The acknowledgments of the callbacks are queued, to be sent by the
+    dispatcher thread.
+    """
+
+    def __init__(self, results, generation):
+        self.results = results
+        self.generation = generation
+
+    def basic_ack(self, message):
+        self.results.put((self.generation, "basic_ack", message, {}))
+
+    def basic_nack(self, message):
+        self.results.put((self.generation, "basic_nack", message, {}))
+
+    def basic_reject(self, message, requeue=False):
+        self.results.put((self.generation, "basic_reject", message,
+                          {"requeue": requeue}))
+
+
+class MessageWorkers(object):
+    """Threads processing the messages from the Ganeti clusters.
+
+    Each message is assigned to a worker by hashing the instance (or
+    network, or cluster) it refers to. So the messages about the same
+    instance are processed one at a time, in the order they were received,
+    while the messages about different instances are processed in parallel.
+
+    Image copy progress messages that are superseded by a newer one for the
+    same instance, waiting for the same worker, are dropped.
+
+    The AMQP client is not thread-safe, so the acknowledgments of the
+    workers are sent by the dispatcher thread, which owns the connection,
+    when it calls flush().
+
+    Delivery tags are valid only on the connection that delivered the
+    messages. When the AMQP client reconnects, the acknowledgments that
+    have not been sent are dropped and the messages waiting for the
+    workers are discarded, since the broker will deliver them again.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.generation = 0
+        self.connection = None
+        self.results = Queue.Queue()
+        # The latest progress message received for each instance
+        self.progress = {}
+        self.progress_serial = 0
+        self.progress_lock = threading.Lock()
+        self.queues = [Queue.Queue() for i in range(size)]
+        for queue in self.queues:
+            worker = threading.Thread(target=self._work, args=(queue,))
+            worker.daemon = True
+            worker.start()
+
+    def _work(self, queue):
+        while True:
+            callback, client, message, key, serial = queue.get()
+            if client.generation != self.generation:
+                continue  # the message will be redelivered
+            try:
+                if serial is not None and self._superseded(key, serial):
+                    log.debug("Dropping superseded progress message %s",
+                              message)
+                    client.basic_ack(message)
+                    continue
+                # See Dispatcher.wait()
+                close_connection()
+                callback(client, message)
+            except Exception as e:
+                log.exception("Caught unexpected exception: %s", e)
+
+    def _superseded(self, key, serial):
+        with self.progress_lock:
+            if self.progress.get(key) != serial:
+                return True
+            del self.progress[key]
+            return False
+
+    @staticmethod
+    def get_message_key(body):
+        return (body.get("instance") or body.get("network") or
+                body.get("cluster"))
+
+    def consumer(self, callback):
+        """Return a callback submitting the messages to the workers."""
+        def submit(client, message):
+            self.check_connection(client)
+            try:
+                body = json.loads(message["body"])
+                key = self.get_message_key(body)
+            except Exception:
+                # Let the callback handle the malformed message
+                body, key = {}, None
+            serial = None
+            if key is not None and body.get("type") == "image-copy-progress":
+                with self.progress_lock:
+                    self.progress_serial += 1
+                    serial = self.progress[key] = self.progress_serial
+            queue = self.queues[hash(key) % self.size]
+            client = WorkerClient(self.results, self.generation)
+            queue.put((callback, client, message, key, serial))
+        return submit
+
+    def flush(self, client):
+        """Send the acknowledgments of the messages processed."""
+        while True:
+            # Sending an acknowledgment may reconnect the client
+            self.check_connection(client)
+            try:
+                generation, method, message, kwargs = \
+                    self.results.get_nowait()
+            except Queue.Empty:
+                return
+            if generation != self.generation:
+                continue  # the message will be redelivered
+            getattr(client, method)(message, **kwargs)
+
+    def check_connection(self, client):
+        """Reset the workers if the client has reconnected."""
+        connection = get_connection(client)
+        if connection is self.connection:
+            return
+        if self.connection is not None:
+            log.info("AMQP client reconnected. Discarding the messages"
+                     " received from the previous connection")
+            self.reset()
+        self.connection = connection
+
+    def reset(self):
+        """Forget the messages received before reconnecting."""
+        self.generation += 1
+        for queue in self.queues:
+            while True:
+                try:
+                    queue.get_nowait()
+                except Queue.Empty:
+                    break
+        with self.progress_lock:
+            self.progress.clear()
+
+
 class Dispatcher:
     debug = False
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, workers=1):
         self.debug = debug
+        # With more than one worker, messages are processed by worker
+        # threads instead of the thread waiting for them.
+        self.workers = MessageWorkers(workers) if workers > 1 else None
         self._init()
 
+    def _wait_workers(self, timeout):
+        """Wait for a message, sending the acknowledgments of the workers
+           in the meantime. Return None after timeout seconds.
+        """
+        start = time.time()
+        while time.time() - start < timeout:
+            self.workers.flush(self.client)
+            msg = self.client.basic_wait(timeout=WORKERS_ACK_INTERVAL)
+            if msg:
+                return msg
+        return None
+
     def wait(self):
         log.info("Waiting for messages..")
         timeout = DISPATCHER_RECONNECT_TIMEOUT
@@ -105,12 +287,17 @@ class Dispatcher:
                 # the dispatcher to recover from broken connections
                 # gracefully.
                 close_connection()
-                msg = self.client.basic_wait(timeout=timeout)
+                if self.workers is None:
+                    msg = self.client.basic_wait(timeout=timeout)
+                else:
+                    msg = self._wait_workers(timeout)
                 if not msg:
                     log.warning("Idle connection for %d seconds. Will connect"
                                 " to a different host. Verify that"
                                 " snf-ganeti-eventd is running!!", timeout)
                     self.client.reconnect(timeout=1)
+                    if self.workers is not None:
+                        self.workers.check_connection(self.client)
             except select.error as e:
                 if e[0] != errno.EINTR:
                     log.exception("Caught unexpected exception: %s", e)
@@ -122,6 +309,8 @@ class Dispatcher:
                 log.exception("Caught unexpected exception: %s", e)
 
         log.info("Clean up AMQP connection before exit")
+        if self.workers is not None:
+            self.workers.flush(self.client)
         self.client.basic_cancel(timeout=1)
         self.client.close(timeout=1)
 
@@ -162,9 +351,18 @@ class Dispatcher:
             self.client.queue_bind(queue=queue, exchange=exchange,
                                    routing_key=routing_key)
 
+            if self.workers is None:
+                prefetch_count = PREFETCH_PER_WORKER
+            else:
+                callback = self.workers.consumer(callback)
+                if queue == queues.QUEUE_PROGRESS:
+                    prefetch_count = PROGRESS_PREFETCH_PER_WORKER
+                else:
+                    prefetch_count = PREFETCH_PER_WORKER
+                prefetch_count *= self.workers.size
             self.client.basic_consume(queue=binding[0],
                                       callback=callback,
-                                      prefetch_count=5)
+                                      prefetch_count=prefetch_count)
 
             queue_dl = queues.convert_queue_to_dead(queue)
             exchange_dl = queues.convert_exchange_to_dead(exchange)
@@ -279,6 +477,12 @@ def parse_arguments(args):
                       default=default_pid_file,
                       help=("Location of PID file (default: %s)"
                             % default_pid_file))
+    parser.add_option("-w", "--workers", dest="workers", type="int",
+                      default=1,
+                      help=("Number of threads processing the messages."
+                            " Messages about the same instance are always"
+                            " processed in order, by the same thread"
+                            " (default: 1)"))
     parser.add_option("--purge-queues", action="store_true",
                       default=False, dest="purge_queues",
                       help="Remove all queues (DANGEROUS!)")
@@ -450,13 +654,13 @@ def get_user_confirmation():
     return True
 
 
-def debug_mode():
-    disp = Dispatcher(debug=True)
+def debug_mode(opts):
+    disp = Dispatcher(debug=True, workers=opts.workers)
     disp.wait()
 
 
 def daemon_mode(opts):
-    disp = Dispatcher(debug=False)
+    disp = Dispatcher(debug=False, workers=opts.workers)
     disp.wait()
 
 
@@ -508,7 +712,7 @@ def main():
 
     # Debug mode, process messages without daemonizing
     if opts.debug:
-        debug_mode()
+        debug_mode(opts)
         return
 
     # Create pidfile,
@@ -20,15 +20,15 @@ the state of the Ganeti backend. See docstring on top of
 logic/reconciliation.py for a description of reconciliation rules.
 
 """
-import sys
 import logging
-import subprocess
+from datetime import timedelta
 from optparse import make_option
 
+from django.core.management.base import CommandError
 from snf_django.management.commands import SynnefoCommand
 from synnefo.management.common import get_resource
 from synnefo.logic import reconciliation
-from snf_django.management.utils import parse_bool
+from snf_django.management.utils import parse_bool, pprint_table
 
 
 class Command(SynnefoCommand):
@@ -45,6 +45,30 @@ class Command(SynnefoCommand):
                     metavar="True|False",
                     help="Perform server reconciliation for each backend"
                          " parallel."),
+        make_option("--concurrency",
+                    dest="concurrency",
+                    default=8,
+                    type="int",
+                    help="Maximum number of backends to reconcile at the"
+                         " same time, when running in parallel. The state"
+                         " of all backends is always fetched in parallel."
+                         " Default: %default"),
+        make_option("--incremental",
+                    dest="incremental",
+                    action="store_true",
+                    default=False,
+                    help="Perform incremental reconciliation. Only the"
+                         " servers that have changed since the last"
+                         " reconciliation of each backend are examined,"
+                         " unless a full reconciliation is due."),
+        make_option("--full-interval",
+                    dest="full_interval",
+                    default=24,
+                    type="int",
+                    metavar="HOURS",
+                    help="Interval between full reconciliations of a"
+                         " backend, when running in incremental mode."
+                         " Default: %default"),
         make_option('--fix-stale', action='store_true', dest='fix_stale',
                     default=False, help='Fix (remove) stale DB entries in DB'),
         make_option('--fix-orphans', action='store_true', dest='fix_orphans',
@@ -82,15 +106,12 @@ class Command(SynnefoCommand):
             backends = reconciliation.get_online_backends()
 
         parallel = parse_bool(options["parallel"])
-        if parallel and len(backends) > 1:
-            cmd = sys.argv
-            processes = []
-            for backend in backends:
-                p = subprocess.Popen(cmd + ["--backend-id=%s" % backend.id])
-                processes.append(p)
-            for p in processes:
-                p.wait()
-            return
+        concurrency = options["concurrency"]
+        if concurrency < 1:
+            raise CommandError("--concurrency must be a positive integer")
+        if not parallel:
+            concurrency = 1
+        options["full_interval"] = timedelta(hours=options["full_interval"])
 
         verbosity = int(options["verbosity"])
 
@@ -102,7 +123,7 @@ class Command(SynnefoCommand):
         log_handler.setFormatter(formatter)
         if verbosity == 2:
             formatter =\
-                logging.Formatter("%(asctime)s [%(process)d]: %(message)s")
+                logging.Formatter("%(asctime)s [%(threadName)s]: %(message)s")
             log_handler.setFormatter(formatter)
             logger.setLevel(logging.DEBUG)
         elif verbosity == 1:
@@ -114,8 +135,26 @@ class Command(SynnefoCommand):
 
         self._process_args(options)
 
-        for backend in backends:
-            r = reconciliation.BackendReconciler(backend=backend,
-                                                 logger=logger,
-                                                 options=options)
-            r.reconcile()
+        results = reconciliation.reconcile_backends(backends, logger=logger,
+                                                    options=options,
+                                                    concurrency=concurrency)
+        if verbosity > 0:
+            self.print_summary(results)
+
+    def print_summary(self, results):
+        kinds = ("stale", "orphan") + reconciliation.UNSYNCED_KINDS
+        headers = ("backend", "mode") + kinds
+        table = []
+        totals = dict((kind, 0) for kind in kinds)
+        for backend, summary in results:
+            if summary is None:
+                table.append((backend.clustername, "-") +
+                             ("FAILED",) * len(kinds))
+                continue
+            table.append((backend.clustername, summary["mode"]) +
+                         tuple(summary[kind] for kind in kinds))
+            for kind in kinds:
+                totals[kind] += summary[kind]
+        table.append(("total", "-") + tuple(totals[kind] for kind in kinds))
+        self.stdout.write("\n")
+        pprint_table(self.stdout, table, headers, title="Summary")
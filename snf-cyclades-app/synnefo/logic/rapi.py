@@ -167,9 +167,13 @@ class GanetiRapiClient(object): # pylint: disable=R0904
   _json_encoder = simplejson.JSONEncoder(sort_keys=True)
 
   def __init__(self, host, port=GANETI_RAPI_PORT,
-               username=None, password=None, logger=logging):
+               username=None, password=None, logger=logging,
+               timeout=None, retries=0, retry_backoff=0.5):
     """Initializes this class.
 
+    Requests are sent over a persistent session, so that connections to
+    the cluster master are reused for as long as the client lives.
+
     @type host: string
     @param host: the ganeti cluster master to interact with
     @type port: int
@@ -179,6 +183,14 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     @type password: string
     @param password: the password to connect with
     @param logger: Logging object
+    @type timeout: float
+    @param timeout: seconds to wait for the server (default is no timeout)
+    @type retries: int
+    @param retries: times to retry a GET request that failed to connect
+      or timed out
+    @type retry_backoff: float
+    @param retry_backoff: seconds to wait before the first retry, doubled
+      before each following one
 
     """
     self._logger = logger
@@ -191,6 +203,10 @@ class GanetiRapiClient(object): # pylint: disable=R0904
       raise Error("Specified password without username")
 
     self._auth = (username, password)
+    self._timeout = timeout
+    self._retries = retries
+    self._retry_backoff = retry_backoff
+    self._session = requests.session()
 
   def _SendRequest(self, method, path, query, content):
     """Sends an HTTP request.
@@ -231,10 +247,26 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     self._logger.debug("Sending request %s %s (query=%r) (content=%r)",
                        method, url, query, encoded_content)
 
-    req_method = getattr(requests, method.lower())
-    r = req_method(url, auth=self._auth, headers=headers, params=query,
-                   data=encoded_content, verify=False)
-
+    # Only GET requests are retried, since the others submit jobs that
+    # may have been accepted before the connection failed.
+    retries = self._retries if method == HTTP_GET else 0
+    attempt = 0
+    while True:
+      try:
+        r = self._session.request(method, url, auth=self._auth,
+                                  headers=headers, params=query,
+                                  data=encoded_content, verify=False,
+                                  timeout=self._timeout)
+        break
+      except (requests.exceptions.ConnectionError,
+              requests.exceptions.Timeout), err:
+        if attempt >= retries:
+          raise
+        delay = self._retry_backoff * 2 ** attempt
+        attempt += 1
+        self._logger.warning("Request %s %s failed (%s), retrying in %.1fs",
+                             method, url, err, delay)
+        time.sleep(delay)
 
     http_code = r.status_code
     if r.content is not None:
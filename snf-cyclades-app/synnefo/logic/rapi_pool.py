@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from django.conf import settings
 from objpool import ObjectPool
 from synnefo.logic.rapi import GanetiRapiClient
 
@@ -38,7 +39,11 @@ class GanetiRapiClientPool(ObjectPool):
 
     def _pool_create(self):
         log.debug("CREATE: Creating new client from pool %r", self)
-        client = GanetiRapiClient(self.host, self.port, self.user, self.passwd)
+        client = GanetiRapiClient(
+            self.host, self.port, self.user, self.passwd,
+            timeout=settings.GANETI_RAPI_TIMEOUT,
+            retries=settings.GANETI_RAPI_RETRIES,
+            retry_backoff=settings.GANETI_RAPI_RETRY_BACKOFF)
         client._pool = self
         return client
 
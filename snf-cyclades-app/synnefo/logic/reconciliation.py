@@ -35,17 +35,28 @@ In the code, D, G are Python dicts mapping instance ids to operating state.
 For D, the operating state is chosen from VirtualMachine.OPER_STATES.
 For G, the operating state is True if the machine is up, False otherwise.
 
+In incremental mode, only the name, the operating state and the modification
+time of the Ganeti instances are fetched. The full state is fetched, and the
+rules are checked, only for the instances that were modified after the last
+reconciliation of the backend, whose operating state differs from the DB, or
+whose server is building or has a pending task. Only the Ganeti jobs that
+these servers refer to are fetched. A full reconciliation is performed
+periodically.
+
 """
 
 
 from django.conf import settings
 
+import sys
+import Queue
 import logging
+import threading
 import itertools
 import bitarray
 from datetime import datetime, timedelta
 
-from django.db import transaction
+from django.db import transaction, close_connection
 from synnefo.db.models import (Backend, VirtualMachine, Flavor,
                                pooled_rapi_client, Network,
                                BackendNetwork, BridgePoolTable,
@@ -59,6 +70,22 @@ logging.basicConfig()
 
 BUILDING_NIC_TIMEOUT = timedelta(seconds=120)
 
+# Kinds of unsynced servers reported in the summary of the reconciliation
+UNSYNCED_KINDS = ("operstate", "flavor", "nics", "disks", "pending_task")
+
+# Option that fixes each kind of server found out of sync
+FIX_OPTIONS = {"stale": "fix_stale",
+               "orphan": "fix_orphans",
+               "operstate": "fix_unsynced",
+               "flavor": "fix_unsynced_flavors",
+               "nics": "fix_unsynced_nics",
+               "disks": "fix_unsynced_disks",
+               "pending_task": "fix_pending_tasks"}
+
+# Default interval between full reconciliations of a backend in incremental
+# mode
+FULL_RECONCILIATION_INTERVAL = timedelta(hours=24)
+
 
 class BackendReconciler(object):
     def __init__(self, backend, logger, options=None):
@@ -73,30 +100,148 @@ class BackendReconciler(object):
     def close(self):
         self.backend.put_client(self.client)
 
-    @transaction.commit_on_success
-    def reconcile(self):
-        log = self.log
-        backend = self.backend
-        log.debug("Reconciling backend %s", backend)
+    def fetch(self):
+        """Get the state of the backend from the DB and from Ganeti.
 
+        The instances and the jobs of the Ganeti backend are fetched in
+        parallel with the servers of the DB.
+
+        """
         self.event_time = datetime.now()
+        self.incremental = (self.options.get("incremental", False) and
+                            not self.full_reconciliation_due())
+        if self.incremental:
+            self.fetch_incremental()
+            return
+
+        log = self.log
+        backend = self.backend
+        gnt_servers = Task(get_ganeti_servers, backend)
+        gnt_jobs = Task(get_ganeti_jobs, backend)
 
         self.db_servers = get_database_servers(backend)
         self.db_servers_keys = set(self.db_servers.keys())
         log.debug("Got servers info from database.")
 
-        self.gnt_servers = get_ganeti_servers(backend)
+        self.gnt_servers = gnt_servers.wait()
         self.gnt_servers_keys = set(self.gnt_servers.keys())
         log.debug("Got servers info from Ganeti backend.")
 
-        self.gnt_jobs = get_ganeti_jobs(backend)
+        self.gnt_jobs = gnt_jobs.wait()
         log.debug("Got jobs from Ganeti backend")
 
+        self.gnt_mtime = max([s["updated"] for s in self.gnt_servers.values()]
+                             or [None])
+
+    def full_reconciliation_due(self):
+        last_time = self.backend.full_reconciliation_time
+        if last_time is None or self.backend.reconciliation_mtime is None:
+            return True
+        interval = self.options.get("full_interval",
+                                    FULL_RECONCILIATION_INTERVAL)
+        return self.event_time - last_time >= interval
+
+    def fetch_incremental(self):
+        """Get the state of the servers that may be out of sync."""
+        log = self.log
+        backend = self.backend
+        watermark = backend.reconciliation_mtime
+
+        gnt_states = Task(get_ganeti_server_states, backend)
+
+        self.db_servers = get_database_servers(backend)
+        self.db_servers_keys = set(self.db_servers.keys())
+        log.debug("Got servers info from database.")
+
+        gnt_states = gnt_states.wait()
+        self.gnt_servers_keys = set(gnt_states.keys())
+        self.gnt_mtime = max([s["updated"] for s in gnt_states.values()]
+                             or [None])
+        log.debug("Got servers state from Ganeti backend.")
+
+        changed = []
+        for server_id in self.db_servers_keys & self.gnt_servers_keys:
+            db_server = self.db_servers[server_id]
+            gnt_state = gnt_states[server_id]
+            if (gnt_state["updated"] >= watermark or
+               db_server.operstate != gnt_state["state"] or
+               db_server.operstate == "BUILD" or
+               db_server.task is not None):
+                changed.append(server_id)
+
+        job_ids = set()
+        for db_server in self.db_servers.values():
+            if db_server.operstate == "BUILD":
+                job_ids.add(db_server.backendjobid)
+            if db_server.task_job_id is not None:
+                job_ids.add(db_server.task_job_id)
+        job_ids.discard(None)
+
+        gnt_servers = Task(get_ganeti_servers, backend, changed)
+        gnt_jobs = Task(get_ganeti_jobs, backend, job_ids)
+
+        self.gnt_servers = gnt_servers.wait()
+        log.debug("Got info of %d changed servers from Ganeti backend.",
+                  len(self.gnt_servers))
+
+        self.gnt_jobs = gnt_jobs.wait()
+        log.debug("Got %d jobs from Ganeti backend", len(self.gnt_jobs))
+
+    def update_watermarks(self):
+        """Record the watermarks for the next incremental reconciliation.
+
+        The watermarks are not advanced if there are servers out of sync
+        that were not fixed, so that they are examined again.
+
+        """
+        summary = self.get_summary()
+        for kind, option in FIX_OPTIONS.items():
+            if summary[kind] and not self.options.get(option, False):
+                self.log.debug("Not updating the reconciliation watermarks"
+                               " of backend %s", self.backend)
+                return
+
+        updates = {}
+        if self.gnt_mtime is not None:
+            updates["reconciliation_mtime"] = self.gnt_mtime
+        if not self.incremental:
+            updates["full_reconciliation_time"] = self.event_time
+        if updates:
+            for field, value in updates.items():
+                setattr(self.backend, field, value)
+            Backend.objects.filter(id=self.backend.id).update(**updates)
+
+    @transaction.commit_on_success
+    def reconcile(self, fetch=True):
+        """Reconcile the DB with the state of the Ganeti backend.
+
+        If 'fetch' is False, the state that was retrieved by a previous call
+        to fetch() is used.
+
+        """
+        log = self.log
+        backend = self.backend
+        log.debug("Reconciling backend %s", backend)
+
+        if fetch:
+            self.fetch()
+
+        self.unsynced_servers = dict((kind, []) for kind in UNSYNCED_KINDS)
         self.stale_servers = self.reconcile_stale_servers()
         self.orphan_servers = self.reconcile_orphan_servers()
-        self.unsynced_servers = self.reconcile_unsynced_servers()
+        self.reconcile_unsynced_servers()
+        self.update_watermarks()
         self.close()
 
+    def get_summary(self):
+        """Return the number of servers found out of sync, by kind."""
+        summary = {"stale": len(self.stale_servers),
+                   "orphan": len(self.orphan_servers)}
+        for kind, servers in self.unsynced_servers.items():
+            summary[kind] = len(servers)
+        summary["mode"] = "incremental" if self.incremental else "full"
+        return summary
+
     def get_build_status(self, db_server):
         """Return the status of the build job.
 
@@ -160,6 +305,8 @@ class BackendReconciler(object):
                     logmsg='Reconciliation: simulated Ganeti event')
             self.log.debug("Simulated Ganeti removal for stale servers.")
 
+        return stale
+
     def reconcile_orphan_servers(self):
         orphans = self.gnt_servers_keys - self.db_servers_keys
         if orphans:
@@ -174,9 +321,12 @@ class BackendReconciler(object):
                 self.client.DeleteInstance(server_name)
             self.log.debug("Issued OP_INSTANCE_REMOVE for orphan servers.")
 
+        return orphans
+
     def reconcile_unsynced_servers(self):
         #log = self.log
-        for server_id in self.db_servers_keys & self.gnt_servers_keys:
+        # In incremental mode, only the changed Ganeti servers are fetched
+        for server_id in self.db_servers_keys & set(self.gnt_servers.keys()):
             db_server = self.db_servers[server_id]
             gnt_server = self.gnt_servers[server_id]
             if db_server.operstate == "BUILD":
@@ -206,6 +356,7 @@ class BackendReconciler(object):
     def reconcile_building_server(self, db_server):
         self.log.info("Server '%s' is BUILD in DB, but 'ERROR' in Ganeti.",
                       db_server.id)
+        self.unsynced_servers["operstate"].append(db_server.id)
         if self.options["fix_unsynced"]:
             fix_opcode = "OP_INSTANCE_CREATE"
             vm = get_locked_server(db_server.id)
@@ -222,6 +373,7 @@ class BackendReconciler(object):
         if db_server.operstate != gnt_server["state"]:
             self.log.info("Server '%s' is '%s' in DB and '%s' in Ganeti.",
                           server_id, db_server.operstate, gnt_server["state"])
+            self.unsynced_servers["operstate"].append(server_id)
             if self.options["fix_unsynced"]:
                 vm = get_locked_server(server_id)
                 # If server is in building state, you will have first to
@@ -258,6 +410,7 @@ class BackendReconciler(object):
 
             self.log.info("Server '%s' has flavor '%s' in DB and '%s' in"
                           " Ganeti", server_id, db_flavor, gnt_flavor)
+            self.unsynced_servers["flavor"].append(server_id)
             if self.options["fix_unsynced_flavors"]:
                 vm = get_locked_server(server_id)
                 old_state = vm.operstate
@@ -301,6 +454,7 @@ class BackendReconciler(object):
             gnt_nics_str = "\n\t\t".join(map(format_gnt_nic,
                                          sorted(gnt_nics_parsed.items())))
             self.log.info(msg, server_id, db_nics_str, gnt_nics_str)
+            self.unsynced_servers["nics"].append(server_id)
             if self.options["fix_unsynced_nics"]:
                 vm = get_locked_server(server_id)
                 backend_mod.process_op_status(
@@ -334,6 +488,7 @@ class BackendReconciler(object):
             gnt_disks_str = "\n\t\t".join(map(format_gnt_disk,
                                           sorted(gnt_disks_parsed.items())))
             self.log.info(msg, server_id, db_disks_str, gnt_disks_str)
+            self.unsynced_servers["disks"].append(server_id)
             if self.options["fix_unsynced_disks"]:
                 vm = get_locked_server(server_id)
                 backend_mod.process_op_status(
@@ -359,6 +514,7 @@ class BackendReconciler(object):
                 return
             self.log.info("Found server '%s' with pending task: '%s'",
                           server_id, db_server.task)
+            self.unsynced_servers["pending_task"].append(server_id)
             if self.options["fix_pending_tasks"]:
                 db_server.task = None
                 db_server.task_job_id = None
@@ -366,6 +522,114 @@ class BackendReconciler(object):
                 self.log.info("Cleared pending task for server '%s", server_id)
 
 
+class Task(threading.Thread):
+    """Run a function in a new thread.
+
+    The result of the function is returned by wait(), which re-raises any
+    exception raised by the function. The thread closes its own database
+    connection when the function returns.
+
+    """
+    def __init__(self, func, *args):
+        super(Task, self).__init__()
+        self.daemon = True
+        self.func = func
+        self.args = args
+        self.result = None
+        self.exc_info = None
+        self.start()
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            close_connection()
+
+    def wait(self):
+        self.join()
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+
+def map_in_threads(func, items, concurrency):
+    """Apply func to each of the items using up to 'concurrency' threads.
+
+    Return the results in the order of the items. With a concurrency of one,
+    the items are processed in the calling thread.
+
+    """
+    if concurrency <= 1:
+        return map(func, items)
+
+    items = list(items)
+    results = [None] * len(items)
+    queue = Queue.Queue()
+    for i, item in enumerate(items):
+        queue.put((i, item))
+
+    def worker():
+        while True:
+            try:
+                i, item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            results[i] = func(item)
+
+    workers = [Task(worker) for _ in range(min(concurrency, len(items)))]
+    for w in workers:
+        w.wait()
+    return results
+
+
+def reconcile_backends(backends, logger, options=None, concurrency=1):
+    """Reconcile servers of multiple backends.
+
+    The state of all backends is fetched in parallel, while up to
+    'concurrency' backends are reconciled at the same time. A backend that
+    fails does not affect the reconciliation of the others.
+
+    Return a list of (backend, summary) tuples, with summary being None for
+    the backends that failed.
+
+    """
+    backends = list(backends)
+    fetch_concurrency = len(backends) if concurrency > 1 else 1
+
+    def fetch(backend):
+        reconciler = None
+        try:
+            reconciler = BackendReconciler(backend=backend, logger=logger,
+                                           options=options)
+            reconciler.fetch()
+            return reconciler
+        except Exception:
+            logger.exception("Failed to get the state of backend %s",
+                             backend)
+            if reconciler is not None:
+                reconciler.close()
+            return None
+
+    def reconcile(reconciler):
+        try:
+            reconciler.reconcile(fetch=False)
+            return reconciler.get_summary()
+        except Exception:
+            logger.exception("Failed to reconcile backend %s",
+                             reconciler.backend)
+            reconciler.close()
+            return None
+
+    reconcilers = map_in_threads(fetch, backends, fetch_concurrency)
+    fetched = filter(None, reconcilers)
+    summaries = map_in_threads(reconcile, fetched, concurrency)
+    summaries = dict(zip(fetched, summaries))
+    return [(backend, summaries.get(reconciler))
+            for backend, reconciler in zip(backends, reconcilers)]
+
+
 NIC_MSG = ": %s\t".join(["ID", "State", "IP", "Network", "MAC", "Index",
                          "Firewall"]) + ": %s"
 
@@ -445,8 +709,28 @@ def get_database_servers(backend):
     return dict([(s.id, s) for s in servers])
 
 
-def get_ganeti_servers(backend):
-    gnt_instances = backend_mod.get_instances(backend)
+# The fields of Ganeti instances that are used by the reconciliation. These
+# are the fields that are returned by the bulk listing of instances.
+INSTANCE_FIELDS = ["name", "beparams", "oper_state", "mtime", "disk.sizes",
+                   "disk.names", "disk.uuids", "nic.ips", "nic.names",
+                   "nic.macs", "nic.networks.names", "tags"]
+
+
+def get_ganeti_servers(backend, server_ids=None):
+    """Get the Synnefo servers of a Ganeti backend.
+
+    If 'server_ids' is given, only these servers are fetched.
+
+    """
+    if server_ids is None:
+        gnt_instances = backend_mod.get_instances(backend)
+    elif not server_ids:
+        return {}
+    else:
+        names = [utils.id_to_instance_name(i) for i in server_ids]
+        qfilter = ["|"] + [["=", "name", name] for name in names]
+        gnt_instances = backend_mod.query(backend, "instance",
+                                          INSTANCE_FIELDS, qfilter)
     # Filter out non-synnefo instances
     snf_backend_prefix = settings.BACKEND_PREFIX_ID
     gnt_instances = filter(lambda i: i["name"].startswith(snf_backend_prefix),
@@ -455,6 +739,27 @@ def get_ganeti_servers(backend):
     return dict([(i["id"], i) for i in gnt_instances if i["id"] is not None])
 
 
+def get_ganeti_server_states(backend):
+    """Get the operating state and modification time of Synnefo servers."""
+    gnt_instances = backend_mod.query(backend, "instance",
+                                      ["name", "oper_state", "mtime"])
+    snf_backend_prefix = settings.BACKEND_PREFIX_ID
+    states = {}
+    for instance in gnt_instances:
+        if not instance["name"].startswith(snf_backend_prefix):
+            continue
+        try:
+            instance_id = utils.id_from_instance_name(instance["name"])
+        except Exception:
+            logger.error("Ignoring instance with malformed name %s",
+                         instance["name"])
+            continue
+        states[instance_id] = {
+            "state": instance["oper_state"] and "STARTED" or "STOPPED",
+            "updated": datetime.fromtimestamp(instance["mtime"])}
+    return states
+
+
 def parse_gnt_instance(instance):
     try:
         instance_id = utils.id_from_instance_name(instance['name'])
@@ -518,8 +823,20 @@ def disks_from_instance(i):
     return disks
 
 
-def get_ganeti_jobs(backend):
-    gnt_jobs = backend_mod.get_jobs(backend)
+def get_ganeti_jobs(backend, job_ids=None):
+    """Get the jobs of a Ganeti backend.
+
+    If 'job_ids' is given, only these jobs are fetched.
+
+    """
+    if job_ids is None:
+        gnt_jobs = backend_mod.get_jobs(backend)
+    elif not job_ids:
+        return {}
+    else:
+        qfilter = ["|"] + [["=", "id", int(j)] for j in job_ids]
+        gnt_jobs = backend_mod.query(backend, "job",
+                                     ["id", "status", "end_ts"], qfilter)
     return dict([(int(j["id"]), j) for j in gnt_jobs])
 
 
@@ -4,3 +4,4 @@ from .utils_tests import *
 from .rapi_pool_tests import *
 from .reconciliation import *
 from .callbacks import *
+from .dispatcher import *
@@ -0,0 +1,129 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+import threading
+
+from django.test import TestCase
+
+from synnefo.logic.dispatcher import MessageWorkers
+
+
+class FakeAMQPClient(object):
+    """AMQP client recording the acknowledgments sent on each connection."""
+
+    def __init__(self):
+        self.client = object()
+        self.acks = []
+
+    def reconnect(self):
+        self.client = object()
+
+    def basic_ack(self, message):
+        self.acks.append((message["id"], self.client))
+
+
+def message(id, instance, type="ganeti-op-status"):
+    body = {"instance": instance, "type": type}
+    return {"id": id, "body": json.dumps(body)}
+
+
+def wait_for(condition, timeout=5):
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+class MessageWorkersTest(TestCase):
+    def setUp(self):
+        self.client = FakeAMQPClient()
+        self.processed = []
+        self.lock = threading.Lock()
+        # Set to block the callbacks
+        self.blocked = threading.Event()
+        self.blocked.set()
+
+    def callback(self, client, message):
+        self.blocked.wait()
+        with self.lock:
+            self.processed.append(message["id"])
+        client.basic_ack(message)
+
+    def submit(self, workers, messages):
+        submit = workers.consumer(self.callback)
+        for msg in messages:
+            submit(self.client, msg)
+
+    def test_ordering(self):
+        workers = MessageWorkers(4)
+        messages = [message(i, "instance-%d" % (i % 3)) for i in range(30)]
+        self.submit(workers, messages)
+        wait_for(lambda: len(self.processed) == 30)
+        for instance in range(3):
+            ids = [i for i in self.processed if i % 3 == instance]
+            self.assertEqual(ids, sorted(ids))
+
+    def test_ack_routing(self):
+        workers = MessageWorkers(2)
+        self.submit(workers, [message(i, "instance-%d" % i)
+                              for i in range(4)])
+        wait_for(lambda: len(self.processed) == 4)
+        # Acknowledgments are sent only by the thread calling flush()
+        self.assertEqual(self.client.acks, [])
+        workers.flush(self.client)
+        self.assertEqual(sorted(self.client.acks),
+                         [(i, self.client.client) for i in range(4)])
+        workers.flush(self.client)
+        self.assertEqual(len(self.client.acks), 4)
+
+    def test_reset_on_reconnect(self):
+        workers = MessageWorkers(1)
+        self.blocked.clear()
+        self.submit(workers, [message(1, "vm"), message(2, "vm")])
+        wait_for(lambda: workers.queues[0].qsize() == 1)
+        self.submit(workers, [message(3, "vm")])
+        self.client.reconnect()
+        # Message 4 is delivered by the new connection, messages 2 and 3
+        # are discarded
+        self.submit(workers, [message(4, "vm")])
+        self.blocked.set()
+        wait_for(lambda: 4 in self.processed)
+        self.assertEqual(self.processed, [1, 4])
+        workers.flush(self.client)
+        # The acknowledgment of message 1 is not valid on the new connection
+        self.assertEqual(self.client.acks, [(4, self.client.client)])
+
+    def test_superseded_progress(self):
+        workers = MessageWorkers(1)
+        self.blocked.clear()
+        self.submit(workers, [message(0, "vm")])
+        wait_for(lambda: workers.queues[0].empty())
+        progress = "image-copy-progress"
+        self.submit(workers, [message(1, "vm1", progress),
+                              message(2, "vm2", progress),
+                              message(3, "vm1", "image-info"),
+                              message(4, "vm1", progress),
+                              message(5, "vm1", progress)])
+        self.blocked.set()
+        wait_for(lambda: 5 in self.processed)
+        # Only the latest progress message of each instance is processed
+        self.assertEqual(self.processed, [0, 2, 3, 5])
+        # The dropped messages are acknowledged
+        workers.flush(self.client)
+        self.assertEqual(sorted(i for i, _ in self.client.acks), range(6))
+        self.assertEqual(workers.progress, {})
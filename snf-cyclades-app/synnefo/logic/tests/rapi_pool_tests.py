@@ -13,11 +13,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from django.conf import settings
 from django.test import TestCase
 
-from synnefo.logic import rapi_pool
+from synnefo.logic import rapi, rapi_pool
 
-from mock import patch
+from mock import Mock, call, patch
+from requests.exceptions import ConnectionError, Timeout
+
+RAPI_OPTIONS = {"timeout": settings.GANETI_RAPI_TIMEOUT,
+                "retries": settings.GANETI_RAPI_RETRIES,
+                "retry_backoff": settings.GANETI_RAPI_RETRY_BACKOFF}
 
 
 @patch('synnefo.logic.rapi_pool.GanetiRapiClient', spec=True)
@@ -25,7 +31,7 @@ class GanetiRapiPoolTest(TestCase):
     def test_new_client(self, rclient):
         cl = rapi_pool.get_rapi_client(1, 'amxixa', 'cluster0', '5080', 'user',
                                        'pass')
-        rclient.assert_called_once_with("cluster0", "5080", "user", "pass")
+        rclient.assert_called_once_with("cluster0", "5080", "user", "pass", **RAPI_OPTIONS)
         self.assertTrue('amxixa' in rapi_pool._pools)
         self.assertTrue(cl._pool is rapi_pool._pools[rapi_pool._hashes[1]])
 
@@ -38,7 +44,7 @@ class GanetiRapiPoolTest(TestCase):
     def test_get_from_pool(self, rclient):
         cl = rapi_pool.get_rapi_client(1, 'dummyhash', 'cluster1', '5080',
                                        'user', 'pass')
-        rclient.assert_called_once_with("cluster1", "5080", "user", "pass")
+        rclient.assert_called_once_with("cluster1", "5080", "user", "pass", **RAPI_OPTIONS)
         rapi_pool.put_rapi_client(cl)
         rclient.reset_mock()
         cl2 = rapi_pool.get_rapi_client(1, 'dummyhash', 'cluster1', '5080',
@@ -49,12 +55,12 @@ class GanetiRapiPoolTest(TestCase):
     def test_changed_credentials(self, rclient):
         cl = rapi_pool.get_rapi_client(1, 'dummyhash2', 'cluster2', '5080',
                                        'user', 'pass')
-        rclient.assert_called_once_with("cluster2", "5080", "user", "pass")
+        rclient.assert_called_once_with("cluster2", "5080", "user", "pass", **RAPI_OPTIONS)
         rapi_pool.put_rapi_client(cl)
         rclient.reset_mock()
         rapi_pool.get_rapi_client(1, 'dummyhash3', 'cluster2', '5080',
                                   'user', 'new_pass')
-        rclient.assert_called_once_with("cluster2", "5080", "user", "new_pass")
+        rclient.assert_called_once_with("cluster2", "5080", "user", "new_pass", **RAPI_OPTIONS)
         self.assertFalse('dummyhash2' in rapi_pool._pools)
 
     def test_no_pool(self, rclient):
@@ -63,3 +69,40 @@ class GanetiRapiPoolTest(TestCase):
         cl._pool = None
         rapi_pool.put_rapi_client(cl)
         self.assertTrue(cl not in rapi_pool._pools.values())
+
+
+@patch("synnefo.logic.rapi.time.sleep")
+class GanetiRapiClientTest(TestCase):
+    def setUp(self):
+        self.client = rapi.GanetiRapiClient("cluster0", timeout=60,
+                                            retries=3, retry_backoff=0.5)
+        self.request = self.client._session.request = Mock()
+
+    def test_timeout(self, sleep):
+        self.request.return_value = Mock(status_code=200, content="2")
+        self.assertEqual(self.client.GetVersion(), 2)
+        self.assertEqual(self.request.call_args[1]["timeout"], 60)
+        self.assertFalse(sleep.called)
+
+    def test_retry_get(self, sleep):
+        self.request.side_effect = [ConnectionError(), Timeout(),
+                                    Mock(status_code=200, content="2")]
+        self.assertEqual(self.client.GetVersion(), 2)
+        self.assertEqual(self.request.call_count, 3)
+        self.assertEqual(sleep.mock_calls, [call(0.5), call(1.0)])
+
+    def test_retries_exhausted(self, sleep):
+        self.request.side_effect = Timeout()
+        self.assertRaises(Timeout, self.client.GetVersion)
+        self.assertEqual(self.request.call_count, 4)
+        self.assertEqual(sleep.mock_calls, [call(0.5), call(1.0), call(2.0)])
+
+    def test_no_retry_job_submission(self, sleep):
+        self.request.side_effect = ConnectionError()
+        self.assertRaises(ConnectionError,
+                          self.client.RecreateInstanceDisks, "vm1")
+        self.assertRaises(ConnectionError, self.client.ModifyInstance,
+                          "vm1", beparams={"vcpus": 2})
+        self.assertEqual([c[0][0] for c in self.request.call_args_list],
+                         ["POST", "PUT"])
+        self.assertFalse(sleep.called)
@@ -19,9 +19,10 @@ from django.test import TestCase
 from synnefo.db.models import VirtualMachine, Network, BackendNetwork
 from synnefo.db import models_factory as mfactory
 from synnefo.logic import reconciliation
-from mock import patch
+from mock import Mock, patch
 from snf_django.utils.testing import mocked_quotaholder
 from time import time
+from datetime import datetime, timedelta
 from synnefo import settings
 
 
@@ -212,6 +213,175 @@ class ServerReconciliationTest(TestCase):
         self.assertEqual(nic.ipv4_address, "192.168.2.5")
         self.assertEqual(nic.mac, "aa:00:bb:cc:dd:ee")
 
+    def test_reconcile_backends(self, mrapi):
+        offline = mfactory.BackendFactory(offline=True)
+        vm1 = mfactory.VirtualMachineFactory(backend=self.backend,
+                                             deleted=False,
+                                             operstate="STARTED")
+        vm2 = mfactory.VirtualMachineFactory(backend=self.backend,
+                                             deleted=False,
+                                             operstate="STOPPED")
+        mrapi().GetInstances.return_value =\
+            [{"name": vm2.backend_vm_id,
+             "beparams": {"maxmem": 1024,
+                          "minmem": 1024,
+                          "vcpus": 4},
+             "oper_state": True,
+             "mtime": time(),
+             "disk.sizes": [],
+             "disk.names": [],
+             "disk.uuids": [],
+             "nic.ips": [],
+             "nic.names": [],
+             "nic.macs": [],
+             "nic.networks.names": [],
+             "tags": []}]
+        mrapi().GetJobs.return_value = []
+        options = dict((k, False) for k in ["fix_unsynced", "fix_stale",
+                                            "fix_orphans",
+                                            "fix_unsynced_nics",
+                                            "fix_unsynced_disks",
+                                            "fix_unsynced_flavors",
+                                            "fix_pending_tasks"])
+        results = reconciliation.reconcile_backends(
+            [self.backend, offline], logger=logging.getLogger(),
+            options=options)
+        self.assertEqual(results[1], (offline, None))
+        backend, summary = results[0]
+        self.assertEqual(backend, self.backend)
+        self.assertEqual(summary["stale"], 1)
+        self.assertEqual(summary["orphan"], 0)
+        self.assertEqual(summary["operstate"], 1)
+        # Nothing is fixed without the --fix-* options
+        vm1 = VirtualMachine.objects.get(id=vm1.id)
+        self.assertFalse(vm1.deleted)
+        vm2 = VirtualMachine.objects.get(id=vm2.id)
+        self.assertEqual(vm2.operstate, "STOPPED")
+
+    def test_reconcile_backends_concurrently(self, mrapi):
+        backends = [mfactory.BackendFactory() for i in range(4)]
+        # The state of the second backend cannot be fetched and the
+        # reconciliation of the third one fails.
+        failures = {backends[1]: "fetch", backends[2]: "reconcile"}
+        reconciled = []
+        closed = []
+
+        class FakeReconciler(object):
+            def __init__(self, backend, logger, options):
+                self.backend = backend
+
+            def fetch(self):
+                if failures.get(self.backend) == "fetch":
+                    raise Exception("Connection refused")
+
+            def reconcile(self, fetch=True):
+                if failures.get(self.backend) == "reconcile":
+                    raise Exception("Reconciliation failed")
+                reconciled.append(self.backend)
+
+            def get_summary(self):
+                return {"backend": self.backend.id}
+
+            def close(self):
+                closed.append(self.backend)
+
+        logger = Mock()
+        with patch("synnefo.logic.reconciliation.BackendReconciler",
+                   FakeReconciler):
+            results = reconciliation.reconcile_backends(
+                backends, logger=logger, concurrency=3)
+        self.assertEqual(results,
+                         [(backends[0], {"backend": backends[0].id}),
+                          (backends[1], None),
+                          (backends[2], None),
+                          (backends[3], {"backend": backends[3].id})])
+        key = lambda backend: backend.id
+        self.assertEqual(sorted(reconciled, key=key),
+                         [backends[0], backends[3]])
+        self.assertEqual(sorted(closed, key=key), backends[1:3])
+        self.assertEqual(
+            sorted(c[1] for c in logger.exception.mock_calls),
+            [("Failed to get the state of backend %s", backends[1]),
+             ("Failed to reconcile backend %s", backends[2])])
+
+    def test_incremental(self, mrapi):
+        watermark = time() - 3600
+        self.backend.reconciliation_mtime = datetime.fromtimestamp(watermark)
+        self.backend.full_reconciliation_time = datetime.now()
+        self.backend.save()
+        self.reconciler.options["incremental"] = True
+        flavor1 = mfactory.FlavorFactory(cpu=2, ram=1024, disk=1,
+                                         volume_type__disk_template="drbd")
+        flavor2 = mfactory.FlavorFactory(cpu=4, ram=2048, disk=1,
+                                         volume_type__disk_template="drbd")
+        # Unchanged server, with a flavor that is not examined
+        vm1 = mfactory.VirtualMachineFactory(backend=self.backend,
+                                             flavor=flavor1,
+                                             operstate="STARTED")
+        # Server with unsynced operstate
+        vm2 = mfactory.VirtualMachineFactory(backend=self.backend,
+                                             flavor=flavor2,
+                                             operstate="STOPPED")
+        # Server modified after the last reconciliation
+        vm3 = mfactory.VirtualMachineFactory(backend=self.backend,
+                                             flavor=flavor1,
+                                             operstate="STARTED")
+        mtime = time()
+        instances = []
+        for vm, vm_mtime in [(vm1, watermark - 60), (vm2, watermark - 60),
+                             (vm3, mtime)]:
+            instances.append({"name": vm.backend_vm_id,
+                              "beparams": {"maxmem": 2048,
+                                           "minmem": 2048,
+                                           "vcpus": 4},
+                              "oper_state": True,
+                              "mtime": vm_mtime,
+                              "disk.sizes": [],
+                              "disk.names": [],
+                              "disk.uuids": [],
+                              "nic.ips": [],
+                              "nic.names": [],
+                              "nic.macs": [],
+                              "nic.networks.names": [],
+                              "tags": []})
+        queried = []
+
+        def query(what, fields, qfilter=None):
+            if what == "job":
+                return {"data": []}
+            rows = instances
+            if qfilter is not None:
+                names = [f[2] for f in qfilter[1:]]
+                queried.extend(names)
+                rows = [i for i in instances if i["name"] in names]
+            return {"data": [[[0, i[f]] for f in fields] for i in rows]}
+        mrapi().Query.side_effect = query
+
+        with mocked_quotaholder():
+            self.reconciler.reconcile()
+        self.assertEqual(sorted(queried),
+                         sorted([vm2.backend_vm_id, vm3.backend_vm_id]))
+        self.assertFalse(mrapi().GetInstances.called)
+        self.assertEqual(self.reconciler.get_summary()["mode"],
+                         "incremental")
+        vm1 = VirtualMachine.objects.get(id=vm1.id)
+        self.assertEqual(vm1.flavor, flavor1)
+        vm2 = VirtualMachine.objects.get(id=vm2.id)
+        self.assertEqual(vm2.operstate, "STARTED")
+        vm3 = VirtualMachine.objects.get(id=vm3.id)
+        self.assertEqual(vm3.flavor, flavor2)
+        self.assertEqual(self.backend.reconciliation_mtime,
+                         datetime.fromtimestamp(mtime))
+
+        # A full reconciliation examines all servers
+        self.backend.full_reconciliation_time -= timedelta(days=2)
+        mrapi().GetInstances.return_value = instances
+        with mocked_quotaholder():
+            self.reconciler.reconcile()
+        self.assertEqual(self.reconciler.get_summary()["mode"], "full")
+        vm1 = VirtualMachine.objects.get(id=vm1.id)
+        self.assertEqual(vm1.flavor, flavor2)
+
 
 @patch("synnefo.logic.rapi_pool.GanetiRapiClient")
 class NetworkReconciliationTest(TestCase):
@@ -37,7 +37,6 @@ import os
 
 from time import time, gmtime, strftime
 from functools import wraps
-from operator import itemgetter
 from collections import namedtuple
 from copy import deepcopy
 
@@ -58,6 +57,12 @@ PLANKTON_DOMAIN = 'plankton'
 PLANKTON_PREFIX = 'plankton:'
 PROPERTY_PREFIX = 'property:'
 
+# Image status to availability of the Pithos object
+IMAGE_STATUS = {"AVAILABLE": True, "CREATING": False}
+# Image sort keys that map to properties of the Pithos object
+IMAGE_SORT_KEYS = {"id": "uuid", "size": "size", "updated_at": "mtime",
+                   "status": "available"}
+
 PLANKTON_META = ('container_format', 'disk_format', 'name',
                  'status', 'created_at', 'volume_id', 'description')
 
@@ -79,9 +84,17 @@ def get_pithos_backend():
             service_token=settings.CYCLADES_SERVICE_TOKEN,
             astakosclient_poolsize=settings.CYCLADES_ASTAKOSCLIENT_POOLSIZE,
             db_connection=settings.BACKEND_DB_CONNECTION,
+            db_pool_params={
+                'pool_size': settings.PITHOS_BACKEND_DB_POOL_SIZE,
+                'max_overflow': settings.PITHOS_BACKEND_DB_POOL_MAX_OVERFLOW,
+                'pool_recycle': settings.PITHOS_BACKEND_DB_POOL_RECYCLE,
+                'pool_pre_ping': settings.PITHOS_BACKEND_DB_POOL_PRE_PING},
             archipelago_conf_file=settings.PITHOS_BACKEND_ARCHIPELAGO_CONF,
             xseg_pool_size=settings.PITHOS_BACKEND_XSEG_POOL_SIZE,
-            map_check_interval=settings.PITHOS_BACKEND_MAP_CHECK_INTERVAL)
+            map_check_interval=settings.PITHOS_BACKEND_MAP_CHECK_INTERVAL,
+            block_cache_size=settings.PITHOS_BACKEND_BLOCK_CACHE_SIZE,
+            permissions_cache_size=(
+                settings.PITHOS_BACKEND_PERMISSIONS_CACHE_SIZE))
     return _pithos_backend_pool.pool_get()
 
 
@@ -403,32 +416,39 @@ class PlanktonBackend(object):
     # List functions
     def _list_images(self, user=None, filters=None, params=None):
         filters = filters or {}
-
-        # TODO: Use filters
-        # # Fix keys
-        # keys = [PLANKTON_PREFIX + 'name']
-        # size_range = (None, None)
-        # for key, val in filters.items():
-        #     if key == 'size_min':
-        #         size_range = (val, size_range[1])
-        #     elif key == 'size_max':
-        #         size_range = (size_range[0], val)
-        #     else:
-        #         keys.append('%s = %s' % (PLANKTON_PREFIX + key, val))
-        _images = self.backend.get_domain_objects(domain=PLANKTON_DOMAIN,
-                                                  user=user)
+        params = params or {}
+
+        filterq = []
+        for key in ("name", "container_format", "disk_format"):
+            if key in filters:
+                filterq.append((PLANKTON_PREFIX + key, filters[key]))
+        available = None
+        if "status" in filters:
+            status = filters["status"].upper()
+            if status not in IMAGE_STATUS:
+                return []
+            available = IMAGE_STATUS[status]
+        size_max = filters.get("size_max")
+        # 'size_max' is inclusive
+        sizeq = (filters.get("size_min"),
+                 size_max + 1 if size_max is not None else None)
+
+        sort_key = params.get("sort_key", "created_at")
+        reverse = params.get("sort_dir", "desc") == "desc"
+        if sort_key == "status":
+            # 'AVAILABLE' images come first in ascending order
+            reverse = not reverse
+        sort_key = IMAGE_SORT_KEYS.get(sort_key, PLANKTON_PREFIX + sort_key)
+
+        _images = self.backend.get_domain_objects(
+            domain=PLANKTON_DOMAIN, user=user, filterq=filterq, sizeq=sizeq,
+            available=available, sort_key=sort_key, reverse=reverse,
+            marker=params.get("marker"), limit=params.get("limit"))
 
         images = []
         for (location, metadata, permissions) in _images:
             location = Location(*location.split("/", 2))
             images.append(image_to_dict(location, metadata, permissions))
-
-        if params is None:
-            params = {}
-
-        key = itemgetter(params.get('sort_key', 'created_at'))
-        reverse = params.get('sort_dir', 'desc') == 'desc'
-        images.sort(key=key, reverse=reverse)
         return images
 
     @handle_pithos_backend
@@ -313,3 +313,28 @@ class PlanktonTest(BaseAPITest):
     def test_list_images_filters_error_1(self, backend):
         response = self.get(join_urls(IMAGES_URL, "?size_max="))
         self.assertBadRequest(response)
+
+    @assert_backend_closed
+    def test_list_images_filters(self, backend):
+        backend().get_domain_objects.return_value = []
+        response = self.get(join_urls(
+            IMAGES_URL, "?name=foo&status=available&size_max=10"
+                        "&sort_key=name&sort_dir=asc&marker=img_uuid&limit=2"))
+        self.assertSuccess(response)
+        backend().get_domain_objects.assert_called_once_with(
+            domain="plankton", user="user",
+            filterq=[("plankton:name", "foo")], sizeq=(None, 11),
+            available=True, sort_key="plankton:name", reverse=False,
+            marker="img_uuid", limit=2)
+
+    @assert_backend_closed
+    def test_list_images_filters_error_2(self, backend):
+        response = self.get(join_urls(IMAGES_URL, "?limit=0"))
+        self.assertBadRequest(response)
+
+    @assert_backend_closed
+    def test_list_images_unknown_marker(self, backend):
+        backend().get_domain_objects.side_effect = ValueError
+        response = self.get(join_urls(IMAGES_URL,
+                                      "?sort_key=name&marker=img_uuid"))
+        self.assertBadRequest(response)
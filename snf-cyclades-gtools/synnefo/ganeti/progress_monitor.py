@@ -26,6 +26,7 @@ import os
 import sys
 import time
 import json
+import select
 
 from synnefo import settings
 from synnefo.lib.amqp import AMQPClient
@@ -33,11 +34,25 @@ from synnefo.lib.utils import split_time
 
 PROGNAME = os.path.basename(sys.argv[0])
 
+# Seconds between the image copy progress messages sent for an instance.
+# Only the latest of the progress records received in the meantime is sent.
+PROGRESS_INTERVAL = getattr(settings, 'PROGRESS_MONITOR_INTERVAL', 1)
 
-def jsonstream(file):
+
+def jsonstream(file, timeout=None):
+    """Yield the JSON messages read from file.
+
+    If timeout is given, yield None every timeout seconds that pass
+    without any data to read.
+    """
     buf = ""
     decoder = json.JSONDecoder()
     while True:
+        if timeout is not None:
+            ready, _, _ = select.select([file], [], [], timeout)
+            if not ready:
+                yield None
+                continue
         new_data = os.read(file.fileno(), 512)
         if not len(new_data):
             break
@@ -71,7 +86,24 @@ def main():
     amqp_client.connect()
     amqp_client.exchange_declare(settings.EXCHANGE_GANETI, "topic")
 
-    for msg in jsonstream(sys.stdin):
+    def send(msg):
+        amqp_client.basic_publish(exchange=settings.EXCHANGE_GANETI,
+                                  routing_key=routekey,
+                                  body=json.dumps(msg))
+
+    # The latest copy progress message, held back by the rate limit
+    pending = None
+    last_progress = 0
+    for msg in jsonstream(sys.stdin, PROGRESS_INTERVAL or None):
+        if msg is None:
+            # The stream stalled for PROGRESS_INTERVAL seconds, so the held
+            # back progress message is due.
+            if pending is not None:
+                send(pending)
+                pending = None
+                last_progress = time.time()
+            continue
+
         msg['event_time'] = split_time(time.time())
         msg['instance'] = instance_name
 
@@ -79,10 +111,21 @@ def main():
         sys.stderr.write("[MONITOR] %s\n" % json.dumps(msg))
 
         # then send it over AMQP
-        amqp_client.basic_publish(exchange=settings.EXCHANGE_GANETI,
-                                  routing_key=routekey,
-                                  body=json.dumps(msg))
-
+        if msg.get('type') == 'image-copy-progress':
+            now = time.time()
+            if now - last_progress < PROGRESS_INTERVAL:
+                pending = msg
+                continue
+            last_progress = now
+            pending = None
+        elif pending is not None:
+            # Keep the order of the messages
+            send(pending)
+            pending = None
+        send(msg)
+
+    if pending is not None:
+        send(pending)
     amqp_client.close()
     return 0
 
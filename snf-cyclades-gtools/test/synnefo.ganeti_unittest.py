@@ -17,8 +17,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
 import sys
+import json
 import logging
+from synnefo.ganeti import progress_monitor
 from synnefo.ganeti.eventd import get_instance_nics
 from mock import patch
 
@@ -83,5 +86,70 @@ class GanetiNICTestCase(unittest.TestCase):
         self.assertEqual(nics0, nics1)
 
 
+@patch("synnefo.ganeti.progress_monitor.PROGRESS_INTERVAL", 1)
+@patch("synnefo.ganeti.progress_monitor.AMQPClient")
+class ProgressMonitorTestCase(unittest.TestCase):
+    def monitor(self, client, events):
+        """Run the monitor on the (time, message) events, with a None
+        message for a stalled stream, and return the (time, progress)
+        of the messages sent."""
+        clock = [100]
+
+        def stream(file, timeout):
+            self.assertEqual(timeout, 1)
+            for clock[0], msg in events:
+                yield msg
+
+        sent = []
+
+        def publish(exchange, routing_key, body):
+            msg = json.loads(body)
+            sent.append((clock[0], msg.get("progress", msg["type"])))
+
+        client.return_value.basic_publish.side_effect = publish
+        with patch("synnefo.ganeti.progress_monitor.jsonstream", stream), \
+                patch("synnefo.ganeti.progress_monitor.time.time",
+                      lambda: clock[0]), \
+                patch("sys.argv", ["snf-progress-monitor", "snf-1"]), \
+                patch("sys.stderr"):
+            self.assertEqual(progress_monitor.main(), 0)
+        return sent
+
+    @staticmethod
+    def progress(value):
+        return {"type": "image-copy-progress", "progress": value}
+
+    def test_coalesce(self, client):
+        sent = self.monitor(client, [(100, self.progress(10)),
+                                     (100.2, self.progress(20)),
+                                     (100.4, self.progress(30)),
+                                     (100.5, {"type": "image-info"}),
+                                     (100.6, self.progress(40))])
+        # The latest held back progress is sent before the next message,
+        # and at the end of the stream.
+        self.assertEqual(sent, [(100, 10), (100.5, 30),
+                                (100.5, "image-info"), (100.6, 40)])
+
+    def test_flush_stalled(self, client):
+        sent = self.monitor(client, [(100, self.progress(10)),
+                                     (100.2, self.progress(20)),
+                                     (101.2, None),
+                                     (101.5, self.progress(30)),
+                                     (102.5, None),
+                                     (103.5, None)])
+        self.assertEqual(sent, [(100, 10), (101.2, 20), (102.5, 30)])
+
+    def test_jsonstream_timeout(self, client):
+        r, w = os.pipe()
+        reader = os.fdopen(r)
+        stream = progress_monitor.jsonstream(reader, timeout=0.01)
+        self.assertEqual(next(stream), None)
+        os.write(w, '{"progress": 10}')
+        self.assertEqual(next(stream), {"progress": 10})
+        os.close(w)
+        self.assertEqual(list(stream), [])
+        reader.close()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -30,7 +30,6 @@ from astakosclient.errors import AstakosClientException
 from django.conf import settings
 from snf_django.lib.api import faults
 
-import itertools
 
 log = getLogger(__name__)
 django_logger = getLogger("django.request")
@@ -204,13 +203,8 @@ def update_response_headers(request, response):
                                         None)
         if (_base_content_is_iter is not None and not _base_content_is_iter):
             response["Content-Length"] = len(response.content)
-        else:
-            if not (response.has_header('Content-Type') and
-                    response['Content-Type'].startswith(
-                        'multipart/byteranges')):
-                # save response content from been consumed if it is an iterator
-                response._container, data = itertools.tee(response._container)
-                response["Content-Length"] = len(str(data))
+        # Iterator contents are streamed, so their length is not known
+        # in advance.
 
     cache.add_never_cache_headers(response)
     # Fix Vary and Cache-Control Headers. Issue: #3448
@@ -34,7 +34,9 @@ from pithos.api.util import (
     validate_matching_preconditions, split_container_object_string,
     copy_or_move_object, get_int_parameter, get_content_length,
     get_content_range, socket_read_iterator, SaveToBackendHandler,
+    get_block_uploader,
     object_data_response, put_object_block, hashmap_md5, simple_list_response,
+    stream_list_response,
     api_method, is_uuid, retrieve_uuid, retrieve_uuids,
     retrieve_displaynames, Checksum, NoChecksum
 )
@@ -729,20 +731,32 @@ def object_list(request, v_account, v_container):
     except ItemNotExists:
         raise faults.ItemNotFound('Container does not exist')
 
-    object_meta = []
+    if TRANSLATE_UUIDS:
+        uuids = list(set(meta['modified_by'] for meta in objects
+                         if meta.get('modified_by')))
+        if uuids:
+            displaynames = retrieve_displaynames(
+                getattr(request, 'token', None), uuids, return_dict=True)
+            for meta in objects:
+                if meta.get('modified_by'):
+                    meta['modified_by'] = displaynames.get(meta['modified_by'])
+
+    # Sharing meta may need display name lookups, so resolve it before
+    # streaming the listing.
+    sharing = {}
     for meta in objects:
-        if TRANSLATE_UUIDS:
-            modified_by = meta.get('modified_by')
-            if modified_by:
-                l = retrieve_displaynames(
-                    getattr(request, 'token', None), [meta['modified_by']])
-                if l is not None and len(l) == 1:
-                    meta['modified_by'] = l[0]
-
-        if len(meta) == 1:
-            # Virtual objects/directories.
-            object_meta.append(meta)
-        else:
+        permissions = object_permissions.get(meta.get('name'))
+        if permissions:
+            sharing[meta['name']] = {}
+            update_sharing_meta(request, permissions, v_account, v_container,
+                                meta['name'], sharing[meta['name']])
+
+    def format_objects():
+        for meta in objects:
+            if len(meta) == 1:
+                # Virtual objects/directories.
+                yield meta
+                continue
             rename_meta_key(
                 meta, 'hash', 'x_object_hash')  # Will be replaced by checksum.
             rename_meta_key(meta, 'checksum', 'hash')
@@ -756,24 +770,18 @@ def object_list(request, v_account, v_container):
             rename_meta_key(meta, 'version', 'x_object_version')
             rename_meta_key(
                 meta, 'version_timestamp', 'x_object_version_timestamp')
-            permissions = object_permissions.get(meta['name'], None)
-            if permissions:
-                update_sharing_meta(request, permissions, v_account,
-                                    v_container, meta['name'], meta)
+            meta.update(sharing.get(meta['name'], ()))
             public_url = object_public.get(meta['name'], None)
             if request.user_uniq == v_account:
                 # Return public information only if the request user
                 # is the object owner
                 update_public_meta(public_url, meta)
-            object_meta.append(printable_header_dict(meta))
+            yield printable_header_dict(meta)
 
-    if request.serialization == 'xml':
-        data = render_to_string(
-            'objects.xml', {'container': v_container, 'objects': object_meta})
-    elif request.serialization == 'json':
-        data = json.dumps(object_meta, default=json_encode_decimal)
+    # The objects are formatted as the listing is streamed.
     response.status_code = 200
-    response.content = data
+    response.content = stream_list_response(
+        request, format_objects(), 'objects.xml', 'container', v_container)
     return response
 
 
@@ -1059,10 +1067,8 @@ def object_write(request, v_account, v_container, v_object):
         raise faults.LengthRequired('Missing Content-Type header')
 
     if 'hashmap' in request.GET:
-        data = ''
-        for block in socket_read_iterator(request, content_length,
-                                          request.backend.block_size):
-            data = ''.join([data, block])
+        data = ''.join(socket_read_iterator(request, content_length,
+                                            request.backend.block_size))
 
         try:
             d = json.loads(data)
@@ -1075,15 +1081,16 @@ def object_write(request, v_account, v_container, v_object):
         etag = request.META.get('HTTP_ETAG')
         checksum_compute = Checksum() if etag or UPDATE_MD5 else NoChecksum()
         size = 0
-        hashmap = []
+        uploader = get_block_uploader(request.backend)
         for data in socket_read_iterator(request, content_length,
                                          request.backend.block_size):
             # TODO: Raise 408 (Request Timeout) if this takes too long.
             # TODO: Raise 499 (Client Disconnect) if a length is defined
             #       and we stop before getting this much data.
             size += len(data)
-            hashmap.append(request.backend.put_block(data))
+            uploader.put(data)
             checksum_compute.update(data)
+        hashmap = uploader.hashmap()
 
         checksum = checksum_compute.hexdigest()
         if etag and parse_etags(etag)[0].lower() != checksum:
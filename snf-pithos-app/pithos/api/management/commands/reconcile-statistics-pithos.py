@@ -0,0 +1,115 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from time import time
+
+from django.core.management.base import CommandError
+
+from optparse import make_option
+
+from pithos.api.util import get_backend
+from pithos.backends.modular import (CLUSTER_NORMAL, CLUSTER_HISTORY,
+                                     CLUSTER_DELETED)
+
+from snf_django.management import utils
+from snf_django.management.commands import SynnefoCommand
+
+CLUSTERS = {CLUSTER_NORMAL: 'normal',
+            CLUSTER_HISTORY: 'history',
+            CLUSTER_DELETED: 'deleted'}
+
+
+class Command(SynnefoCommand):
+    help = """Verify the container and account statistics of Pithos DB.
+
+    Container and account usage is maintained incrementally, on every object
+    write. Recompute it from the object versions and report the containers
+    and accounts with statistics out of sync. Rebuild them if specified so.
+
+    """
+    option_list = SynnefoCommand.option_list + (
+        make_option("--user", dest="userid",
+                    default=None,
+                    help="Reconcile statistics only for this user"),
+        make_option("--fix", dest="fix",
+                    default=False,
+                    action="store_true",
+                    help="Rebuild the statistics found out of sync."),
+    )
+
+    def handle(self, **options):
+        write = self.stdout.write
+        backend = get_backend()
+        try:
+            backend.pre_exec()
+            node = backend.node
+            userid = options['userid']
+
+            accounts = node.node_accounts([userid] if userid else ())
+            if userid and not accounts:
+                write("User '%s' does not exist in DB!\n" % userid)
+                return
+
+            unsynced = []
+            fixes = []
+            for account, account_node in accounts:
+                for cluster, name in sorted(CLUSTERS.items()):
+                    total = 0
+                    for stats in node.statistics_compute(account_node,
+                                                         cluster):
+                        container_node, path, population, size, mtime = \
+                            stats
+                        total += size
+                        actual = node.statistics_get(container_node,
+                                                     cluster)
+                        if actual is None and population == 0:
+                            continue
+                        actual = actual or (0, 0, None)
+                        if actual[:2] != (population, size):
+                            unsynced.append((path, name, actual[0],
+                                             population, actual[1], size))
+                            fixes.append((container_node, population, size,
+                                          actual[2] or mtime or time(),
+                                          cluster))
+
+                    # Account population is not recursive.
+                    actual = node.statistics_get(account_node, cluster)
+                    if actual is None and total == 0:
+                        continue
+                    actual = actual or (0, 0, None)
+                    if actual[1] != total:
+                        unsynced.append((account, name, actual[0], actual[0],
+                                         actual[1], total))
+                        fixes.append((account_node, actual[0], total,
+                                      actual[2] or time(), cluster))
+
+            if not unsynced:
+                write("Everything in sync.\n")
+                return
+
+            headers = ("Path", "Cluster", "Population", "Computed population",
+                       "Size", "Computed size")
+            utils.pprint_table(self.stdout, unsynced, headers)
+            if options["fix"]:
+                for fix in fixes:
+                    node.statistics_set(*fix)
+                write("Fixed unsynced statistics\n")
+        except BaseException as e:
+            backend.post_exec(False)
+            raise CommandError(e)
+        else:
+            backend.post_exec(True)
+        finally:
+            backend.close()
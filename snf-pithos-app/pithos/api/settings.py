@@ -113,6 +113,8 @@ BACKEND_DB_CONNECTION = getattr(settings, 'PITHOS_BACKEND_DB_CONNECTION',
                                 'sqlite:////tmp/pithos-backend.db')
 
 # Block storage.
+# Use 'pithos.backends.lib.filestore' to keep blocks and maps
+# under BACKEND_BLOCK_PATH instead of an Archipelago cluster.
 BACKEND_BLOCK_MODULE = getattr(
     settings, 'PITHOS_BACKEND_BLOCK_MODULE', 'pithos.backends.lib.hashfiler')
 BACKEND_BLOCK_PATH = getattr(
@@ -144,6 +146,23 @@ BACKEND_POOL_ENABLED = getattr(settings, 'PITHOS_BACKEND_POOL_ENABLED', True)
 # Default backend pool size
 BACKEND_POOL_SIZE = getattr(settings, 'PITHOS_BACKEND_POOL_SIZE', 5)
 
+# The number of database connections each worker process keeps in a pool
+# shared by all backend instances. Connections are checked out per
+# transaction. Set to 0 to keep a dedicated connection per backend instance.
+BACKEND_DB_POOL_SIZE = getattr(settings, 'PITHOS_BACKEND_DB_POOL_SIZE', 0)
+
+# The number of connections that may be opened beyond the pool size
+BACKEND_DB_POOL_MAX_OVERFLOW = getattr(
+    settings, 'PITHOS_BACKEND_DB_POOL_MAX_OVERFLOW', 10)
+
+# The number of seconds after which pooled connections are recycled
+BACKEND_DB_POOL_RECYCLE = getattr(
+    settings, 'PITHOS_BACKEND_DB_POOL_RECYCLE', 3600)
+
+# Test pooled connections before using them
+BACKEND_DB_POOL_PRE_PING = getattr(
+    settings, 'PITHOS_BACKEND_DB_POOL_PRE_PING', True)
+
 # Update object checksums.
 UPDATE_MD5 = getattr(settings, 'PITHOS_UPDATE_MD5', False)
 
@@ -164,6 +183,25 @@ PUBLIC_URL_ALPHABET = getattr(
     'PITHOS_PUBLIC_URL_ALPHABET',
     '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
 
+# The number of threads (per worker process) fetching object blocks ahead
+# of the one being sent to the client. Set to 0 to disable read-ahead.
+READ_AHEAD_WORKERS = getattr(settings, 'PITHOS_READ_AHEAD_WORKERS', 4)
+
+# The maximum amount of memory (in bytes) each download may hold
+# in blocks fetched ahead of the one being sent to the client.
+READ_AHEAD_BUFFER_SIZE = getattr(settings, 'PITHOS_READ_AHEAD_BUFFER_SIZE',
+                                 16 * 1024 * 1024)
+
+# The number of threads (per worker process) storing uploaded blocks,
+# while the following ones are still being received. Set to 0 to store
+# each block before reading the next one.
+UPLOAD_WORKERS = getattr(settings, 'PITHOS_UPLOAD_WORKERS', 4)
+
+# The maximum amount of memory (in bytes) each upload may hold
+# in blocks received but not yet stored.
+UPLOAD_BUFFER_SIZE = getattr(settings, 'PITHOS_UPLOAD_BUFFER_SIZE',
+                             16 * 1024 * 1024)
+
 # The maximum number or items returned by the listing api methods
 API_LIST_LIMIT = getattr(settings, 'PITHOS_API_LIST_LIMIT', 10000)
 
@@ -171,6 +209,22 @@ API_LIST_LIMIT = getattr(settings, 'PITHOS_API_LIST_LIMIT', 10000)
 BACKEND_BLOCK_SIZE = getattr(
     settings, 'PITHOS_BACKEND_BLOCK_SIZE', 4 * 1024 * 1024)
 
+# The maximum amount of memory (in bytes) each worker process may use
+# to cache recently read blocks. Set to 0 to disable the cache.
+BACKEND_BLOCK_CACHE_SIZE = getattr(
+    settings, 'PITHOS_BACKEND_BLOCK_CACHE_SIZE', 0)
+
+# The maximum number of paths whose permissions each worker process may
+# cache across requests. Set to 0 to disable the cache.
+BACKEND_PERMISSIONS_CACHE_SIZE = getattr(
+    settings, 'PITHOS_BACKEND_PERMISSIONS_CACHE_SIZE', 0)
+
+# Account the SQL statements and the block store operations of each request.
+# Their counts and times are logged to 'pithos.api.stats' and, in DEBUG
+# mode, returned in the X-Backend-* response headers.
+BACKEND_REQUEST_STATS = getattr(
+    settings, 'PITHOS_BACKEND_REQUEST_STATS', False)
+
 # The backend block hash algorithm
 BACKEND_HASH_ALGORITHM = getattr(
     settings, 'PITHOS_BACKEND_HASH_ALGORITHM', 'sha256')
@@ -193,6 +247,10 @@ BACKEND_ARCHIPELAGO_CONF = getattr(settings, 'PITHOS_BACKEND_ARCHIPELAGO_CONF',
 # Archipelagp xseg pool size
 BACKEND_XSEG_POOL_SIZE = getattr(settings, 'PITHOS_BACKEND_XSEG_POOL_SIZE', 8)
 
+# The maximum number of block existence checks kept in flight
+# on an xseg port when checking a hashmap for missing blocks
+BACKEND_XSEG_INFLIGHT = getattr(settings, 'PITHOS_BACKEND_XSEG_INFLIGHT', 32)
+
 # The maximum interval (in seconds) for consequent backend object map checks
 BACKEND_MAP_CHECK_INTERVAL = getattr(settings,
                                      'PITHOS_BACKEND_MAP_CHECK_INTERVAL', 5)
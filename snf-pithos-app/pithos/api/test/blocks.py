@@ -0,0 +1,199 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock
+from time import sleep
+from unittest import TestCase
+
+from mock import patch
+
+from pithos.api.util import BlockPrefetcher, BlockUploader, ObjectWrapper
+from pithos.backends.util import WorkerPool
+
+BLOCK_SIZE = 4
+
+
+class FakeBackend(object):
+    """Return each block hash as the block data, recording the reads."""
+
+    block_size = BLOCK_SIZE
+
+    def __init__(self):
+        self.reads = []
+        self.lock = Lock()
+
+    def get_block(self, hash):
+        with self.lock:
+            self.reads.append(hash)
+        return hash
+
+
+class FakeTask(object):
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def result(self):
+        return self.func(*self.args)
+
+
+class FakePool(object):
+    """Run the submitted calls only when their result is requested."""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, func, *args):
+        task = FakeTask(func, args)
+        self.tasks.append(task)
+        return task
+
+
+class TestBlockPrefetcher(TestCase):
+    def read(self, ranges, sizes, hashmaps, workers):
+        backend = FakeBackend()
+        boundary = 'boundary' if len(ranges) > 1 else ''
+        with patch('pithos.api.util.READ_AHEAD_WORKERS', workers):
+            with patch('pithos.api.util.READ_AHEAD_BUFFER_SIZE',
+                       2 * BLOCK_SIZE):
+                with patch('pithos.api.util._read_ahead_pool',
+                           WorkerPool(2)):
+                    wrapper = ObjectWrapper(backend, ranges, sizes, hashmaps,
+                                            boundary, {})
+                    data = ''.join(wrapper)
+                    wrapper.close()
+        return data, backend.reads
+
+    def assert_prefetch_order(self, ranges, sizes, hashmaps):
+        data, reads = self.read(ranges, sizes, hashmaps, 0)
+        self.assertEqual(
+            list(ObjectWrapper._block_hashes(ranges, sizes, hashmaps,
+                                             BLOCK_SIZE)),
+            reads)
+
+        # Every block is prefetched once and none is read out of order.
+        prefetched, prefetched_reads = self.read(ranges, sizes, hashmaps, 2)
+        self.assertEqual(prefetched, data)
+        self.assertEqual(sorted(prefetched_reads), sorted(reads))
+        return data
+
+    def test_multiple_ranges(self):
+        hashmaps = [['abcd', 'efgh', 'ij']]
+        data = self.assert_prefetch_order([(1, 5), (9, 1), (0, 3)], [10],
+                                          hashmaps)
+        parts = data.split('--boundary')
+        self.assertEqual(len(parts), 5)
+        for part, expected in zip(parts[1:], ('bcdef', 'j', 'abc')):
+            self.assertTrue(part.endswith('\r\n\r\n' + expected + '\r\n'))
+
+    def test_multiple_files(self):
+        hashmaps = [['abcd', 'abcd', 'ij'], ['klmn', 'opq']]
+        content = 'abcdabcdijklmnopq'
+        data = self.assert_prefetch_order([(2, 13)], [10, 7], hashmaps)
+        self.assertEqual(data, content[2:15])
+        data = self.assert_prefetch_order([(6, 6), (15, 2), (0, 9)],
+                                          [10, 7], hashmaps)
+        parts = data.split('--boundary')
+        for part, expected in zip(parts[1:], ('cdijkl', 'pq', 'abcdabcdi')):
+            self.assertTrue(part.endswith('\r\n\r\n' + expected + '\r\n'))
+
+    def test_cancel_skipped(self):
+        backend = FakeBackend()
+        pool = FakePool()
+        prefetcher = BlockPrefetcher(backend.get_block, 'abcdef', 3, pool)
+        self.assertEqual(prefetcher.get('c'), 'c')
+        self.assertEqual([t.cancelled for t in pool.tasks],
+                         [True, True, False, False, False, False])
+        self.assertEqual(backend.reads, ['c'])
+
+        # Out of order, all the pending blocks are skipped.
+        self.assertEqual(prefetcher.get('a'), 'a')
+        self.assertTrue(all(t.cancelled for t in pool.tasks[3:]))
+        self.assertEqual(backend.reads, ['c', 'a'])
+
+        prefetcher.close()
+        self.assertEqual(len(pool.tasks), 6)
+        self.assertFalse(prefetcher.pending)
+
+
+class TestBlockUploader(TestCase):
+    def setUp(self):
+        self.lock = Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def put_block(self, data):
+        """Store the earlier blocks slower, so that they complete out of
+        order, and fail on the 'error' block.
+        """
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            sleep(0.001 * (10 - int(data[-1])))
+            if data.startswith('error'):
+                raise ValueError(data)
+            return data.upper()
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def test_order(self):
+        uploader = BlockUploader(self.put_block, 3, WorkerPool(5))
+        blocks = ['block%d' % (i % 10) for i in range(30)]
+        for block in blocks:
+            uploader.put(block)
+            self.assertTrue(len(uploader.pending) <= 3)
+        self.assertEqual(uploader.hashmap(), [b.upper() for b in blocks])
+        self.assertTrue(self.max_running <= 3)
+
+    def test_synchronous(self):
+        uploader = BlockUploader(self.put_block, 0, None)
+        uploader.put('block1')
+        self.assertRaises(ValueError, uploader.put, 'error2')
+        self.assertEqual(uploader.hashmap(), ['BLOCK1'])
+
+    def test_error(self):
+        uploader = BlockUploader(self.put_block, 2, WorkerPool(2))
+        blocks = ['block1', 'error2', 'block3', 'block4', 'block5']
+
+        def upload():
+            for block in blocks:
+                uploader.put(block)
+            return uploader.hashmap()
+        self.assertRaises(ValueError, upload)
+        self.assertFalse(uploader.pending)
+        self.assertEqual(uploader.hashes, ['BLOCK1'])
+
+        # The error of the last block is raised when waiting for the hashmap.
+        uploader = BlockUploader(self.put_block, 3, WorkerPool(3))
+        for block in ['block1', 'block2', 'error3']:
+            uploader.put(block)
+        self.assertRaises(ValueError, uploader.hashmap)
+        self.assertFalse(uploader.pending)
+
+    def test_error_cancel(self):
+        pool = FakePool()
+        uploader = BlockUploader(self.put_block, 2, pool)
+        for block in ['block1', 'error2', 'block3']:
+            uploader.put(block)
+        self.assertRaises(ValueError, uploader.put, 'block4')
+        self.assertEqual([t.cancelled for t in pool.tasks],
+                         [False, False, True])
+        self.assertFalse(uploader.pending)
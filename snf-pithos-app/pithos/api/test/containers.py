@@ -19,11 +19,15 @@
 from pithos.api.test import (PithosAPITest, DATE_FORMATS, o_names,
                              pithos_settings, pithos_test_settings)
 from pithos.api.test.util import strnextling, get_random_data, get_random_name
+from pithos.api.util import stream_list_response, json_encode_decimal
 
 from synnefo.lib import join_urls
 
 import django.utils.simplejson as json
 from django.http import urlencode
+from django.template import Context, Template
+
+from mock import patch
 
 from xml.dom import minidom
 from urllib import quote
@@ -32,6 +36,27 @@ import time as _time
 import random
 import datetime
 
+# The objects.xml template used before listings were streamed.
+OBJECTS_XML = """<?xml version="1.0" encoding="UTF-8"?>
+{% load get_type %}
+<container name="{{ container }}">
+  {% for object in objects %}
+  {% if object.subdir %}
+  <subdir name="{{ object.subdir }}" />
+  {% else %}
+  <object>
+  {% for key, value in object.items %}
+    <{{ key }}>{% if value|get_type == "dict" %}
+      {% for k, v in value.iteritems %}<key>{{ k }}</key><value>{{ v }}</value>
+      {% endfor %}
+    {% else %}{{ value }}{% endif %}</{{ key }}>
+  {% endfor %}
+  </object>
+  {% endif %}
+  {% endfor %}
+</container>
+"""
+
 
 class ContainerHead(PithosAPITest):
     def test_get_meta(self):
@@ -649,6 +674,45 @@ class ContainerGet(PithosAPITest):
         self.assertEqual(len(objects), 1)
         self.assertEqual(objects[0].childNodes[0].data, 'photos/me.jpg')
 
+    @patch('pithos.api.util.LISTING_CHUNK_SIZE', 3)
+    def test_list_streamed(self):
+        url = join_urls(self.pithos_path, self.user, 'apples')
+        r = self.post(join_urls(url, 'photos/me.jpg'), content_type='',
+                      HTTP_X_OBJECT_META_QUALITY='aaa',
+                      HTTP_X_OBJECT_SHARING='read=*')
+        self.assertEqual(r.status_code, 202)
+
+        listed = []
+
+        def stream(request, items, *args):
+            listed[:] = items
+            return stream_list_response(request, items, *args)
+
+        def previous(format):
+            if format == 'json':
+                return json.dumps(listed, default=json_encode_decimal)
+            return Template(OBJECTS_XML).render(Context(
+                {'container': 'apples', 'objects': listed}))
+
+        for format in ('json', 'xml'):
+            for params in ({'format': format},
+                           {'format': format, 'prefix': 'photos',
+                            'delimiter': '/'}):
+                with patch('pithos.api.functions.stream_list_response',
+                           side_effect=stream):
+                    r = self.get('%s?%s' % (url, urlencode(params)))
+                self.assertEqual(r.status_code, 200)
+                self.assertTrue(len(listed) > 3)
+                # Same output as serializing the whole listing at once
+                self.assertEqual(r.content, previous(format).encode('utf8'))
+
+        # An empty listing
+        r = self.get('%s?%s' % (url, urlencode({'format': 'xml',
+                                                'prefix': 'none'})))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, Template(OBJECTS_XML).render(Context(
+            {'container': 'apples', 'objects': []})))
+
     def test_list_meta_double_matching(self):
         # update object meta
         cname = 'apples'
@@ -0,0 +1,66 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from StringIO import StringIO
+from time import time
+
+from django.core.management import call_command
+
+from pithos.api.test import PithosAPITest
+from pithos.api.util import get_backend
+from pithos.backends.modular import CLUSTER_NORMAL
+
+
+class ReconcileStatistics(PithosAPITest):
+    def reconcile(self, **options):
+        out = StringIO()
+        call_command('reconcile-statistics-pithos', stdout=out, **options)
+        return out.getvalue()
+
+    def account_statistics(self, set_size=None):
+        backend = get_backend()
+        try:
+            backend.pre_exec()
+            node = backend.node
+            account_node = backend._lookup_account(self.user, True)[1]
+            if set_size is not None:
+                node.statistics_set(account_node, 0, set_size, time(),
+                                    CLUSTER_NORMAL)
+            stats = node.statistics_get(account_node, CLUSTER_NORMAL)
+        finally:
+            backend.post_exec(True)
+            backend.close()
+        return stats[1]
+
+    def test_reconcile_statistics(self):
+        cname, _ = self.create_container()
+        size = sum(len(self.upload_object(cname)[1]) for _ in range(2))
+        self.assertEqual(self.account_statistics(), size)
+        self.assertTrue('Everything in sync' in self.reconcile())
+
+        # Lose the account usage
+        self.account_statistics(set_size=0)
+        out = self.reconcile(userid=self.user)
+        self.assertTrue(self.user in out)
+        self.assertFalse('Fixed' in out)
+        self.assertEqual(self.account_statistics(), 0)
+
+        out = self.reconcile(userid=self.user, fix=True)
+        self.assertTrue('Fixed unsynced statistics' in out)
+        self.assertEqual(self.account_statistics(), size)
+        self.assertTrue('Everything in sync' in self.reconcile())
+
+        out = self.reconcile(userid='unknown')
+        self.assertTrue("User 'unknown' does not exist" in out)
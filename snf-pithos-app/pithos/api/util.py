@@ -18,12 +18,14 @@ from datetime import datetime
 from urllib import quote, unquote, urlencode
 from urlparse import urlunsplit, urlsplit, parse_qsl
 
+from django.conf import settings
 from django.http import (HttpResponse, Http404, HttpResponseRedirect,
                          HttpResponseNotAllowed)
 from django.template.loader import render_to_string
 from django.utils import simplejson as json
 from django.utils.http import http_date, parse_etags
 from django.utils.encoding import smart_unicode, smart_str
+from django.utils.html import escape
 from django.core.files.uploadhandler import FileUploadHandler
 from django.core.files.uploadedfile import UploadedFile
 from django.core.urlresolvers import reverse
@@ -34,7 +36,8 @@ from snf_django.lib import api
 from snf_django.lib.api import faults, utils
 
 from pithos.api.settings import (BACKEND_DB_MODULE, BACKEND_DB_CONNECTION,
-                                 BACKEND_BLOCK_MODULE,
+                                 BACKEND_BLOCK_MODULE, BACKEND_BLOCK_PATH,
+                                 BACKEND_BLOCK_UMASK,
                                  BACKEND_QUEUE_MODULE, BACKEND_QUEUE_HOSTS,
                                  BACKEND_QUEUE_EXCHANGE,
                                  ASTAKOSCLIENT_POOLSIZE,
@@ -44,15 +47,25 @@ from pithos.api.settings import (BACKEND_DB_MODULE, BACKEND_DB_CONNECTION,
                                  BACKEND_CONTAINER_QUOTA,
                                  BACKEND_VERSIONING, BACKEND_FREE_VERSIONING,
                                  BACKEND_POOL_ENABLED, BACKEND_POOL_SIZE,
+                                 BACKEND_DB_POOL_SIZE,
+                                 BACKEND_DB_POOL_MAX_OVERFLOW,
+                                 BACKEND_DB_POOL_RECYCLE,
+                                 BACKEND_DB_POOL_PRE_PING,
                                  BACKEND_BLOCK_SIZE, BACKEND_HASH_ALGORITHM,
+                                 BACKEND_BLOCK_CACHE_SIZE,
+                                 BACKEND_PERMISSIONS_CACHE_SIZE,
+                                 BACKEND_REQUEST_STATS,
                                  BACKEND_ARCHIPELAGO_CONF,
                                  BACKEND_XSEG_POOL_SIZE,
+                                 BACKEND_XSEG_INFLIGHT,
                                  BACKEND_MAP_CHECK_INTERVAL,
                                  BACKEND_MAPFILE_PREFIX,
                                  RADOS_STORAGE, RADOS_POOL_BLOCKS,
                                  RADOS_POOL_MAPS, TRANSLATE_UUIDS,
                                  PUBLIC_URL_SECURITY, PUBLIC_URL_ALPHABET,
                                  BASE_HOST, UPDATE_MD5, VIEW_PREFIX,
+                                 READ_AHEAD_WORKERS, READ_AHEAD_BUFFER_SIZE,
+                                 UPLOAD_WORKERS, UPLOAD_BUFFER_SIZE,
                                  OAUTH2_CLIENT_CREDENTIALS, UNSAFE_DOMAIN)
 
 from pithos.api.resources import resources
@@ -71,7 +84,13 @@ import hashlib
 import uuid
 import decimal
 
+from collections import deque
+
 logger = logging.getLogger(__name__)
+stats_logger = logging.getLogger('pithos.api.stats')
+
+# Items serialized together in each chunk of a streamed listing.
+LISTING_CHUNK_SIZE = 100
 
 
 def json_encode_decimal(obj):
@@ -712,27 +731,81 @@ def raw_input_socket(request):
 MAX_UPLOAD_SIZE = 5 * (1024 * 1024 * 1024)  # 5GB
 
 
+class ChunkBuffer(object):
+    """Collect chunks of data and split them in blocks.
+
+    Chunks are kept as given and each block is joined once from the chunks
+    it spans, instead of growing and slicing a string for every chunk.
+    """
+
+    def __init__(self, blocksize):
+        self.blocksize = blocksize
+        self.chunks = deque()
+        self.offset = 0  # in the first chunk
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, chunk):
+        if chunk:
+            self.chunks.append(chunk)
+            self.length += len(chunk)
+
+    def pop(self, size=None):
+        """Remove and return the first size bytes (all by default)."""
+
+        if size is None or size > self.length:
+            size = self.length
+        parts = []
+        needed = size
+        while needed > 0:
+            chunk = self.chunks[0]
+            available = len(chunk) - self.offset
+            if available > needed:
+                parts.append(chunk[self.offset:self.offset + needed])
+                self.offset += needed
+                break
+            parts.append(chunk[self.offset:] if self.offset else chunk)
+            self.chunks.popleft()
+            self.offset = 0
+            needed -= available
+        self.length -= size
+        return ''.join(parts)
+
+    def blocks(self):
+        """Remove and yield the complete blocks."""
+
+        while self.length >= self.blocksize:
+            yield self.pop(self.blocksize)
+
+
 def socket_read_iterator(request, length=0, blocksize=4096):
-    """Return maximum of blocksize data read from the socket in each iteration
+    """Return blocksize data read from the socket in each iteration
 
     Read up to 'length'. If 'length' is negative, will attempt a chunked read.
     The maximum ammount of data read is controlled by MAX_UPLOAD_SIZE.
+    Short reads are coalesced, so that only the last block may be smaller.
     """
 
     sock = raw_input_socket(request)
+    buf = ChunkBuffer(blocksize)
     if length < 0:  # Chunked transfers
         # Small version (server does the dechunking).
         if (request.environ.get('mod_wsgi.input_chunked', None)
                 or request.META['SERVER_SOFTWARE'].startswith('gunicorn')):
             while length < MAX_UPLOAD_SIZE:
-                data = sock.read(blocksize)
+                data = sock.read(blocksize - len(buf))
                 if data == '':
+                    if len(buf) > 0:
+                        yield buf.pop()
                     return
-                yield data
+                buf.append(data)
+                for block in buf.blocks():
+                    yield block
             raise faults.BadRequest('Maximum size is reached')
 
         # Long version (do the dechunking).
-        data = ''
         while length < MAX_UPLOAD_SIZE:
             # Get chunk size.
             if hasattr(sock, 'readline'):
@@ -752,8 +825,8 @@ def socket_read_iterator(request, length=0, blocksize=4096):
                                  # TODO: Change to something more appropriate.
             # Check if done.
             if chunk_length == 0:
-                if len(data) > 0:
-                    yield data
+                if len(buf) > 0:
+                    yield buf.pop()
                 return
             # Get the actual data.
             while chunk_length > 0:
@@ -761,22 +834,74 @@ def socket_read_iterator(request, length=0, blocksize=4096):
                 chunk_length -= len(chunk)
                 if length > 0:
                     length += len(chunk)
-                data += chunk
-                if len(data) >= blocksize:
-                    ret = data[:blocksize]
-                    data = data[blocksize:]
-                    yield ret
+                buf.append(chunk)
+                for block in buf.blocks():
+                    yield block
             sock.read(2)  # CRLF
         raise faults.BadRequest('Maximum size is reached')
     else:
         if length > MAX_UPLOAD_SIZE:
             raise faults.BadRequest('Maximum size is reached')
         while length > 0:
-            data = sock.read(min(length, blocksize))
+            data = sock.read(min(length, blocksize - len(buf)))
             if not data:
                 raise faults.BadRequest()
             length -= len(data)
-            yield data
+            buf.append(data)
+            for block in buf.blocks():
+                yield block
+        if len(buf) > 0:
+            yield buf.pop()
+
+
+class BlockUploader(object):
+    """Store blocks in a WorkerPool, while the following ones are received.
+
+    Up to window blocks are kept in flight. The hashes are returned
+    by hashmap() in the order the blocks were given.
+    """
+
+    def __init__(self, put_block, window, pool):
+        self.put_block = put_block
+        self.window = window
+        self.pool = pool
+        self.hashes = []
+        self.pending = deque()
+
+    def put(self, data):
+        if self.pool is None:
+            self.hashes.append(self.put_block(data))
+            return
+        if len(self.pending) >= self.window:
+            self._wait()
+        self.pending.append(self.pool.submit(self.put_block, data))
+
+    def _wait(self):
+        task = self.pending.popleft()
+        try:
+            self.hashes.append(task.result())
+        except:
+            # The upload fails, do not store the blocks following.
+            self.close()
+            raise
+
+    def hashmap(self):
+        """Wait for all blocks to be stored and return their hashes."""
+        while self.pending:
+            self._wait()
+        return self.hashes
+
+    def close(self):
+        """Cancel the blocks not stored yet."""
+        while self.pending:
+            self.pending.popleft().cancel()
+
+
+def get_block_uploader(backend):
+    window = UPLOAD_BUFFER_SIZE // backend.block_size
+    if UPLOAD_WORKERS > 0 and window > 0:
+        return BlockUploader(backend.put_block, window, _upload_pool)
+    return BlockUploader(backend.put_block, 0, None)
 
 
 class SaveToBackendHandler(FileUploadHandler):
@@ -786,36 +911,82 @@ class SaveToBackendHandler(FileUploadHandler):
         super(SaveToBackendHandler, self).__init__(request)
         self.backend = request.backend
 
-    def put_data(self, length):
-        if len(self.data) >= length:
-            block = self.data[:length]
-            self.file.hashmap.append(self.backend.put_block(block))
-            self.checksum_compute.update(block)
-            self.data = self.data[length:]
+    def put_data(self, block):
+        self.uploader.put(block)
+        self.checksum_compute.update(block)
 
     def new_file(self, field_name, file_name, content_type,
                  content_length, charset=None):
         self.checksum_compute = NoChecksum() if not UPDATE_MD5 else Checksum()
-        self.data = ''
+        self.data = ChunkBuffer(self.backend.block_size)
+        self.uploader = get_block_uploader(self.backend)
         self.file = UploadedFile(
             name=file_name, content_type=content_type, charset=charset)
         self.file.size = 0
         self.file.hashmap = []
 
     def receive_data_chunk(self, raw_data, start):
-        self.data += raw_data
+        self.data.append(raw_data)
         self.file.size += len(raw_data)
-        self.put_data(self.request.backend.block_size)
+        for block in self.data.blocks():
+            self.put_data(block)
         return None
 
     def file_complete(self, file_size):
-        l = len(self.data)
-        if l > 0:
-            self.put_data(l)
+        if len(self.data) > 0:
+            self.put_data(self.data.pop())
+        self.file.hashmap = self.uploader.hashmap()
         self.file.etag = self.checksum_compute.hexdigest()
         return self.file
 
 
+class BlockPrefetcher(object):
+    """Fetch blocks ahead of the one requested, in a WorkerPool.
+
+    Hashes are expected to be requested in the order given. Up to window
+    blocks following the requested one are kept in flight or ready.
+    The blocks still pending are cancelled when the prefetcher is closed
+    or garbage collected.
+    """
+
+    def __init__(self, get_block, hashes, window, pool):
+        self.get_block = get_block
+        self.hashes = iter(hashes)
+        self.window = window
+        self.pool = pool
+        self.pending = deque()
+
+    def _fill(self):
+        while len(self.pending) < self.window:
+            try:
+                h = self.hashes.next()
+            except StopIteration:
+                return
+            self.pending.append((h, self.pool.submit(self.get_block, h)))
+
+    def get(self, hash):
+        if not self.pending:
+            self._fill()
+        while self.pending:
+            h, task = self.pending.popleft()
+            if h == hash:
+                self._fill()
+                return task.result()
+            # Skipped, it is not going to be requested.
+            task.cancel()
+        # Out of order request, read it directly.
+        return self.get_block(hash)
+
+    def close(self):
+        self.hashes = iter(())
+        while self.pending:
+            h, task = self.pending.popleft()
+            task.cancel()
+
+    def __del__(self):
+        self.close()
+
+
 class ObjectWrapper(object):
     """Return the object's data block-per-block in each iteration.
 
@@ -840,9 +1011,58 @@ class ObjectWrapper(object):
         self.range_index = -1
         self.offset, self.length = self.ranges[0]
 
+        window = READ_AHEAD_BUFFER_SIZE // backend.block_size
+        if READ_AHEAD_WORKERS > 0 and window > 0:
+            hashes = self._block_hashes(ranges, sizes, hashmaps,
+                                        backend.block_size)
+            self.prefetcher = BlockPrefetcher(backend.get_block, hashes,
+                                              window, _read_ahead_pool)
+        else:
+            self.prefetcher = None
+
     def __iter__(self):
         return self
 
+    def close(self):
+        """Cancel the blocks still being read ahead."""
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+
+    @staticmethod
+    def _block_hashes(ranges, sizes, hashmaps, block_size):
+        """Yield the hashes of the blocks part_iterator() is going to
+        read, in the same order.
+
+        The generator holds no reference to the wrapper, so that the
+        wrapper and its prefetcher are not kept alive in a cycle.
+        """
+        last = -1
+        for offset, length in ranges:
+            file_index = 0
+            while length > 0:
+                file_size = sizes[file_index]
+                while offset >= file_size:
+                    offset -= file_size
+                    file_index += 1
+                    file_size = sizes[file_index]
+                hashmap = hashmaps[file_index]
+                block_index = int(offset / block_size)
+                if hashmap[block_index] != last:
+                    last = hashmap[block_index]
+                    yield last
+                bs = block_size
+                if (block_index == len(hashmap) - 1 and
+                        file_size % block_size):
+                    bs = file_size % block_size
+                bl = min(length, bs - offset % block_size)
+                offset += bl
+                length -= bl
+
+    def _get_block(self, hash):
+        if self.prefetcher is not None:
+            return self.prefetcher.get(hash)
+        return self.backend.get_block(hash)
+
     def part_iterator(self):
         if self.length > 0:
             # Get the file for the current offset.
@@ -859,7 +1079,7 @@ class ObjectWrapper(object):
                 self.block_hash = self.hashmaps[
                     self.file_index][self.block_index]
                 try:
-                    self.block = self.backend.get_block(self.block_hash)
+                    self.block = self._get_block(self.block_hash)
                 except ItemNotExists:
                     raise faults.ItemNotFound('Block does not exist')
 
@@ -988,14 +1208,24 @@ def put_object_block(request, hashmap, data, offset, is_snapshot):
 def hashmap_md5(backend, hashmap, size):
     """Produce the MD5 sum from the data in the hashmap."""
 
-    # TODO: Search backend for the MD5 of another object
-    #       with the same hashmap and size...
+    # Identical content has the same checksum, there is no need
+    # to read it again if another object already has it.
+    checksum = backend.lookup_object_checksum(hashmap, size)
+    if checksum:
+        return checksum
+
     md5 = hashlib.md5()
     bs = backend.block_size
+    window = READ_AHEAD_BUFFER_SIZE // bs
+    if READ_AHEAD_WORKERS > 0 and window > 0:
+        get_block = BlockPrefetcher(backend.get_block, hashmap, window,
+                                    _read_ahead_pool).get
+    else:
+        get_block = backend.get_block
     for bi, hash in enumerate(hashmap):
-        data = backend.get_block(hash)  # Blocks come in padded.
+        data = get_block(hash)  # Blocks come in padded.
         if bi == len(hashmap) - 1:
-            data = data[:size % bs]
+            data = data[:size - bi * bs]
         md5.update(data)
     return md5.hexdigest().lower()
 
@@ -1009,7 +1239,46 @@ def simple_list_response(request, l):
         return json.dumps(l)
 
 
-from pithos.backends.util import PithosBackendPool
+def _listing_chunks(items):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == LISTING_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_list_response(request, items, template, tag, name):
+    """Serialize the items as a list, one chunk of items at a time.
+
+    Return an iterator to be used as the response content, so that the
+    serialized listing is never held in memory as a whole. XML chunks are
+    rendered with the template, which receives them as 'objects',
+    inside a <tag name="name"> root element. The output is the same as
+    serializing the whole listing at once.
+    """
+
+    if request.serialization == 'json':
+        yield '['
+        separator = ''
+        for chunk in _listing_chunks(items):
+            yield separator + ', '.join(
+                json.dumps(item, default=json_encode_decimal)
+                for item in chunk)
+            separator = ', '
+        yield ']'
+    elif request.serialization == 'xml':
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n\n'
+               '<%s name="%s">\n  ' % (tag, escape(name)))
+        for chunk in _listing_chunks(items):
+            # Leave out the final newline of the template file.
+            yield render_to_string(template, {'objects': chunk}).rstrip('\n')
+        yield '\n</%s>\n' % tag
+
+
+from pithos.backends.util import PithosBackendPool, WorkerPool
 
 if RADOS_STORAGE:
     BLOCK_PARAMS = {'mappool': RADOS_POOL_MAPS,
@@ -1017,13 +1286,24 @@ if RADOS_STORAGE:
 else:
     BLOCK_PARAMS = {'mappool': None,
                     'blockpool': None, }
+BLOCK_PARAMS.update({'path': BACKEND_BLOCK_PATH,
+                     'umask': BACKEND_BLOCK_UMASK,
+                     'inflight': BACKEND_XSEG_INFLIGHT, })
+
+DB_POOL_PARAMS = {'pool_size': BACKEND_DB_POOL_SIZE,
+                  'max_overflow': BACKEND_DB_POOL_MAX_OVERFLOW,
+                  'pool_recycle': BACKEND_DB_POOL_RECYCLE,
+                  'pool_pre_ping': BACKEND_DB_POOL_PRE_PING, }
 
 BACKEND_KWARGS = dict(
     db_module=BACKEND_DB_MODULE,
     db_connection=BACKEND_DB_CONNECTION,
+    db_pool_params=DB_POOL_PARAMS,
     block_module=BACKEND_BLOCK_MODULE,
     block_size=BACKEND_BLOCK_SIZE,
     hash_algorithm=BACKEND_HASH_ALGORITHM,
+    block_cache_size=BACKEND_BLOCK_CACHE_SIZE,
+    permissions_cache_size=BACKEND_PERMISSIONS_CACHE_SIZE,
     queue_module=BACKEND_QUEUE_MODULE,
     queue_hosts=BACKEND_QUEUE_HOSTS,
     queue_exchange=BACKEND_QUEUE_EXCHANGE,
@@ -1040,11 +1320,15 @@ BACKEND_KWARGS = dict(
     archipelago_conf_file=BACKEND_ARCHIPELAGO_CONF,
     xseg_pool_size=BACKEND_XSEG_POOL_SIZE,
     map_check_interval=BACKEND_MAP_CHECK_INTERVAL,
-    mapfile_prefix=BACKEND_MAPFILE_PREFIX)
+    mapfile_prefix=BACKEND_MAPFILE_PREFIX,
+    request_stats=BACKEND_REQUEST_STATS)
 
 _pithos_backend_pool = PithosBackendPool(size=BACKEND_POOL_SIZE,
                                          **BACKEND_KWARGS)
 
+_read_ahead_pool = WorkerPool(READ_AHEAD_WORKERS)
+_upload_pool = WorkerPool(UPLOAD_WORKERS)
+
 
 def get_backend():
     if BACKEND_POOL_ENABLED:
@@ -1053,6 +1337,8 @@ def get_backend():
         backend = connect_backend(**BACKEND_KWARGS)
     backend.serials = []
     backend.messages = []
+    if backend.stats is not None:
+        backend.stats.reset()
     return backend
 
 
@@ -1082,6 +1368,24 @@ def update_response_headers(request, response):
             response[quote(k)] = quote(v, safe='/=,:@; "')
 
 
+def report_request_stats(request, response):
+    """Log the operations accounted by the backend during the request and,
+       in DEBUG mode, return them in response headers.
+    """
+
+    summary = request.backend.stats.summary()
+    if settings.DEBUG and response is not None:
+        for kind, stats in summary.iteritems():
+            kind = kind.capitalize()
+            response['X-Backend-%s-Count' % kind] = stats['count']
+            response['X-Backend-%s-Time' % kind] = '%.6f' % stats['time']
+    stats_logger.info(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'status': getattr(response, 'status_code', None),
+        'stats': summary}))
+
+
 def api_method(http_method=None, token_required=True, user_required=True,
                logger=None, format_allowed=False, serializations=None,
                strict_serlization=False, lock_container_path=False):
@@ -1103,6 +1407,7 @@ def api_method(http_method=None, token_required=True, user_required=True,
                 raise faults.BadRequest('Object name too large.')
 
             success_status = False
+            response = None
             try:
                 # Add a PithosBackend as attribute of the request object
                 request.backend = get_backend()
@@ -1120,6 +1425,8 @@ def api_method(http_method=None, token_required=True, user_required=True,
                 # Always close PithosBackend connection
                 if getattr(request, "backend", None) is not None:
                     request.backend.post_exec(success_status)
+                    if request.backend.stats is not None:
+                        report_request_stats(request, response)
                     request.backend.close()
         return wrapper
     return decorator
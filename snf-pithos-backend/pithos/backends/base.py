@@ -549,6 +549,13 @@ class BaseBackend(object):
         """
         return ''
 
+    def lookup_object_checksum(self, hashmap, size):
+        """Return the checksum of any object with the same hashmap and size.
+
+        Return None if the checksum is not known.
+        """
+        return None
+
     def update_object_checksum(self, user, account, container, name, version,
                                checksum):
         """Update an object's checksum."""
@@ -681,9 +688,30 @@ class BaseBackend(object):
         """
         return 0
 
-    def get_domain_objects(self, domain, user=None):
+    def get_domain_objects(self, domain, user=None, filterq=None,
+                           sizeq=None, available=None, sort_key=None,
+                           reverse=False, marker=None, limit=None):
         """Return a list of tuples for objects under the domain.
 
         Parameters:
             'user': return only objects accessible to the user.
+
+            'filterq': list of (key, value) pairs the domain metadata
+                       of the objects returned must match
+
+            'sizeq': tuple (min, max) of the object size (max excluded)
+
+            'available': return only (un)available objects
+
+            'sort_key': object property or domain metadata key to order by
+
+            'reverse': order in descending order
+
+            'marker': start listing after the object with this uuid
+                      (only with 'sort_key')
+
+            'limit': number of objects to return (only with 'sort_key')
+
+        Raises:
+            ValueError: No object with the marker uuid
         """
@@ -0,0 +1,93 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import errno
+import mmap
+import tempfile
+
+
+def file_path(root, name, key=None, depth=2, width=2):
+    """Return the path of name under root, sharded in depth levels
+       of width characters of key each (e.g. root/ab/cd/abcdef...).
+       If key is not given, name is used.
+    """
+    key = key or name
+    parts = [key[i * width:(i + 1) * width] for i in xrange(depth)]
+    return os.path.join(root, *(parts + [name]))
+
+
+def makedirs(path, umask=0o022):
+    try:
+        os.makedirs(path, 0o777 & ~umask)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def file_exists(path):
+    return os.path.exists(path)
+
+
+def file_read(path, offset=0, size=None):
+    """Read size bytes at offset from the file at path.
+       The file is memory mapped, so that no intermediate buffers
+       are built. Return None if the file does not exist.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    try:
+        length = os.fstat(fd).st_size
+        if offset >= length:
+            return ''
+        end = length if size is None else min(length, offset + size)
+        m = mmap.mmap(fd, length, access=mmap.ACCESS_READ)
+        try:
+            return m[offset:end]
+        finally:
+            m.close()
+    finally:
+        os.close(fd)
+
+
+def file_write_atomic(path, data, umask=0o022):
+    """Write data to the file at path.
+       Data is written in a temporary file in the same directory, which
+       is then renamed over path, so that readers never see partial files.
+    """
+    dirname = os.path.dirname(path)
+    makedirs(dirname, umask)
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    try:
+        try:
+            view = buffer(data)
+            while view:
+                written = os.write(fd, view)
+                view = buffer(view, written)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.rename(tmp, path)
+    except:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
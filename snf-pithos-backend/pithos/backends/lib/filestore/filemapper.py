@@ -0,0 +1,59 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from hashlib import sha1
+from binascii import hexlify
+from urllib import quote
+
+from context_file import file_path, file_read, file_write_atomic
+
+
+class FileMapper(object):
+    """Mapper.
+       Required constructor parameters: mappath, namelen.
+       Optional umask.
+    """
+
+    mappath = None
+    namelen = None
+
+    def __init__(self, **params):
+        self.params = params
+        self.namelen = params['namelen']
+        self.mappath = params['mappath']
+        self.umask = params.get('umask', 0o022)
+
+    def _map_path(self, maphash):
+        # Map names share common prefixes (e.g. 'snf_file_'),
+        # so shard them by a digest of the name.
+        return file_path(self.mappath, quote(maphash, safe=''),
+                         key=sha1(maphash).hexdigest())
+
+    def map_retr(self, maphash, size):
+        """Return as a list, part of the hashes map of an object
+           at the given block offset.
+           By default, return the whole hashes map.
+        """
+        namelen = self.namelen
+        data = file_read(self._map_path(maphash))
+        if data is None:
+            raise Exception("Could not retrieve mapfile %s." % maphash)
+        return [hexlify(data[i:i + namelen])
+                for i in xrange(0, len(data), namelen)]
+
+    def map_stor(self, maphash, hashes, size, block_size):
+        """Store hashes in the given hashes map."""
+        file_write_atomic(self._map_path(maphash), ''.join(hashes),
+                          self.umask)
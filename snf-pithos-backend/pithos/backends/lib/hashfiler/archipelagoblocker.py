@@ -15,6 +15,7 @@
 
 from hashlib import new as newhasher
 from binascii import hexlify
+from collections import deque
 import ConfigParser
 
 from context_archipelago import ArchipelagoObject, file_sync_read_chunks
@@ -32,14 +33,19 @@ from pithos.workers import (
 monkey.patch_Request()
 
 
+DEFAULT_INFLIGHT = 32
+
+
 class ArchipelagoBlocker(object):
     """Blocker.
        Required constructor parameters: blocksize, hashtype.
+       Optional inflight.
     """
 
     blocksize = None
     blockpool = None
     hashtype = None
+    inflight = DEFAULT_INFLIGHT
 
     def __init__(self, **params):
         cfg = ConfigParser.ConfigParser()
@@ -61,6 +67,7 @@ class ArchipelagoBlocker(object):
         self.hashtype = hashtype
         self.hashlen = len(emptyhash)
         self.emptyhash = emptyhash
+        self.inflight = max(1, params.get('inflight') or DEFAULT_INFLIGHT)
 
     def _pad(self, block):
         return block + ('\x00' * (self.blocksize - len(block)))
@@ -69,19 +76,50 @@ class ArchipelagoBlocker(object):
         name = hexlify(blkhash)
         return ArchipelagoObject(name, self.ioctx_pool, self.dst_port, create)
 
-    def _check_rear_block(self, blkhash):
-        filename = hexlify(blkhash)
+    def _check_rear_blocks(self, hashes):
+        """Check the existence of many blocks at once.
+           Info requests are pipelined on a single ioctx, keeping at most
+           self.inflight of them outstanding, so that the whole check costs
+           about one round trip per window instead of one per block.
+           Return a list of booleans, one for each of the given hashes.
+        """
+        found = []
+        append = found.append
+        pending = deque()
         ioctx = self.ioctx_pool.pool_get()
-        req = Request.get_info_request(ioctx, self.dst_port, filename)
-        req.submit()
-        req.wait()
-        ret = req.success()
-        req.put()
-        self.ioctx_pool.pool_put(ioctx)
-        if ret:
-            return True
-        else:
-            return False
+
+        def reap():
+            req = pending.popleft()
+            try:
+                req.wait()
+                append(bool(req.success()))
+            finally:
+                req.put()
+
+        try:
+            for h in hashes:
+                if len(pending) >= self.inflight:
+                    reap()
+                req = Request.get_info_request(ioctx, self.dst_port,
+                                               hexlify(h))
+                try:
+                    req.submit()
+                except:
+                    req.put()
+                    raise
+                pending.append(req)
+            while pending:
+                reap()
+        finally:
+            # Drain outstanding requests before giving back the ioctx.
+            while pending:
+                req = pending.popleft()
+                try:
+                    req.wait()
+                finally:
+                    req.put()
+            self.ioctx_pool.pool_put(ioctx)
+        return found
 
     def block_hash(self, data):
         """Hash a block of data"""
@@ -93,14 +131,15 @@ class ArchipelagoBlocker(object):
         """Check hashes for existence and
            return those missing from block storage.
         """
-        notfound = []
-        append = notfound.append
-
+        unique = []
+        seen = set()
         for h in hashes:
-            if h not in notfound and not self._check_rear_block(h):
-                append(h)
+            if h not in seen:
+                seen.add(h)
+                unique.append(h)
 
-        return notfound
+        found = self._check_rear_blocks(unique)
+        return [h for h, f in zip(unique, found) if not f]
 
     def block_retr(self, hashes):
         """Retrieve blocks from storage by their hashes."""
@@ -171,8 +210,8 @@ class ArchipelagoBlocker(object):
         """
         block_hash = self.block_hash
         hashlist = [block_hash(b) for b in blocklist]
-        missing = [i for i, h in enumerate(hashlist) if not
-                   self._check_rear_block(h)]
+        found = self._check_rear_blocks(hashlist)
+        missing = [i for i, f in enumerate(found) if not f]
         for i in missing:
             with self._get_rear_block(hashlist[i], 1) as rbl:
                 rbl.sync_write(blocklist[i])  # XXX: verify?
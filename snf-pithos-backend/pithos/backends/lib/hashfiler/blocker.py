@@ -19,7 +19,7 @@ from archipelagoblocker import ArchipelagoBlocker
 class Blocker(object):
     """Blocker.
        Required constructor parameters: blocksize, blockpath, hashtype.
-       Optional blockpool.
+       Optional blockpool, inflight.
     """
 
     def __init__(self, **params):
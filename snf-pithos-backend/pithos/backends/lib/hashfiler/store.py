@@ -23,12 +23,14 @@ class Store(object):
     """Store.
        Required constructor parameters: path, block_size, hash_algorithm,
        blockpool, mappool.
+       Optional inflight.
     """
 
     def __init__(self, **params):
         pb = {'blocksize': params['block_size'],
               'hashtype': params['hash_algorithm'],
               'archipelago_cfile': params['archipelago_cfile'],
+              'inflight': params.get('inflight'),
               }
         self.blocker = Blocker(**pb)
         pm = {'namelen': self.blocker.hashlen,
@@ -0,0 +1,22 @@
+"""add versions hash size index
+
+Revision ID: 1f1d4e38b1c5
+Revises: 2efddde15abf
+Create Date: 2014-07-02 12:14:33.620154
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f1d4e38b1c5'
+down_revision = '2efddde15abf'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index('idx_versions_hash_size', 'versions', ['hash', 'size'])
+
+
+def downgrade():
+    op.drop_index('idx_versions_hash_size', tablename='versions')
@@ -0,0 +1,29 @@
+"""create xfeatures version table
+
+Revision ID: 3a1c5b7e9d20
+Revises: 1f1d4e38b1c5
+Create Date: 2014-09-15 11:42:08.365201
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3a1c5b7e9d20'
+down_revision = '1f1d4e38b1c5'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'xfeatures_version',
+        sa.Column('version', sa.Integer, nullable=False, default=0),
+        mysql_engine='InnoDB')
+
+    t = sa.sql.table('xfeatures_version',
+                     sa.sql.column('version', sa.Integer))
+    op.bulk_insert(t, [{'version': 0}])
+
+
+def downgrade():
+    op.drop_table('xfeatures_version')
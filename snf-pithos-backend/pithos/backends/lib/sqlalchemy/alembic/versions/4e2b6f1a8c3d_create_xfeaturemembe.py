@@ -0,0 +1,34 @@
+"""create xfeaturemembers table
+
+Revision ID: 4e2b6f1a8c3d
+Revises: 3a1c5b7e9d20
+Create Date: 2014-09-22 10:05:31.114728
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4e2b6f1a8c3d'
+down_revision = '3a1c5b7e9d20'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'xfeaturemembers',
+        sa.Column('member', sa.String(256), primary_key=True),
+        sa.Column('path', sa.String(2048), primary_key=True),
+        mysql_engine='InnoDB')
+    op.create_index('idx_xfeaturemembers_path', 'xfeaturemembers', ['path'])
+
+    # index existing permissions
+    op.execute("""INSERT INTO xfeaturemembers (member, path)
+                  SELECT DISTINCT v.value, f.path
+                  FROM xfeatures f, xfeaturevals v
+                  WHERE f.feature_id = v.feature_id""")
+
+
+def downgrade():
+    op.drop_index('idx_xfeaturemembers_path', tablename='xfeaturemembers')
+    op.drop_table('xfeaturemembers')
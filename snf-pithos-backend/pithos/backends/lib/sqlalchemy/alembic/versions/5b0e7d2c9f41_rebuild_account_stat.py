@@ -0,0 +1,45 @@
+"""rebuild account statistics
+
+Revision ID: 5b0e7d2c9f41
+Revises: 4e2b6f1a8c3d
+Create Date: 2014-10-06 12:41:08.305516
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b0e7d2c9f41'
+down_revision = '4e2b6f1a8c3d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Account usage is now read from the account statistics,
+    # recompute it from the object versions of each cluster.
+    op.execute("""UPDATE statistics
+                  SET size = (SELECT coalesce(sum(v.size), 0)
+                              FROM versions v, nodes o, nodes c
+                              WHERE v.node = o.node
+                              AND o.parent = c.node
+                              AND c.parent = statistics.node
+                              AND v.cluster = statistics.cluster)
+                  WHERE node IN (SELECT node FROM nodes
+                                 WHERE parent = 0 AND node != 0)""")
+
+    op.execute("""INSERT INTO statistics (node, population, size, mtime,
+                                          cluster)
+                  SELECT a.node, 0, sum(v.size), max(v.mtime), v.cluster
+                  FROM nodes a, nodes c, nodes o, versions v
+                  WHERE a.parent = 0 AND a.node != 0
+                  AND c.parent = a.node
+                  AND o.parent = c.node
+                  AND v.node = o.node
+                  AND NOT EXISTS (SELECT 1 FROM statistics s
+                                  WHERE s.node = a.node
+                                  AND s.cluster = v.cluster)
+                  GROUP BY a.node, v.cluster""")
+
+
+def downgrade():
+    pass
@@ -13,15 +13,83 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from threading import Lock
+from time import time
+
 from sqlalchemy import create_engine
-from sqlalchemy.pool import NullPool
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.pool import NullPool, QueuePool
 from sqlalchemy.interfaces import PoolListener
 
 
+class PingListener(PoolListener):
+    """Test connections as they are checked out of the pool,
+       so that stale ones are replaced instead of failing a request."""
+
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        try:
+            cursor = dbapi_con.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+        except Exception:
+            raise DisconnectionError()
+
+
+class TimedConnection(object):
+    """A connection proxy accounting the statements executed to stats."""
+
+    def __init__(self, conn, stats):
+        self._conn = conn
+        self._stats = stats
+
+    def execute(self, *args, **kwargs):
+        start = time()
+        try:
+            return self._conn.execute(*args, **kwargs)
+        finally:
+            self._stats.add('sql', time() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# Pooled engines are shared among all wrappers of the process.
+_engines = {}
+_engines_lock = Lock()
+
+
+def _get_pooled_engine(db, pool_size, max_overflow, pool_timeout,
+                       pool_recycle, pool_pre_ping):
+    key = (db, pool_size, max_overflow, pool_timeout, pool_recycle,
+           pool_pre_ping)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            listeners = [PingListener()] if pool_pre_ping else []
+            engine = _engines[key] = create_engine(
+                db, poolclass=QueuePool, pool_size=pool_size,
+                max_overflow=max_overflow, pool_timeout=pool_timeout,
+                pool_recycle=pool_recycle, listeners=listeners,
+                isolation_level='READ COMMITTED')
+        return engine
+
+
 class DBWrapper(object):
-    """Database connection wrapper."""
+    """Database connection wrapper.
+
+    If pool_size is positive, connections are taken from a pool shared by
+    all the wrappers of the process for the same database. A connection
+    is checked out when first needed and returned to the pool at the end
+    of each transaction. Otherwise, the wrapper keeps its own connection.
 
-    def __init__(self, db):
+    If stats is set, the statements executed are accounted to it.
+    """
+
+    stats = None
+
+    def __init__(self, db, pool_size=0, max_overflow=10, pool_timeout=30,
+                 pool_recycle=-1, pool_pre_ping=False):
+        self.pooled = pool_size > 0 and not db.startswith('sqlite://')
         if db.startswith('sqlite://'):
             class ForeignKeysListener(PoolListener):
                 def connect(self, dbapi_con, con_record):
@@ -34,18 +102,35 @@ class DBWrapper(object):
         #elif db.startswith('mysql://'):
         #    db = '%s?charset=utf8&use_unicode=0' %db
         #    self.engine = create_engine(db, convert_unicode=True)
+        elif self.pooled:
+            self.engine = _get_pooled_engine(db, pool_size, max_overflow,
+                                             pool_timeout, pool_recycle,
+                                             pool_pre_ping)
         else:
-            #self.engine = create_engine(db, pool_size=0, max_overflow=-1)
             self.engine = create_engine(
                 db, poolclass=NullPool, isolation_level='READ COMMITTED')
         self.engine.echo = False
         self.engine.echo_pool = False
-        self.conn = self.engine.connect()
+        self._conn = None if self.pooled else self.engine.connect()
         self.trans = None
 
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = self.engine.connect()
+        if self.stats is not None:
+            return TimedConnection(self._conn, self.stats)
+        return self._conn
+
+    def _release(self):
+        if self.pooled and self._conn is not None:
+            self._conn.close()  # return the connection to the pool
+            self._conn = None
+
     def close(self):
-        self.conn.close()
-        self.conn = None
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
 
     def execute(self):
         self.trans = self.conn.begin()
@@ -53,7 +138,9 @@ class DBWrapper(object):
     def commit(self):
         self.trans.commit()
         self.trans = None
+        self._release()
 
     def rollback(self):
         self.trans.rollback()
         self.trans = None
+        self._release()
@@ -42,6 +42,7 @@ class Groups(DBWorker):
 
     def __init__(self, **params):
         DBWorker.__init__(self, **params)
+        self.group_parents_memo = {}
         try:
             metadata = MetaData(self.engine)
             self.groups = Table('groups', metadata, autoload=True)
@@ -85,6 +86,7 @@ class Groups(DBWorker):
             s = self.groups.insert()
             r = self.conn.execute(s, owner=owner, name=group, member=member)
             r.close()
+            self.group_parents_memo.clear()
 
     def group_addmany(self, owner, group, members):
         """Add members to a group."""
@@ -94,6 +96,7 @@ class Groups(DBWorker):
                        'name': group,
                        'member': m} for m in members)
         self.conn.execute(ins, values)
+        self.group_parents_memo.clear()
 
     def group_remove(self, owner, group, member):
         """Remove a member from a group."""
@@ -103,6 +106,7 @@ class Groups(DBWorker):
                                             self.groups.c.member == member))
         r = self.conn.execute(s)
         r.close()
+        self.group_parents_memo.clear()
 
     def group_delete(self, owner, group):
         """Delete a group."""
@@ -111,6 +115,7 @@ class Groups(DBWorker):
                                             self.groups.c.name == group))
         r = self.conn.execute(s)
         r.close()
+        self.group_parents_memo.clear()
 
     def group_destroy(self, owner):
         """Delete all groups belonging to owner."""
@@ -118,6 +123,7 @@ class Groups(DBWorker):
         s = self.groups.delete().where(self.groups.c.owner == owner)
         r = self.conn.execute(s)
         r.close()
+        self.group_parents_memo.clear()
 
     def group_members(self, owner, group):
         """Return the list of members of a group."""
@@ -144,9 +150,10 @@ class Groups(DBWorker):
     def group_parents(self, member):
         """Return all (owner, group) tuples that contain member."""
 
-        s = select([self.groups.c.owner, self.groups.c.name],
-                   self.groups.c.member == member)
-        r = self.conn.execute(s)
-        l = r.fetchall()
-        r.close()
-        return l
+        if member not in self.group_parents_memo:
+            s = select([self.groups.c.owner, self.groups.c.name],
+                       self.groups.c.member == member)
+            r = self.conn.execute(s)
+            self.group_parents_memo[member] = r.fetchall()
+            r.close()
+        return self.group_parents_memo[member]
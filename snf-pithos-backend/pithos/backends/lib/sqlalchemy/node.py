@@ -22,7 +22,7 @@ from sqlalchemy import (Table, Integer, BigInteger, DECIMAL, Boolean,
                         Column, String, MetaData, ForeignKey)
 from sqlalchemy.schema import Index, Sequence
 from sqlalchemy.sql import (func, and_, or_, not_, select, bindparam, exists,
-                            functions)
+                            functions, case, text, cast)
 from sqlalchemy.sql.expression import true, literal
 from sqlalchemy.exc import NoSuchTableError, IntegrityError
 
@@ -35,6 +35,9 @@ ROOTNODE = 0
 
 (MATCH_PREFIX, MATCH_EXACT) = range(2)
 
+# Ancestors looked up per query (root, account, container).
+ANCESTOR_LEVELS = 3
+
 inf = float('inf')
 
 
@@ -143,6 +146,7 @@ def create_tables(engine):
     versions = Table('versions', metadata, *columns, mysql_engine='InnoDB')
     Index('idx_versions_node_mtime', versions.c.node, versions.c.mtime)
     Index('idx_versions_node_uuid', versions.c.uuid)
+    Index('idx_versions_hash_size', versions.c.hash, versions.c.size)
 
     #create attributes table
     columns = []
@@ -357,7 +361,8 @@ class Node(DBWorker):
         nr, size = row[0], row[1] if row[1] else 0
         mtime = time()
         self.statistics_update(parent, -nr, -size, mtime, cluster)
-        self.statistics_update_ancestors(parent, -nr, -size, mtime, cluster,
+        # Population isn't recursive
+        self.statistics_update_ancestors(parent, 0, -size, mtime, cluster,
                                          update_statistics_ancestors_depth)
 
         s = select([self.versions.c.hash, self.versions.c.serial])
@@ -600,28 +605,9 @@ class Node(DBWorker):
         r.close()
         return row
 
-    def statistics_update(self, node, population, size, mtime, cluster=0):
-        """Update the statistics of the given node.
-           Statistics keep track the population, total
-           size of objects and mtime in the node's namespace.
-           May be zero or positive or negative numbers.
-        """
-        s = select([self.statistics.c.population, self.statistics.c.size],
-                   and_(self.statistics.c.node == node,
-                        self.statistics.c.cluster == cluster))
-        rp = self.conn.execute(s)
-        r = rp.fetchone()
-        rp.close()
-        if not r:
-            prepopulation, presize = (0, 0)
-        else:
-            prepopulation, presize = r
-        population += prepopulation
-        population = max(population, 0)
-        size += presize
+    def statistics_set(self, node, population, size, mtime, cluster=0):
+        """Set the statistics of the given node."""
 
-        #insert or replace
-        #TODO better upsert
         u = self.statistics.update().where(and_(
             self.statistics.c.node == node,
             self.statistics.c.cluster == cluster))
@@ -634,6 +620,146 @@ class Node(DBWorker):
                              mtime=mtime, cluster=cluster)
             self.conn.execute(ins).close()
 
+    def statistics_compute(self, account, cluster=0):
+        """Return a list of (node, path, population, size, mtime) tuples
+           with the statistics of the account's containers, as computed
+           from the versions of their objects that belong to the cluster.
+        """
+
+        n = self.nodes.alias('n')
+        s = select([n.c.parent,
+                    func.count(self.versions.c.serial),
+                    func.sum(self.versions.c.size),
+                    func.max(self.versions.c.mtime)])
+        s = s.where(and_(self.versions.c.node == n.c.node,
+                         self.versions.c.cluster == cluster,
+                         n.c.parent.in_(select([self.nodes.c.node],
+                                               self.nodes.c.parent ==
+                                               account))))
+        s = s.group_by(n.c.parent)
+        r = self.conn.execute(s)
+        stats = dict((row[0], row[1:]) for row in r.fetchall())
+        r.close()
+
+        s = select([self.nodes.c.node, self.nodes.c.path],
+                   self.nodes.c.parent == account)
+        s = s.order_by(self.nodes.c.path)
+        r = self.conn.execute(s)
+        containers = r.fetchall()
+        r.close()
+        return [(node, path) + tuple(stats.get(node, (0, 0, None)))
+                for node, path in containers]
+
+    def node_get_ancestors(self, node, depth=None):
+        """Return the list of the node's ancestors,
+           from its parent up to the root
+           or up to ``depth`` levels (if not None).
+        """
+
+        ancestors = []
+        while node != ROOTNODE:
+            levels = ANCESTOR_LEVELS
+            if depth is not None:
+                levels = min(levels, depth - len(ancestors))
+            if levels <= 0:
+                break
+            n = [self.nodes.alias() for i in range(levels)]
+            j = n[0]
+            for child, parent in zip(n, n[1:]):
+                j = j.outerjoin(parent, parent.c.node == child.c.parent)
+            s = select([x.c.parent for x in n], from_obj=[j])
+            s = s.where(n[0].c.node == node)
+            r = self.conn.execute(s)
+            row = r.fetchone()
+            r.close()
+            if row is None:
+                break
+            for parent in row:
+                if parent is None:
+                    return ancestors
+                ancestors.append(parent)
+                node = parent
+                if node == ROOTNODE:
+                    break
+        return ancestors
+
+    def _statistics_has_upsert(self):
+        dialect = self.engine.dialect
+        return (dialect.name == 'postgresql' and
+                dialect.server_version_info >= (9, 5))
+
+    def statistics_update(self, node, population, size, mtime, cluster=0):
+        """Update the statistics of the given node.
+           Statistics keep track the population, total
+           size of objects and mtime in the node's namespace.
+           May be zero or positive or negative numbers.
+        """
+
+        self.statistics_update_bulk([(node, population)], size, mtime,
+                                    cluster)
+
+    def statistics_update_bulk(self, deltas, size, mtime, cluster=0):
+        """Update the statistics of the nodes in deltas, a list of
+           (node, population) tuples, adding the node's population
+           and size to each of them.
+
+           Nodes are sorted, so that concurrent updates
+           lock the statistics rows in the same order.
+        """
+
+        if not deltas:
+            return
+        deltas = sorted(deltas)
+
+        if self._statistics_has_upsert():
+            params = {'size': size, 'mtime': mtime, 'cluster': cluster}
+            values = []
+            whens = []
+            for i, (node, population) in enumerate(deltas):
+                params['node%d' % i] = node
+                params['population%d' % i] = population
+                values.append('(:node%d, greatest(:population%d, 0), '
+                              ':size, :mtime, :cluster)' % (i, i))
+                if population:
+                    whens.append('when :node%d then :population%d' % (i, i))
+            delta = 'case excluded.node %s else 0 end' % ' '.join(whens) \
+                if whens else '0'
+            q = ("insert into statistics "
+                 "(node, population, size, mtime, cluster) "
+                 "values %s "
+                 "on conflict (node, cluster) do update set "
+                 "population = greatest(statistics.population + %s, 0), "
+                 "size = statistics.size + excluded.size, "
+                 "mtime = excluded.mtime") % (', '.join(values), delta)
+            self.conn.execute(text(q), params).close()
+            return
+
+        c = self.statistics.c
+        nodes = [node for node, _ in deltas]
+        whens = [(c.node == node, p) for node, p in deltas if p]
+        population = c.population
+        if whens:
+            population = population + case(whens, else_=0)
+        u = self.statistics.update().where(and_(c.node.in_(nodes),
+                                                c.cluster == cluster))
+        u = u.values(population=case([(population < 0, 0)],
+                                     else_=population),
+                     size=c.size + size,
+                     mtime=mtime)
+        rp = self.conn.execute(u)
+        rp.close()
+        if rp.rowcount == len(nodes):
+            return
+
+        s = select([c.node], and_(c.node.in_(nodes), c.cluster == cluster))
+        r = self.conn.execute(s)
+        existing = set(row[0] for row in r.fetchall())
+        r.close()
+        self.conn.execute(self.statistics.insert(), [
+            dict(node=node, population=max(p, 0), size=size,
+                 mtime=mtime, cluster=cluster)
+            for node, p in deltas if node not in existing]).close()
+
     def statistics_update_ancestors(self, node, population, size, mtime,
                                     cluster=0, recursion_depth=None):
         """Update the statistics of the given node's parent.
@@ -642,20 +768,47 @@ class Node(DBWorker):
            Population is not recursive.
         """
 
-        i = 0
-        while True:
-            if node == ROOTNODE:
-                break
-            if recursion_depth is not None and recursion_depth <= i:
-                break
-            props = self.node_get_properties(node)
-            if props is None:
-                break
-            parent, path = props
-            self.statistics_update(parent, population, size, mtime, cluster)
-            node = parent
-            population = 0  # Population isn't recursive
-            i += 1
+        ancestors = self.node_get_ancestors(node, recursion_depth)
+        if not ancestors:
+            return
+        # Population isn't recursive
+        deltas = [(ancestors[0], population)]
+        deltas.extend((parent, 0) for parent in ancestors[1:])
+        self.statistics_update_bulk(deltas, size, mtime, cluster)
+
+    def statistics_update_ancestors_bulk(self, deltas, mtime, cluster=0,
+                                         recursion_depth=None):
+        """Update the statistics of the parents of the nodes in deltas,
+           a list of (node, population, size) tuples, as
+           statistics_update_ancestors would for each one of them.
+           The deltas of nodes with the same parent are aggregated,
+           so that each ancestor is updated once.
+        """
+
+        if not deltas or recursion_depth == 0:
+            return
+        c = self.nodes.c
+        s = select([c.node, c.parent],
+                   c.node.in_(set(node for node, _, _ in deltas)))
+        r = self.conn.execute(s)
+        parents = dict(r.fetchall())
+        r.close()
+
+        totals = defaultdict(lambda: [0, 0])
+        for node, population, size in deltas:
+            if node == ROOTNODE or node not in parents:
+                continue
+            total = totals[parents[node]]
+            total[0] += population
+            total[1] += size
+        if recursion_depth is not None:
+            recursion_depth -= 1
+        for parent, (population, size) in sorted(totals.iteritems()):
+            ancestors = self.node_get_ancestors(parent, recursion_depth)
+            # Population isn't recursive
+            deltas = [(parent, population)]
+            deltas.extend((ancestor, 0) for ancestor in ancestors)
+            self.statistics_update_bulk(deltas, size, mtime, cluster)
 
     def statistics_latest(self, node, before=inf, except_cluster=0):
         """Return population, total size and last mtime
@@ -812,6 +965,90 @@ class Node(DBWorker):
 
         return serial, mtime, mapfile
 
+    # Version properties that version_create_bulk() may override.
+    _version_bulk_props = ('hash', 'size', 'type', 'checksum', 'available',
+                           'map_check_timestamp', 'is_snapshot')
+
+    def version_create_bulk(self, sources, muser, cluster=0,
+                            update_statistics_ancestors_depth=None,
+                            new_mapfiles=False, **props):
+        """Create new versions from the properties of existing ones.
+           Sources is a list of (serial, node, uuid) tuples: the version
+           to copy (each one at most once), the node of the new version
+           and its uuid (or None to keep the uuid of the copied version).
+           Keyword arguments (hash, size, type, checksum, available,
+           map_check_timestamp, is_snapshot) set the property for all the
+           new versions.
+
+           New versions keep the mapfile of the copied version, or are
+           assigned new unique identifiers if new_mapfiles is True.
+           Versions of size 0 get no mapfile.
+
+           Return a list with the (serial, mtime, mapfile) of the new
+           versions, in the order of sources.
+
+           :raises DatabaseError
+        """
+
+        if not sources:
+            return []
+        mtime = time()
+        params = {'mtime': mtime, 'muser': muser, 'cluster': cluster,
+                  'mapfile_prefix': self.mapfile_prefix}
+        cols = {}
+        for key in self._version_bulk_props:
+            if key in props:
+                params['p_' + key] = props[key]
+                cols[key] = ':p_' + key
+            else:
+                cols[key] = key
+        serials = []
+        nodes = []
+        uuids = []
+        for i, (serial, node, uuid) in enumerate(sources):
+            params['serial%d' % i] = serial
+            params['node%d' % i] = node
+            serials.append(':serial%d' % i)
+            nodes.append('when :serial%d then :node%d' % (i, i))
+            if uuid is not None:
+                params['uuid%d' % i] = uuid
+                uuids.append('when :serial%d then :uuid%d' % (i, i))
+        cols['serials'] = ', '.join(serials)
+        cols['node'] = 'case serial %s end' % ' '.join(nodes)
+        cols['uuid'] = ('case serial %s else uuid end' % ' '.join(uuids)
+                        if uuids else 'uuid')
+        mapfile = ("concat(:mapfile_prefix, nextval('mapfile_seq'))"
+                   if new_mapfiles else 'mapfile')
+        cols['mapfile'] = ('case when %s = 0 then null else %s end' %
+                           (cols['size'], mapfile))
+
+        q = ("insert into versions (node, hash, size, type, source, mtime, "
+             "muser, uuid, checksum, cluster, available, "
+             "map_check_timestamp, mapfile, is_snapshot) "
+             "select %(node)s, %(hash)s, %(size)s, %(type)s, serial, "
+             ":mtime, :muser, %(uuid)s, %(checksum)s, :cluster, "
+             "%(available)s, %(map_check_timestamp)s, %(mapfile)s, "
+             "%(is_snapshot)s "
+             "from versions where serial in (%(serials)s) "
+             "returning source, serial, node, size, mapfile") % cols
+        r = self.conn.execute(text(q), params)
+        created = dict((row[0], row[1:]) for row in r.fetchall())
+        r.close()
+
+        self.statistics_update_ancestors_bulk(
+            [(node, 1, size) for _, node, size, _ in created.itervalues()],
+            mtime, cluster, update_statistics_ancestors_depth)
+
+        c = self.nodes.c
+        latest = [(node, serial) for serial, node, _, _
+                  in created.itervalues()]
+        u = self.nodes.update().where(c.node.in_([n for n, _ in latest]))
+        u = u.values(latest_version=case(latest, value=c.node))
+        self.conn.execute(u).close()
+
+        return [(created[serial][0], mtime, created[serial][3])
+                for serial, node, uuid in sources]
+
     def version_lookup(self, node, before=inf, cluster=0, all_props=True,
                        keys=()):
         """Lookup the current version of the given node.
@@ -925,6 +1162,21 @@ class Node(DBWorker):
         rp.close()
         return r
 
+    def version_lookup_checksum(self, hash, size):
+        """Return the checksum of any version with the given hash and size.
+           Return None if no such version has a checksum.
+        """
+
+        v = self.versions
+        s = select([v.c.checksum], and_(v.c.hash == hash,
+                                        v.c.size == size,
+                                        v.c.checksum != ''))
+        s = s.limit(1)
+        rp = self.conn.execute(s)
+        r = rp.fetchone()
+        rp.close()
+        return r[0] if r else None
+
     def version_put_property(self, serial, key, value, props=None):
         """Set value for the property of version specified by key."""
 
@@ -960,6 +1212,37 @@ class Node(DBWorker):
         s = s.values(cluster=cluster)
         self.conn.execute(s).close()
 
+    def version_recluster_bulk(self, serials, cluster,
+                               update_statistics_ancestors_depth=None):
+        """Move the versions into another cluster."""
+
+        if not serials:
+            return
+        v = self.versions.c
+        s = select([v.serial, v.node, v.size, v.cluster],
+                   and_(v.serial.in_(serials), v.cluster != cluster))
+        r = self.conn.execute(s)
+        rows = r.fetchall()
+        r.close()
+        if not rows:
+            return
+
+        mtime = time()
+        deltas = defaultdict(list)
+        for serial, node, size, oldcluster in rows:
+            deltas[oldcluster].append((node, -1, -size))
+        for oldcluster, d in deltas.iteritems():
+            self.statistics_update_ancestors_bulk(
+                d, mtime, oldcluster, update_statistics_ancestors_depth)
+        self.statistics_update_ancestors_bulk(
+            [(node, 1, size) for serial, node, size, oldcluster in rows],
+            mtime, cluster, update_statistics_ancestors_depth)
+
+        s = self.versions.update()
+        s = s.where(v.serial.in_([row[0] for row in rows]))
+        s = s.values(cluster=cluster)
+        self.conn.execute(s).close()
+
     def version_remove(self, serial, update_statistics_ancestors_depth=None):
         """Remove the serial specified."""
 
@@ -984,6 +1267,48 @@ class Node(DBWorker):
 
         return hash, size
 
+    def version_remove_bulk(self, serials,
+                            update_statistics_ancestors_depth=None):
+        """Remove the serials specified.
+           Return a list with the (serial, hash, size)
+           of the removed versions.
+        """
+
+        if not serials:
+            return []
+        v = self.versions.c
+        s = select([v.serial, v.node, v.hash, v.size, v.cluster],
+                   v.serial.in_(serials))
+        r = self.conn.execute(s)
+        rows = r.fetchall()
+        r.close()
+        if not rows:
+            return []
+
+        mtime = time()
+        deltas = defaultdict(list)
+        for serial, node, hash, size, cluster in rows:
+            deltas[cluster].append((node, -1, -size))
+        for cluster, d in deltas.iteritems():
+            self.statistics_update_ancestors_bulk(
+                d, mtime, cluster, update_statistics_ancestors_depth)
+
+        removed = [row[0] for row in rows]
+        s = self.versions.delete().where(v.serial.in_(removed))
+        self.conn.execute(s).close()
+
+        # Point the nodes that lost their latest version to the one left.
+        n = self.nodes.c
+        latest = select([func.max(v.serial)], v.node == n.node).as_scalar()
+        s = self.nodes.update().where(and_(
+            n.node.in_(set(row[1] for row in rows)),
+            n.latest_version.in_(removed)))
+        s = s.values(latest_version=latest)
+        self.conn.execute(s).close()
+
+        return [(serial, hash, size)
+                for serial, node, hash, size, cluster in rows]
+
     def attribute_get(self, serial, domain, keys=()):
         """Return a list of (key, value) pairs of the specific version.
 
@@ -1073,12 +1398,47 @@ class Node(DBWorker):
                              is_latest=True, key=k, value=v)
             self.conn.execute(s).close()
 
+    def attribute_copy_bulk(self, pairs):
+        """Copy the attributes of versions to other versions,
+           given as (source, dest) serial pairs.
+           Destination versions must have no attributes (e.g. be new).
+        """
+
+        if not pairs:
+            return
+        params = {}
+        values = []
+        for i, (source, dest) in enumerate(pairs):
+            params['source%d' % i] = source
+            params['dest%d' % i] = dest
+            values.append('(:source%d, :dest%d)' % (i, i))
+        q = ("insert into attributes "
+             "(serial, domain, node, is_latest, key, value) "
+             "select v.serial, a.domain, v.node, true, a.key, a.value "
+             "from (values %s) as p (source, dest) "
+             "join attributes a on a.serial = p.source "
+             "join versions v on v.serial = p.dest") % ', '.join(values)
+        self.conn.execute(text(q), params).close()
+
     def attribute_unset_is_latest(self, node, exclude):
         u = self.attributes.update().where(and_(
             self.attributes.c.node == node,
             self.attributes.c.serial != exclude)).values({'is_latest': False})
         self.conn.execute(u)
 
+    def attribute_unset_is_latest_bulk(self, nodes, exclude):
+        """Unset is_latest for the attributes of the nodes,
+           except for those of the serials in exclude.
+        """
+
+        if not nodes:
+            return
+        c = self.attributes.c
+        u = self.attributes.update().where(and_(
+            c.node.in_(nodes),
+            not_(c.serial.in_(exclude)))).values({'is_latest': False})
+        self.conn.execute(u).close()
+
     def latest_attribute_keys(self, parent, domain, before=inf,
                               except_cluster=0, pathq=None):
         """Return a list with all keys pairs defined
@@ -1284,6 +1644,28 @@ class Node(DBWorker):
             rp.close()
             return r, ()
 
+        # Fetch the listing in batches of limit rows, skipping the paths
+        # under each common prefix found. Only restart the query past a
+        # prefix, if its paths fill the rest of the batch.
+        s = s.limit(limit)
+
+        def fetch(start):
+            rp = self.conn.execute(s, start=start)
+            rows = rp.fetchall()
+            rp.close()
+            return rows
+
+        return self._delimit_listing(fetch, start, prefix, delimiter, limit)
+
+    def _delimit_listing(self, fetch, start, prefix, delimiter, limit):
+        """Split the paths returned by fetch into (matches, prefixes),
+           as described in latest_version_list.
+
+           fetch(start) must return the next batch of rows, ordered by
+           path and with paths greater than start. A batch shorter
+           than limit marks the end of the listing.
+        """
+
         pfz = len(prefix)
         dz = len(delimiter)
         count = 0
@@ -1292,34 +1674,36 @@ class Node(DBWorker):
         matches = []
         mappend = matches.append
 
-        rp = self.conn.execute(s, start=start)
         while True:
-            props = rp.fetchone()
-            if props is None:
-                break
-            path = props[0]
-            idx = path.find(delimiter, pfz)
-
-            if idx < 0:
-                mappend(props)
-                count += 1
+            rows = fetch(start)
+            pf = None
+            for props in rows:
+                path = props[0]
+                if pf is not None and path.startswith(pf):
+                    continue  # Already reported as a common prefix.
+                pf = None
+                idx = path.find(delimiter, pfz)
+
+                if idx < 0:
+                    mappend(props)
+                    count += 1
+                    if count >= limit:
+                        return matches, prefixes
+                    continue
+
+                if idx + dz == len(path):
+                    mappend(props)
+                    count += 1
+                    continue  # Get one more, in case there is a path.
+                pf = path[:idx + dz]
+                pappend(pf)
                 if count >= limit:
-                    break
-                continue
+                    return matches, prefixes
 
-            if idx + dz == len(path):
-                mappend(props)
-                count += 1
-                continue  # Get one more, in case there is a path.
-            pf = path[:idx + dz]
-            pappend(pf)
-            if count >= limit:
-                break
-
-            rp = self.conn.execute(s, start=strnextling(pf))  # New start.
-        rp.close()
-
-        return matches, prefixes
+            if not limit or len(rows) < limit:
+                return matches, prefixes
+            # New start.
+            start = strnextling(pf) if pf is not None else rows[-1][0]
 
     def latest_uuid(self, uuid, cluster):
         """Return the latest version of the given uuid and cluster.
@@ -1344,15 +1728,88 @@ class Node(DBWorker):
         r.close()
         return l
 
-    def domain_object_list(self, domain, paths, cluster=None):
+    def domain_object_list(self, domain, paths, cluster=None, filterq=None,
+                           sizeq=None, available=None, sort_key=None,
+                           reverse=False, marker=None, limit=None):
         """Return a list of (path, property list, attribute dictionary)
            for the objects in the specific domain and cluster.
+
+           The objects returned can be restricted to those
+           with attribute values matching the (key, value) pairs of
+           filterq, with size in the range set by sizeq (as in
+           latest_version_list) and, if available is not None,
+           with the given availability.
+
+           If sort_key is given, objects are ordered by the version
+           property (e.g. 'mtime') or, else, by the domain attribute
+           of that name, and then by uuid. Objects without the attribute
+           are ordered by their version mtime, as text. Reverse the order
+           if reverse is True. Return up to limit objects, after the object
+           with the marker uuid.
         """
 
         v = self.versions.alias('v')
         n = self.nodes.alias('n')
         a = self.attributes.alias('a')
 
+        def attribute(key):
+            return select([a.c.value], and_(a.c.serial == v.c.serial,
+                                             a.c.domain == domain,
+                                             a.c.key == key))
+
+        s = select([v.c.serial])
+        if cluster:
+            s = s.where(v.c.cluster == cluster)
+        s = s.where(v.c.node == n.c.node)
+        latest = select([1], and_(a.c.serial == v.c.serial,
+                                  a.c.domain == domain,
+                                  a.c.is_latest == true()))
+        s = s.where(exists(latest))
+        if paths:
+            s = s.where(n.c.path.in_(paths))
+        for key, value in filterq or ():
+            s = s.where(exists(attribute(key).where(a.c.value == value)))
+        if sizeq and len(sizeq) == 2:
+            if sizeq[0]:
+                s = s.where(v.c.size >= sizeq[0])
+            if sizeq[1]:
+                s = s.where(v.c.size < sizeq[1])
+        if available is not None:
+            s = s.where(v.c.available == available)
+
+        if sort_key is not None:
+            if sort_key in v.c:
+                sort_col = v.c[sort_key]
+            else:
+                sort_col = func.coalesce(attribute(sort_key).as_scalar(),
+                                         cast(v.c.mtime, String))
+            if marker is not None:
+                m = select([sort_col, v.c.uuid],
+                           and_(v.c.uuid == marker, v.c.node == n.c.node,
+                                v.c.serial == n.c.latest_version))
+                r = self.conn.execute(m)
+                row = r.fetchone()
+                r.close()
+                if row is None:
+                    raise ValueError('Marker object %s not found' % marker)
+                after = (lambda x, y: x < y) if reverse else \
+                    (lambda x, y: x > y)
+                s = s.where(or_(after(sort_col, row[0]),
+                                and_(sort_col == row[0],
+                                     after(v.c.uuid, row[1]))))
+            if reverse:
+                s = s.order_by(sort_col.desc(), v.c.uuid.desc())
+            else:
+                s = s.order_by(sort_col.asc(), v.c.uuid.asc())
+            if limit:
+                s = s.limit(limit)
+
+        r = self.conn.execute(s)
+        serials = [version[0] for version in r.fetchall()]
+        r.close()
+        if not serials:
+            return []
+
         props = [n.c.path, v.c.serial, v.c.node, v.c.hash, v.c.size, v.c.type,
                  v.c.source, v.c.mtime, v.c.muser, v.c.uuid, v.c.checksum,
                  v.c.cluster, v.c.available, v.c.map_check_timestamp,
@@ -1360,14 +1817,10 @@ class Node(DBWorker):
         cols = props + [a.c.key, a.c.value]
 
         s = select(cols)
-        if cluster:
-            s = s.where(v.c.cluster == cluster)
         s = s.where(v.c.serial == a.c.serial)
         s = s.where(a.c.domain == domain)
         s = s.where(a.c.node == n.c.node)
-        s = s.where(a.c.is_latest == true())
-        if paths:
-            s = s.where(n.c.path.in_(paths))
+        s = s.where(v.c.serial.in_(serials))
 
         r = self.conn.execute(s)
         rows = r.fetchall()
@@ -1376,8 +1829,12 @@ class Node(DBWorker):
         group_by = itemgetter(slice(len(props)))
         rows.sort(key=group_by)
         groups = groupby(rows, group_by)
-        return [(k[0], k[1:], dict([i[len(props):] for i in data])) for
-                (k, data) in groups]
+        objects = [(k[0], k[1:], dict([i[len(props):] for i in data])) for
+                   (k, data) in groups]
+        if sort_key is not None:
+            order = dict((serial, i) for i, serial in enumerate(serials))
+            objects.sort(key=lambda o: order[o[1][0]])
+        return objects
 
     def get_props(self, paths):
         inner_join = \
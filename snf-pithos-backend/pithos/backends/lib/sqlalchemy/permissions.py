@@ -13,17 +13,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from sqlalchemy.sql import select, literal, or_, and_
-from sqlalchemy.sql.expression import join, union
+from sqlalchemy.sql import select, or_, and_, func
 
 from xfeatures import XFeatures
 from groups import Groups
 from public import Public
-from node import Node
+from node import Node, strnextling
 from collections import defaultdict
 
-from dbworker import ESCAPE_CHAR
-
 
 READ = 0
 WRITE = 1
@@ -37,6 +34,14 @@ class Permissions(XFeatures, Groups, Public, Node):
         Public.__init__(self, **params)
         Node.__init__(self, **params)
 
+    def access_reset_memo(self):
+        """Forget the features and group memberships looked up so far.
+           Must be called at the start of each transaction.
+        """
+
+        self.xfeature_reset_memo()
+        self.group_parents_memo.clear()
+
     def access_grant(self, path, access, members=()):
         """Grant members with access to path.
            Members can also be '*' (all),
@@ -46,6 +51,29 @@ class Permissions(XFeatures, Groups, Public, Node):
             return
         feature = self.xfeature_create(path)
         self.feature_setmany(feature, access, members)
+        m = self.xfeaturemembers
+        s = select([m.c.member], and_(m.c.path == path,
+                                      m.c.member.in_(members)))
+        r = self.conn.execute(s)
+        existing = set(row[0] for row in r.fetchall())
+        r.close()
+        self._index_members(path, set(members) - existing)
+
+    def _index_members(self, path, members):
+        if not members:
+            return
+        s = self.xfeaturemembers.insert()
+        r = self.conn.execute(s, [{'member': member, 'path': path}
+                                  for member in members])
+        r.close()
+
+    def _unindex_paths(self, paths):
+        if not paths:
+            return
+        s = self.xfeaturemembers.delete()
+        s = s.where(self.xfeaturemembers.c.path.in_(paths))
+        r = self.conn.execute(s)
+        r.close()
 
     def access_set(self, path, permissions):
         """Set permissions for path. The permissions dict
@@ -53,6 +81,7 @@ class Permissions(XFeatures, Groups, Public, Node):
 
         r = permissions.get('read', [])
         w = permissions.get('write', [])
+        self._unindex_paths([path])
         if not r and not w:
             self.xfeature_destroy(path)
             return
@@ -63,6 +92,7 @@ class Permissions(XFeatures, Groups, Public, Node):
             self.feature_setmany(feature, READ, r)
         if w:
             self.feature_setmany(feature, WRITE, w)
+        self._index_members(path, set(r) | set(w))
 
     def access_get_for_bulk(self, perms):
         """Get permissions for path."""
@@ -81,6 +111,27 @@ class Permissions(XFeatures, Groups, Public, Node):
             del(permissions[WRITE])
         return (permissions, allowed)
 
+    def access_get_bulk(self, paths):
+        """Get permissions for paths.
+           Return a dict mapping each path with permissions
+           to its permissions, as returned by access_get.
+        """
+
+        if not paths:
+            return {}
+        s = select([self.xfeaturevals.c.value, self.xfeatures.c.path,
+                    self.xfeaturevals.c.key])
+        s = s.where(and_(self.xfeatures.c.feature_id ==
+                         self.xfeaturevals.c.feature_id,
+                         self.xfeatures.c.path.in_(set(paths))))
+        r = self.conn.execute(s)
+        perms = defaultdict(list)
+        for row in r.fetchall():
+            perms[row[1]].append(row)
+        r.close()
+        return dict((path, self.access_get_for_bulk(rows)[0])
+                    for path, rows in perms.iteritems())
+
     def access_get(self, path):
         """Get permissions for path."""
 
@@ -117,21 +168,23 @@ class Permissions(XFeatures, Groups, Public, Node):
         """Revoke access to path (both permissions and public)."""
 
         self.xfeature_destroy(path)
+        self._unindex_paths([path])
         self.public_unset(path)
 
     def access_clear_bulk(self, paths):
         """Revoke access to path (both permissions and public)."""
 
         self.xfeature_destroy_bulk(paths)
+        self._unindex_paths(paths)
         self.public_unset_bulk(paths)
 
     def access_check(self, path, access, member):
         """Return true if the member has this access to the path."""
 
-        feature = self.xfeature_get(path)
-        if not feature:
+        feature = self.xfeature_lookup([path])[path]
+        if feature is None:
             return False
-        members = self.feature_get(feature, access)
+        members = feature.get(access, [])
         if member in members or '*' in members:
             return True
         for owner, group in self.group_parents(member):
@@ -183,7 +236,8 @@ class Permissions(XFeatures, Groups, Public, Node):
             valid.append(subp)
             if subp != path:
                 valid.append(subp + '/')
-        return [x for x in valid if self.xfeature_get(x)]
+        features = self.xfeature_lookup(valid)
+        return [x for x in valid if features[x] is not None]
 
     def access_inherit_bulk(self, paths):
         """Return the paths influencing the access for path."""
@@ -197,11 +251,36 @@ class Permissions(XFeatures, Groups, Public, Node):
                 valid.append(subp)
                 if subp != path:
                     valid.append(subp + '/')
-        valid = self.xfeature_get_bulk(valid)
-        return [x[1] for x in valid]
+        features = self.xfeature_lookup(set(valid))
+        return sorted(x for x, f in features.iteritems() if f is not None)
+
+    def _granted_members(self, member):
+        """Return the members through which paths are granted to member:
+           the member itself, its groups and '*' (all).
+        """
+
+        members = ['*']
+        if member is not None:
+            members.append(member)
+            members.extend(owner + ':' + group for owner, group in
+                           self.group_parents(member))
+        return members
+
+    def _granted_paths(self, member):
+        m = self.xfeaturemembers
+        return select([m.c.path],
+                      m.c.member.in_(self._granted_members(member))).distinct()
+
+    def _prefix_ranges(self, column, prefix):
+        """Return a condition selecting the values of column that
+           start with prefix or with a path it inherits access from.
+        """
+
+        return or_(*[and_(column >= p, column < strnextling(p))
+                     for p in self.access_inherit(prefix) or [prefix]])
 
     def access_list_paths(self, member, prefix=None, include_owned=False,
-                          include_containers=True):
+                          include_containers=True, marker=None, limit=None):
         """Return the list of paths granted to member.
 
         Keyword arguments:
@@ -209,27 +288,22 @@ class Permissions(XFeatures, Groups, Public, Node):
         include_owned -- return also paths owned by member (default False)
         include_containers -- return also container paths owned by member
                               (default True)
+        marker -- return only granted paths after marker, in order
+                  (default None)
+        limit -- return up to limit granted paths, in order (default None)
 
         """
 
-        xfeatures_xfeaturevals = self.xfeatures.join(self.xfeaturevals)
-
-        selectable = (self.groups.c.owner + ':' + self.groups.c.name)
-        member_groups = select([selectable.label('value')],
-                               self.groups.c.member == member)
-
-        members = select([literal(member).label('value')])
-        any = select([literal('*').label('value')])
-
-        u = union(member_groups, members, any).alias()
-        inner_join = join(xfeatures_xfeaturevals, u,
-                          self.xfeaturevals.c.value == u.c.value)
-        s = select([self.xfeatures.c.path], from_obj=[inner_join]).distinct()
+        s = self._granted_paths(member)
+        path = self.xfeaturemembers.c.path
         if prefix:
-            like = lambda p: self.xfeatures.c.path.like(
-                self.escape_like(p) + '%', escape=ESCAPE_CHAR)
-            s = s.where(or_(*map(like,
-                                 self.access_inherit(prefix) or [prefix])))
+            s = s.where(self._prefix_ranges(path, prefix))
+        if marker:
+            s = s.where(path > marker)
+        if marker or limit:
+            s = s.order_by(path)
+        if limit:
+            s = s.limit(limit)
         r = self.conn.execute(s)
         l = [row[0] for row in r.fetchall()]
         r.close()
@@ -248,15 +322,77 @@ class Permissions(XFeatures, Groups, Public, Node):
             r.close()
         return l
 
-    def access_list_shared(self, prefix=''):
-        """Return the list of shared paths."""
+    def access_list_shared(self, prefix='', marker=None, limit=None):
+        """Return the list of shared paths, after marker."""
 
         s = select([self.xfeatures.c.path])
-        like = lambda p: self.xfeatures.c.path.like(
-            self.escape_like(p) + '%', escape=ESCAPE_CHAR)
-        s = s.where(or_(*map(like, self.access_inherit(prefix) or [prefix])))
+        s = s.where(self._prefix_ranges(self.xfeatures.c.path, prefix))
+        if marker:
+            s = s.where(self.xfeatures.c.path > marker)
         s = s.order_by(self.xfeatures.c.path.asc())
+        if limit:
+            s = s.limit(limit)
         r = self.conn.execute(s)
         l = [row[0] for row in r.fetchall()]
         r.close()
         return l
+
+    def _path_part(self, column, prefix):
+        """Return an expression extracting the part of the values of
+           column following prefix up to the next '/'.
+        """
+
+        rest = func.substr(column, len(prefix) + 1)
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            return func.split_part(rest, '/', 1)
+        if dialect == 'mysql':
+            return func.substring_index(rest, '/', 1)
+        return func.substr(rest, 1, func.instr(rest.op('||')('/'), '/') - 1)
+
+    def _list_path_parts(self, s, column, prefix, marker, limit):
+        """Return the distinct parts of the paths selected by s,
+           following prefix up to the next '/', after marker.
+
+           Parts are extracted, ordered and limited in a single query.
+        """
+
+        s = s.where(and_(column > prefix, column < strnextling(prefix)))
+        paths = s.alias('paths')
+        part = self._path_part(paths.c.path, prefix)
+        s = select([part.label('part')]).distinct()
+        if marker:
+            s = s.where(part > marker)
+        s = s.order_by(part).limit(limit)
+        r = self.conn.execute(s)
+        parts = [row[0] for row in r.fetchall()]
+        r.close()
+        return parts
+
+    def access_list_prefixes(self, member=None, prefix='', marker=None,
+                             limit=10000):
+        """Return the distinct parts of the paths granted to member
+           (or of all the shared paths, if member is None),
+           following prefix up to the next '/'.
+
+           Parts are ordered by name and start after marker.
+        """
+
+        if member is None:
+            s = select([self.xfeatures.c.path])
+            column = self.xfeatures.c.path
+        else:
+            s = self._granted_paths(member)
+            column = self.xfeaturemembers.c.path
+        return self._list_path_parts(s, column, prefix, marker, limit)
+
+    def public_list_prefixes(self, prefix='', marker=None, limit=10000):
+        """Return the distinct parts of the public paths,
+           following prefix up to the next '/'.
+
+           Parts are ordered by name and start after marker.
+        """
+
+        s = select([self.public.c.path], self.public.c.active == True)
+        return self._list_path_parts(s, self.public.c.path, prefix,
+                                     marker, limit)
@@ -15,7 +15,7 @@
 
 from collections import defaultdict
 from sqlalchemy import Table, Column, String, Integer, MetaData, ForeignKey
-from sqlalchemy.sql import select, and_
+from sqlalchemy.sql import select, and_, outerjoin, func
 from sqlalchemy.schema import Index
 from sqlalchemy.exc import NoSuchTableError
 
@@ -41,7 +41,26 @@ def create_tables(engine):
     columns.append(Column('value', String(256), primary_key=True))
     Table('xfeaturevals', metadata, *columns, mysql_engine='InnoDB')
 
+    # Denormalized (member, path) pairs of the features,
+    # for listing the paths granted to members in order.
+    columns = []
+    columns.append(Column('member', String(256), primary_key=True))
+    columns.append(Column('path', String(2048), primary_key=True))
+    xfeaturemembers = Table('xfeaturemembers', metadata, *columns,
+                            mysql_engine='InnoDB')
+    Index('idx_xfeaturemembers_path', xfeaturemembers.c.path)
+
+    columns = []
+    columns.append(Column('version', Integer, nullable=False, default=0))
+    xfeatures_version = Table('xfeatures_version', metadata, *columns,
+                              mysql_engine='InnoDB')
+
     metadata.create_all(engine)
+    r = engine.execute(select([func.count()], from_obj=[xfeatures_version]))
+    empty = r.fetchone()[0] == 0
+    r.close()
+    if empty:
+        engine.execute(xfeatures_version.insert(), version=0)
     return metadata.sorted_tables
 
 
@@ -52,10 +71,17 @@ class XFeatures(DBWorker):
 
     def __init__(self, **params):
         DBWorker.__init__(self, **params)
+        # Shared cache of features, set by the backend.
+        self.xfeature_cache = None
+        self.xfeature_reset_memo()
         try:
             metadata = MetaData(self.engine)
             self.xfeatures = Table('xfeatures', metadata, autoload=True)
             self.xfeaturevals = Table('xfeaturevals', metadata, autoload=True)
+            self.xfeaturemembers = Table('xfeaturemembers', metadata,
+                                         autoload=True)
+            self.xfeatures_version = Table('xfeatures_version', metadata,
+                                           autoload=True)
         except NoSuchTableError:
             tables = create_tables(self.engine)
             map(lambda t: self.__setattr__(t.name, t), tables)
@@ -73,6 +99,90 @@ class XFeatures(DBWorker):
 #         r.close()
 #         return l
 
+    def xfeature_reset_memo(self):
+        """Forget the features looked up so far.
+           Must be called at the start of each transaction.
+        """
+
+        self.xfeature_memo = {}
+        self.xfeature_memo_version = None
+        self.xfeature_memo_dirty = False
+
+    def xfeature_version(self):
+        """Return the version of the features,
+           increased whenever a feature changes.
+        """
+
+        s = select([self.xfeatures_version.c.version])
+        r = self.conn.execute(s)
+        row = r.fetchone()
+        r.close()
+        return row[0] if row else 0
+
+    def _xfeatures_changed(self, rowcount=1):
+        if not rowcount:
+            return
+        self.xfeature_memo.clear()
+        if self.xfeature_cache is None:
+            # Without a shared cache there are no cached features to
+            # invalidate, so do not serialize on the version row.
+            return
+        # Uncommitted changes must not reach the shared cache.
+        self.xfeature_memo_dirty = True
+        s = self.xfeatures_version.update()
+        s = s.values(version=self.xfeatures_version.c.version + 1)
+        r = self.conn.execute(s)
+        r.close()
+
+    def xfeature_lookup(self, paths):
+        """Return a dict mapping each path to the dict of key, value list
+           pairs of its feature, or None if the path has no feature.
+           Features are remembered until xfeature_reset_memo is called
+           or a feature changes, and are shared among transactions
+           through xfeature_cache, if set.
+        """
+
+        memo = self.xfeature_memo
+        cache = self.xfeature_cache
+        if cache is not None and self.xfeature_memo_dirty:
+            cache = None
+        missing = set()
+        for path in paths:
+            if path in memo:
+                continue
+            if cache is not None:
+                if self.xfeature_memo_version is None:
+                    self.xfeature_memo_version = self.xfeature_version()
+                found, value = cache.get(path, self.xfeature_memo_version)
+                if found:
+                    memo[path] = value
+                    continue
+            missing.add(path)
+
+        if missing:
+            features = dict((path, None) for path in missing)
+            j = outerjoin(self.xfeatures, self.xfeaturevals,
+                          self.xfeatures.c.feature_id ==
+                          self.xfeaturevals.c.feature_id)
+            s = select([self.xfeatures.c.path, self.xfeaturevals.c.key,
+                        self.xfeaturevals.c.value], from_obj=[j])
+            s = s.where(self.xfeatures.c.path.in_(missing))
+            r = self.conn.execute(s)
+            for path, key, value in r.fetchall():
+                d = features[path]
+                if d is None:
+                    d = features[path] = defaultdict(list)
+                if key is not None:
+                    d[key].append(value)
+            r.close()
+            for path, d in features.iteritems():
+                if d is not None:
+                    d = dict(d)
+                memo[path] = d
+                if cache is not None:
+                    cache.put(path, d, self.xfeature_memo_version)
+        return dict((path, memo[path]) for path in paths)
+
     def xfeature_get(self, path):
         """Return feature for path."""
 
@@ -111,6 +221,7 @@ class XFeatures(DBWorker):
         r = self.conn.execute(s, path=path)
         inserted_primary_key = r.inserted_primary_key[0]
         r.close()
+        self._xfeatures_changed()
         return inserted_primary_key
 
     def xfeature_destroy(self, path):
@@ -118,7 +229,9 @@ class XFeatures(DBWorker):
 
         s = self.xfeatures.delete().where(self.xfeatures.c.path == path)
         r = self.conn.execute(s)
+        rowcount = r.rowcount
         r.close()
+        self._xfeatures_changed(rowcount)
 
     def xfeature_destroy_bulk(self, paths):
         """Destroy features and all their key, value pairs."""
@@ -127,7 +240,9 @@ class XFeatures(DBWorker):
             return
         s = self.xfeatures.delete().where(self.xfeatures.c.path.in_(paths))
         r = self.conn.execute(s)
+        rowcount = r.rowcount
         r.close()
+        self._xfeatures_changed(rowcount)
 
     def feature_dict(self, feature):
         """Return a dict mapping keys to list of values for feature."""
@@ -155,6 +270,7 @@ class XFeatures(DBWorker):
             s = self.xfeaturevals.insert()
             r = self.conn.execute(s, feature_id=feature, key=key, value=value)
             r.close()
+            self._xfeatures_changed()
 
     def feature_setmany(self, feature, key, values):
         """Associate the given key, and values with a feature."""
@@ -171,18 +287,23 @@ class XFeatures(DBWorker):
                          self.xfeaturevals.c.key == key,
                          self.xfeaturevals.c.value == value))
         r = self.conn.execute(s)
+        rowcount = r.rowcount
         r.close()
+        self._xfeatures_changed(rowcount)
 
     def feature_unsetmany(self, feature, key, values):
         """Disassociate the key for the values given, from a feature."""
 
+        rowcount = 0
         for v in values:
             conditional = and_(self.xfeaturevals.c.feature_id == feature,
                                self.xfeaturevals.c.key == key,
                                self.xfeaturevals.c.value == v)
             s = self.xfeaturevals.delete().where(conditional)
             r = self.conn.execute(s)
+            rowcount += r.rowcount
             r.close()
+        self._xfeatures_changed(rowcount)
 
     def feature_get(self, feature, key):
         """Return the list of values for a key of a feature."""
@@ -202,4 +323,6 @@ class XFeatures(DBWorker):
         s = s.where(and_(self.xfeaturevals.c.feature_id == feature,
                          self.xfeaturevals.c.key == key))
         r = self.conn.execute(s)
+        rowcount = r.rowcount
         r.close()
+        self._xfeatures_changed(rowcount)
@@ -13,6 +13,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+# Host parameters allowed per statement (SQLITE_MAX_VARIABLE_NUMBER).
+MAX_VARIABLES = 999
+
+
+def chunks(items, size):
+    """Split the list in consecutive lists of at most size items."""
+
+    return [items[i:i + size] for i in xrange(0, len(items), size)]
+
 
 class DBWorker(object):
     """Database connection handler."""
@@ -25,6 +34,9 @@ class DBWorker(object):
         cur = wrapper.conn.cursor()
         self.execute = cur.execute
         self.executemany = cur.executemany
+        if wrapper.stats is not None:
+            self.execute = wrapper.stats.timed('sql', cur.execute)
+            self.executemany = wrapper.stats.timed('sql', cur.executemany)
         self.fetchone = cur.fetchone
         self.fetchall = cur.fetchall
         self.cur = cur
@@ -20,9 +20,14 @@ except ImportError:
 
 
 class DBWrapper(object):
-    """Database connection wrapper."""
+    """Database connection wrapper.
+       Connection pooling parameters are ignored.
+    """
 
-    def __init__(self, db):
+    pooled = False
+    stats = None
+
+    def __init__(self, db, **pool_params):
         self.conn = sqlite3.connect(db, check_same_thread=False)
         self.conn.execute(""" pragma case_sensitive_like = on """)
 
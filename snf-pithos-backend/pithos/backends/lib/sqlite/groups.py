@@ -23,6 +23,7 @@ class Groups(DBWorker):
 
     def __init__(self, **params):
         DBWorker.__init__(self, **params)
+        self.group_parents_memo = {}
         execute = self.execute
 
         execute(""" create table if not exists groups
@@ -56,6 +57,7 @@ class Groups(DBWorker):
         q = ("insert or ignore into groups (owner, name, member) "
              "values (?, ?, ?)")
         self.execute(q, (owner, group, member))
+        self.group_parents_memo.clear()
 
     def group_addmany(self, owner, group, members):
         """Add members to a group."""
@@ -63,24 +65,28 @@ class Groups(DBWorker):
         q = ("insert or ignore into groups (owner, name, member) "
              "values (?, ?, ?)")
         self.executemany(q, ((owner, group, member) for member in members))
+        self.group_parents_memo.clear()
 
     def group_remove(self, owner, group, member):
         """Remove a member from a group."""
 
         q = "delete from groups where owner = ? and name = ? and member = ?"
         self.execute(q, (owner, group, member))
+        self.group_parents_memo.clear()
 
     def group_delete(self, owner, group):
         """Delete a group."""
 
         q = "delete from groups where owner = ? and name = ?"
         self.execute(q, (owner, group))
+        self.group_parents_memo.clear()
 
     def group_destroy(self, owner):
         """Delete all groups belonging to owner."""
 
         q = "delete from groups where owner = ?"
         self.execute(q, (owner,))
+        self.group_parents_memo.clear()
 
     def group_members(self, owner, group):
         """Return the list of members of a group."""
@@ -99,6 +105,8 @@ class Groups(DBWorker):
     def group_parents(self, member):
         """Return all (owner, group) tuples that contain member."""
 
-        q = "select owner, name from groups where member = ?"
-        self.execute(q, (member,))
-        return self.fetchall()
+        if member not in self.group_parents_memo:
+            q = "select owner, name from groups where member = ?"
+            self.execute(q, (member,))
+            self.group_parents_memo[member] = self.fetchall()
+        return self.group_parents_memo[member]
@@ -16,8 +16,9 @@
 from time import time
 from operator import itemgetter
 from itertools import groupby
+from collections import defaultdict
 
-from dbworker import DBWorker
+from dbworker import DBWorker, MAX_VARIABLES, chunks
 
 from pithos.backends.filter import parse_filters
 
@@ -26,6 +27,9 @@ ROOTNODE = 0
 
 (MATCH_PREFIX, MATCH_EXACT) = range(2)
 
+# Ancestors looked up per query (root, account, container).
+ANCESTOR_LEVELS = 3
+
 inf = float('inf')
 
 
@@ -73,6 +77,11 @@ class Node(DBWorker):
 
     # TODO: Provide an interface for included and excluded clusters.
 
+    _version_columns = ('serial', 'node', 'hash', 'size', 'type', 'source',
+                        'mtime', 'muser', 'uuid', 'checksum', 'cluster',
+                        'available', 'map_check_timestamp', 'mapfile',
+                        'is_snapshot')
+
     def __init__(self, **params):
         self._props = params.pop('props')
         for p in self._props:
@@ -145,6 +154,8 @@ class Node(DBWorker):
                     on versions(node, mtime) """)
         execute(""" create index if not exists idx_versions_node_uuid
                     on versions(uuid) """)
+        execute(""" create index if not exists idx_versions_hash_size
+                    on versions(hash, size) """)
 
         execute(""" create table if not exists attributes
                           ( serial      integer,
@@ -286,7 +297,8 @@ class Node(DBWorker):
             return (), 0, ()
         mtime = time()
         self.statistics_update(parent, -nr, -size, mtime, cluster)
-        self.statistics_update_ancestors(parent, -nr, -size, mtime, cluster,
+        # Population isn't recursive
+        self.statistics_update_ancestors(parent, 0, -size, mtime, cluster,
                                          update_statistics_ancestors_depth)
 
         q = ("select hash, serial from versions "
@@ -448,6 +460,65 @@ class Node(DBWorker):
         self.execute(q, (node, cluster))
         return self.fetchone()
 
+    def statistics_set(self, node, population, size, mtime, cluster=0):
+        """Set the statistics of the given node."""
+
+        q = ("insert or replace into statistics "
+             "(node, population, size, mtime, cluster) "
+             "values (?, ?, ?, ?, ?)")
+        self.execute(q, (node, population, size, mtime, cluster))
+
+    def statistics_compute(self, account, cluster=0):
+        """Return a list of (node, path, population, size, mtime) tuples
+           with the statistics of the account's containers, as computed
+           from the versions of their objects that belong to the cluster.
+        """
+
+        q = ("select n.parent, count(v.serial), sum(v.size), max(v.mtime) "
+             "from versions v, nodes n "
+             "where v.node = n.node and v.cluster = ? "
+             "and n.parent in (select node from nodes where parent = ?) "
+             "group by n.parent")
+        self.execute(q, (cluster, account))
+        stats = dict((row[0], row[1:]) for row in self.fetchall())
+
+        q = "select node, path from nodes where parent = ? order by path"
+        self.execute(q, (account,))
+        return [(node, path) + tuple(stats.get(node, (0, 0, None)))
+                for node, path in self.fetchall()]
+
+    def node_get_ancestors(self, node, depth=None):
+        """Return the list of the node's ancestors,
+           from its parent up to the root
+           or up to ``depth`` levels (if not None).
+        """
+
+        ancestors = []
+        while node != ROOTNODE:
+            levels = ANCESTOR_LEVELS
+            if depth is not None:
+                levels = min(levels, depth - len(ancestors))
+            if levels <= 0:
+                break
+            q = "select %s from nodes n0" % ', '.join(
+                'n%d.parent' % i for i in range(levels))
+            for i in range(1, levels):
+                q += (" left outer join nodes n%d on n%d.node = n%d.parent" %
+                      (i, i, i - 1))
+            q += " where n0.node = ?"
+            self.execute(q, (node,))
+            row = self.fetchone()
+            if row is None:
+                break
+            for parent in row:
+                if parent is None:
+                    return ancestors
+                ancestors.append(parent)
+                node = parent
+                if node == ROOTNODE:
+                    break
+        return ancestors
+
     def statistics_update(self, node, population, size, mtime, cluster=0):
         """Update the statistics of the given node.
            Statistics keep track the population, total
@@ -455,21 +526,47 @@ class Node(DBWorker):
            May be zero or positive or negative numbers.
         """
 
-        qs = ("select population, size from statistics "
-              "where node = ? and cluster = ?")
-        qu = ("insert or replace into statistics "
-              "(node, population, size, mtime, cluster) "
-              "values (?, ?, ?, ?, ?)")
-        self.execute(qs, (node, cluster))
-        r = self.fetchone()
-        if r is None:
-            prepopulation, presize = (0, 0)
-        else:
-            prepopulation, presize = r
-        population += prepopulation
-        population = max(population, 0)
-        size += presize
-        self.execute(qu, (node, population, size, mtime, cluster))
+        self.statistics_update_bulk([(node, population)], size, mtime,
+                                    cluster)
+
+    def statistics_update_bulk(self, deltas, size, mtime, cluster=0):
+        """Update the statistics of the nodes in deltas, a list of
+           (node, population) tuples, adding the node's population
+           and size to each of them.
+        """
+
+        if not deltas:
+            return
+        deltas = sorted(deltas)
+
+        nodes = [node for node, _ in deltas]
+        population = "population"
+        args = []
+        whens = [(node, p) for node, p in deltas if p]
+        if whens:
+            population += " + case node %s else 0 end" % ' '.join(
+                "when ? then ?" for _ in whens)
+            for w in whens:
+                args += w
+        q = ("update statistics "
+             "set population = max(%s, 0), size = size + ?, mtime = ? "
+             "where cluster = ? and node in (%s)" %
+             (population, ', '.join('?' * len(nodes))))
+        self.execute(q, args + [size, mtime, cluster] + nodes)
+        if self.cur.rowcount == len(nodes):
+            return
+
+        q = ("select node from statistics "
+             "where cluster = ? and node in (%s)" %
+             ', '.join('?' * len(nodes)))
+        self.execute(q, [cluster] + nodes)
+        existing = set(r[0] for r in self.fetchall())
+        q = ("insert into statistics "
+             "(node, population, size, mtime, cluster) "
+             "values (?, ?, ?, ?, ?)")
+        self.executemany(q, [(node, max(p, 0), size, mtime, cluster)
+                             for node, p in deltas
+                             if node not in existing])
 
     def statistics_update_ancestors(self, node, population, size, mtime,
                                     cluster=0, recursion_depth=None):
@@ -478,20 +575,48 @@ class Node(DBWorker):
            Population is not recursive.
         """
 
-        i = 0
-        while True:
-            if node == ROOTNODE:
-                break
-            if recursion_depth is not None and recursion_depth <= i:
-                break
-            props = self.node_get_properties(node)
-            if props is None:
-                break
-            parent, path = props
-            self.statistics_update(parent, population, size, mtime, cluster)
-            node = parent
-            population = 0  # Population isn't recursive
-            i += 1
+        ancestors = self.node_get_ancestors(node, recursion_depth)
+        if not ancestors:
+            return
+        # Population isn't recursive
+        deltas = [(ancestors[0], population)]
+        deltas.extend((parent, 0) for parent in ancestors[1:])
+        self.statistics_update_bulk(deltas, size, mtime, cluster)
+
+    def statistics_update_ancestors_bulk(self, deltas, mtime, cluster=0,
+                                         recursion_depth=None):
+        """Update the statistics of the parents of the nodes in deltas,
+           a list of (node, population, size) tuples, as
+           statistics_update_ancestors would for each one of them.
+           The deltas of nodes with the same parent are aggregated,
+           so that each ancestor is updated once.
+        """
+
+        if not deltas or recursion_depth == 0:
+            return
+        parents = {}
+        for nodes in chunks(list(set(node for node, _, _ in deltas)),
+                            MAX_VARIABLES):
+            q = ("select node, parent from nodes where node in (%s)" %
+                 ','.join('?' for _ in nodes))
+            self.execute(q, nodes)
+            parents.update(self.fetchall())
+
+        totals = defaultdict(lambda: [0, 0])
+        for node, population, size in deltas:
+            if node == ROOTNODE or node not in parents:
+                continue
+            total = totals[parents[node]]
+            total[0] += population
+            total[1] += size
+        if recursion_depth is not None:
+            recursion_depth -= 1
+        for parent, (population, size) in sorted(totals.iteritems()):
+            ancestors = self.node_get_ancestors(parent, recursion_depth)
+            # Population isn't recursive
+            deltas = [(parent, population)]
+            deltas.extend((ancestor, 0) for ancestor in ancestors)
+            self.statistics_update_bulk(deltas, size, mtime, cluster)
 
     def statistics_latest(self, node, before=inf, except_cluster=0):
         """Return population, total size and last mtime
@@ -603,6 +728,77 @@ class Node(DBWorker):
 
         return serial, mtime, mapfile
 
+    # Version properties that version_create_bulk() may override.
+    _version_bulk_props = ('hash', 'size', 'type', 'checksum', 'available',
+                           'map_check_timestamp', 'is_snapshot')
+
+    def version_create_bulk(self, sources, muser, cluster=0,
+                            update_statistics_ancestors_depth=None,
+                            new_mapfiles=False, **props):
+        """Create new versions from the properties of existing ones.
+           Sources is a list of (serial, node, uuid) tuples: the version
+           to copy (each one at most once), the node of the new version
+           and its uuid (or None to keep the uuid of the copied version).
+           Keyword arguments (hash, size, type, checksum, available,
+           map_check_timestamp, is_snapshot) set the property for all the
+           new versions.
+
+           New versions keep the mapfile of the copied version, or are
+           assigned new unique identifiers if new_mapfiles is True.
+           Versions of size 0 get no mapfile.
+
+           Return a list with the (serial, mtime, mapfile) of the new
+           versions, in the order of sources.
+        """
+
+        if not sources:
+            return []
+        cols = ('serial', 'uuid', 'mapfile') + self._version_bulk_props
+        copied = {}
+        for serials in chunks([serial for serial, node, uuid in sources],
+                              MAX_VARIABLES):
+            q = ("select %s from versions where serial in (%s)" %
+                 (', '.join(cols), ','.join('?' for _ in serials)))
+            self.execute(q, serials)
+            copied.update((row[0], dict(zip(cols, row)))
+                          for row in self.fetchall())
+
+        q = ("insert into versions (node, hash, size, type, source, mtime, "
+             "muser, uuid, checksum, cluster, available, "
+             "map_check_timestamp, mapfile, is_snapshot) "
+             "values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        mtime = time()
+        created = []
+        for serial, node, uuid in sources:
+            p = copied[serial]
+            p.update((k, props[k]) for k in self._version_bulk_props
+                     if k in props)
+            if uuid is None:
+                uuid = p['uuid']
+            mapfile = p['mapfile']
+            if p['size'] == 0:
+                mapfile = None
+            elif new_mapfiles:
+                mq = ("insert into mapfile_seq (dummy) values (?)")
+                mserial = self.execute(mq, (False,)).lastrowid
+                mapfile = ''.join([self.mapfile_prefix, unicode(mserial)])
+            args = (node, p['hash'], p['size'], p['type'], serial, mtime,
+                    muser, uuid, p['checksum'], cluster, p['available'],
+                    p['map_check_timestamp'], mapfile, p['is_snapshot'])
+            created.append((self.execute(q, args).lastrowid, node,
+                            p['size'], mapfile))
+
+        self.statistics_update_ancestors_bulk(
+            [(node, 1, size) for _, node, size, _ in created],
+            mtime, cluster, update_statistics_ancestors_depth)
+
+        q = "update nodes set latest_version = ? where node = ?"
+        self.executemany(q, [(serial, node) for serial, node, _, _
+                             in created])
+
+        return [(serial, mtime, version_mapfile)
+                for serial, _, _, version_mapfile in created]
+
     def version_lookup(self, node, before=inf, cluster=0, all_props=True,
                        keys=()):
         """Lookup the current version of the given node.
@@ -656,6 +852,12 @@ class Node(DBWorker):
 
         if not nodes:
             return ()
+        if len(nodes) > MAX_VARIABLES - 2 and not order_by_path:
+            rows = []
+            for chunk in chunks(list(nodes), MAX_VARIABLES - 2):
+                rows.extend(self.version_lookup_bulk(
+                    chunk, before, cluster, all_props, keys=keys))
+            return rows
         q = ("select %s "
              "from versions v, nodes n "
              "where serial in %s "
@@ -700,6 +902,17 @@ class Node(DBWorker):
         r = self.fetchone()
         return r
 
+    def version_lookup_checksum(self, hash, size):
+        """Return the checksum of any version with the given hash and size.
+           Return None if no such version has a checksum.
+        """
+
+        q = ("select checksum from versions "
+             "where hash = ? and size = ? and checksum != '' limit 1")
+        self.execute(q, (hash, size))
+        r = self.fetchone()
+        return r[0] if r else None
+
     def version_put_property(self, serial, key, value, props=None):
         """Set value for the property of version specified by key."""
 
@@ -731,6 +944,36 @@ class Node(DBWorker):
         q = "update versions set cluster = ? where serial = ?"
         self.execute(q, (cluster, serial))
 
+    def version_recluster_bulk(self, serials, cluster,
+                               update_statistics_ancestors_depth=None):
+        """Move the versions into another cluster."""
+
+        rows = []
+        for chunk in chunks(list(serials), MAX_VARIABLES - 1):
+            q = ("select serial, node, size, cluster from versions "
+                 "where serial in (%s) and cluster != ?" %
+                 ','.join('?' for _ in chunk))
+            self.execute(q, chunk + [cluster])
+            rows.extend(self.fetchall())
+        if not rows:
+            return
+
+        mtime = time()
+        deltas = defaultdict(list)
+        for serial, node, size, oldcluster in rows:
+            deltas[oldcluster].append((node, -1, -size))
+        for oldcluster, d in deltas.iteritems():
+            self.statistics_update_ancestors_bulk(
+                d, mtime, oldcluster, update_statistics_ancestors_depth)
+        self.statistics_update_ancestors_bulk(
+            [(node, 1, size) for serial, node, size, oldcluster in rows],
+            mtime, cluster, update_statistics_ancestors_depth)
+
+        for chunk in chunks([row[0] for row in rows], MAX_VARIABLES - 1):
+            q = ("update versions set cluster = ? where serial in (%s)" %
+                 ','.join('?' for _ in chunk))
+            self.execute(q, [cluster] + chunk)
+
     def version_remove(self, serial, update_statistics_ancestors_depth=None):
         """Remove the serial specified."""
 
@@ -754,6 +997,50 @@ class Node(DBWorker):
             self.nodes_set_latest_version(node, props[0])
         return hash, size
 
+    def version_remove_bulk(self, serials,
+                            update_statistics_ancestors_depth=None):
+        """Remove the serials specified.
+           Return a list with the (serial, hash, size)
+           of the removed versions.
+        """
+
+        rows = []
+        for chunk in chunks(list(serials), MAX_VARIABLES):
+            q = ("select serial, node, hash, size, cluster from versions "
+                 "where serial in (%s)" % ','.join('?' for _ in chunk))
+            self.execute(q, chunk)
+            rows.extend(self.fetchall())
+        if not rows:
+            return []
+
+        mtime = time()
+        deltas = defaultdict(list)
+        for serial, node, hash, size, cluster in rows:
+            deltas[cluster].append((node, -1, -size))
+        for cluster, d in deltas.iteritems():
+            self.statistics_update_ancestors_bulk(
+                d, mtime, cluster, update_statistics_ancestors_depth)
+
+        for chunk in chunks([row[0] for row in rows], MAX_VARIABLES):
+            q = ("delete from versions where serial in (%s)" %
+                 ','.join('?' for _ in chunk))
+            self.execute(q, chunk)
+
+        # Point the nodes that lost their latest version to the one left.
+        for nodes in chunks(list(set(row[1] for row in rows)),
+                            MAX_VARIABLES):
+            q = ("update nodes set latest_version = "
+                 "(select max(serial) from versions "
+                 "where versions.node = nodes.node) "
+                 "where node in (%s) and latest_version is not null "
+                 "and not exists (select 1 from versions "
+                 "where serial = nodes.latest_version)" %
+                 ','.join('?' for _ in nodes))
+            self.execute(q, nodes)
+
+        return [(serial, hash, size)
+                for serial, node, hash, size, cluster in rows]
+
     def attribute_get(self, serial, domain, keys=()):
         """Return a list of (key, value) pairs of the specific version.
 
@@ -805,11 +1092,43 @@ class Node(DBWorker):
              "where serial = ?")
         self.execute(q, (dest, source))
 
+    def attribute_copy_bulk(self, pairs):
+        """Copy the attributes of versions to other versions,
+           given as (source, dest) serial pairs.
+           Destination versions must have no attributes (e.g. be new).
+        """
+
+        q = ("insert into attributes "
+             "(serial, domain, node, is_latest, key, value) "
+             "select ?, domain, (select node from versions where serial = ?), "
+             "1, key, value from attributes "
+             "where serial = ?")
+        self.executemany(q, ((dest, dest, source) for source, dest in pairs))
+
     def attribute_unset_is_latest(self, node, exclude):
         q = ("update attributes set is_latest = 0 "
              "where node = ? and serial != ?")
         self.execute(q, (node, exclude))
 
+    def attribute_unset_is_latest_bulk(self, nodes, exclude):
+        """Unset is_latest for the attributes of the nodes,
+           except for those of the serials in exclude.
+        """
+
+        exclude = set(exclude)
+        serials = set()
+        for chunk in chunks(list(nodes), MAX_VARIABLES):
+            q = ("select distinct serial from attributes "
+                 "where node in (%s) and is_latest = 1" %
+                 ','.join('?' for _ in chunk))
+            self.execute(q, chunk)
+            serials.update(r[0] for r in self.fetchall()
+                           if r[0] not in exclude)
+        for chunk in chunks(sorted(serials), MAX_VARIABLES):
+            q = ("update attributes set is_latest = 0 where serial in (%s)" %
+                 ','.join('?' for _ in chunk))
+            self.execute(q, chunk)
+
     def _construct_filters(self, domain, filterq):
         if not domain or not filterq:
             return None, None
@@ -1072,43 +1391,67 @@ class Node(DBWorker):
             execute(q, args)
             return self.fetchall(), ()
 
+        # Fetch the listing in batches of limit rows, skipping the paths
+        # under each common prefix found. Only restart the query past a
+        # prefix, if its paths fill the rest of the batch.
+        if limit:
+            q += " limit ?"
+            args.append(limit)
+
+        def fetch(start):
+            args[start_index] = start
+            execute(q, args)
+            return self.fetchall()
+
+        return self._delimit_listing(fetch, start, prefix, delimiter, limit)
+
+    def _delimit_listing(self, fetch, start, prefix, delimiter, limit):
+        """Split the paths returned by fetch into (matches, prefixes),
+           as described in latest_version_list.
+
+           fetch(start) must return the next batch of rows, ordered by
+           path and with paths greater than start. A batch shorter
+           than limit marks the end of the listing.
+        """
+
         pfz = len(prefix)
         dz = len(delimiter)
         count = 0
-        fetchone = self.fetchone
         prefixes = []
         pappend = prefixes.append
         matches = []
         mappend = matches.append
 
-        execute(q, args)
         while True:
-            props = fetchone()
-            if props is None:
-                break
-            path = props[0]
-            idx = path.find(delimiter, pfz)
-
-            if idx < 0:
-                mappend(props)
-                count += 1
+            rows = fetch(start)
+            pf = None
+            for props in rows:
+                path = props[0]
+                if pf is not None and path.startswith(pf):
+                    continue  # Already reported as a common prefix.
+                pf = None
+                idx = path.find(delimiter, pfz)
+
+                if idx < 0:
+                    mappend(props)
+                    count += 1
+                    if count >= limit:
+                        return matches, prefixes
+                    continue
+
+                if idx + dz == len(path):
+                    mappend(props)
+                    count += 1
+                    continue  # Get one more, in case there is a path.
+                pf = path[:idx + dz]
+                pappend(pf)
                 if count >= limit:
-                    break
-                continue
-
-            if idx + dz == len(path):
-                mappend(props)
-                count += 1
-                continue  # Get one more, in case there is a path.
-            pf = path[:idx + dz]
-            pappend(pf)
-            if count >= limit:
-                break
-
-            args[start_index] = strnextling(pf)  # New start.
-            execute(q, args)
+                    return matches, prefixes
 
-        return matches, prefixes
+            if not limit or len(rows) < limit:
+                return matches, prefixes
+            # New start.
+            start = strnextling(pf) if pf is not None else rows[-1][0]
 
     def latest_uuid(self, uuid, cluster):
         """Return the latest version of the given uuid and cluster.
@@ -1133,35 +1476,108 @@ class Node(DBWorker):
         self.execute(q, args)
         return self.fetchone()
 
-    def domain_object_list(self, domain, paths, cluster=None):
+    def domain_object_list(self, domain, paths, cluster=None, filterq=None,
+                           sizeq=None, available=None, sort_key=None,
+                           reverse=False, marker=None, limit=None):
         """Return a list of (path, property list, attribute dictionary)
            for the objects in the specific domain and cluster.
+
+           The objects returned can be restricted to those
+           with attribute values matching the (key, value) pairs of
+           filterq, with size in the range set by sizeq (as in
+           latest_version_list) and, if available is not None,
+           with the given availability.
+
+           If sort_key is given, objects are ordered by the version
+           property (e.g. 'mtime') or, else, by the domain attribute
+           of that name, and then by uuid. Objects without the attribute
+           are ordered by their version mtime, as text. Reverse the order
+           if reverse is True. Return up to limit objects, after the object
+           with the marker uuid.
         """
 
-        props = ('n.path', 'v.serial', 'v.node', 'v.hash', 'v.size', 'v.type',
-                'v.source', 'v.mtime', 'v.muser', 'v.uuid', 'v.checksum',
-                'v.cluster', 'v.mapfile', 'v.is_snapshot')
-        cols = props + ['a.key', 'a.value']
-        q = ("select %s from nodes n, versions v, attributes a "
-             "where v.serial = a.serial and "
-             "a.domain = ? and "
-             "a.node = n.node and "
-             "a.is_latest = 1 and "
-             "n.path in (%s)") % (cols, ','.join('?' for _ in paths))
+        attribute = ("select value from attributes "
+                     "where serial = v.serial and domain = ? and key = ?")
+        q = ("select v.serial from nodes n, versions v "
+             "where v.node = n.node and "
+             "exists (select 1 from attributes "
+             "where serial = v.serial and domain = ? and is_latest = 1)")
         args = [domain]
-        map(args.append, paths)
+        if paths:
+            q += " and n.path in (%s)" % ','.join('?' for _ in paths)
+            args += paths
         if cluster is not None:
-            q += "and v.cluster = ?"
+            q += " and v.cluster = ?"
             args += [cluster]
+        for key, value in filterq or ():
+            q += " and exists (%s and value = ?)" % attribute
+            args += [domain, key, value]
+        if sizeq and len(sizeq) == 2:
+            if sizeq[0]:
+                q += " and v.size >= ?"
+                args += [sizeq[0]]
+            if sizeq[1]:
+                q += " and v.size < ?"
+                args += [sizeq[1]]
+        if available is not None:
+            q += " and v.available = ?"
+            args += [available]
+
+        if sort_key is not None:
+            if sort_key in self._version_columns:
+                sort_col = 'v.%s' % sort_key
+                sort_args = []
+            else:
+                sort_col = "coalesce((%s), cast(v.mtime as text))" % attribute
+                sort_args = [domain, sort_key]
+            if marker is not None:
+                self.execute(("select %s, v.uuid from nodes n, versions v "
+                              "where v.uuid = ? and v.node = n.node and "
+                              "v.serial = n.latest_version") % sort_col,
+                             sort_args + [marker])
+                row = self.fetchone()
+                if row is None:
+                    raise ValueError('Marker object %s not found' % marker)
+                op = '<' if reverse else '>'
+                q += (" and (%s %s ? or (%s = ? and v.uuid %s ?))" %
+                      (sort_col, op, sort_col, op))
+                args += (sort_args + [row[0]] + sort_args +
+                         [row[0], row[1]])
+            order = 'desc' if reverse else 'asc'
+            q += " order by %s %s, v.uuid %s" % (sort_col, order, order)
+            args += sort_args
+            if limit:
+                q += " limit ?"
+                args += [limit]
 
         self.execute(q, args)
+        serials = [version[0] for version in self.fetchall()]
+        if not serials:
+            return []
+
+        props = ['n.path', 'v.serial', 'v.node', 'v.hash', 'v.size', 'v.type',
+                 'v.source', 'v.mtime', 'v.muser', 'v.uuid', 'v.checksum',
+                 'v.cluster', 'v.available', 'v.map_check_timestamp',
+                 'v.mapfile', 'v.is_snapshot']
+        cols = props + ['a.key', 'a.value']
+        q = ("select %s from nodes n, versions v, attributes a "
+             "where v.serial = a.serial and "
+             "a.domain = ? and "
+             "a.node = n.node and "
+             "v.serial in (%s)") % (', '.join(cols),
+                                    ','.join('?' for _ in serials))
+        self.execute(q, [domain] + serials)
         rows = self.fetchall()
 
         group_by = itemgetter(slice(len(props)))
         rows.sort(key=group_by)
         groups = groupby(rows, group_by)
-        return [(k[0], k[1:], dict([i[len(props):] for i in data])) for
-                (k, data) in groups]
+        objects = [(k[0], k[1:], dict([i[len(props):] for i in data])) for
+                   (k, data) in groups]
+        if sort_key is not None:
+            order = dict((serial, i) for i, serial in enumerate(serials))
+            objects.sort(key=lambda o: order[o[1][0]])
+        return objects
 
     def get_props(self, paths):
         q = ("select distinct n.path, v.type "
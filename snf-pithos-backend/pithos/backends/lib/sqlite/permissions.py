@@ -16,7 +16,8 @@
 from xfeatures import XFeatures
 from groups import Groups
 from public import Public
-from node import Node
+from node import Node, strnextling
+from dbworker import MAX_VARIABLES, chunks
 from collections import defaultdict
 
 
@@ -24,6 +25,13 @@ READ = 0
 WRITE = 1
 
 
+def _path_part(path, start):
+    """Return the part of path from start up to the next '/'."""
+
+    idx = path.find('/', start)
+    return path[start:] if idx < 0 else path[start:idx]
+
+
 class Permissions(XFeatures, Groups, Public, Node):
 
     def __init__(self, **params):
@@ -31,6 +39,15 @@ class Permissions(XFeatures, Groups, Public, Node):
         Groups.__init__(self, **params)
         Public.__init__(self, **params)
         Node.__init__(self, **params)
+        self.conn.create_function('path_part', 2, _path_part)
+
+    def access_reset_memo(self):
+        """Forget the features and group memberships looked up so far.
+           Must be called at the start of each transaction.
+        """
+
+        self.xfeature_reset_memo()
+        self.group_parents_memo.clear()
 
     def access_grant(self, path, access, members=()):
         """Grant members with access to path.
@@ -41,6 +58,18 @@ class Permissions(XFeatures, Groups, Public, Node):
             return
         feature = self.xfeature_create(path)
         self.feature_setmany(feature, access, members)
+        self._index_members(path, members)
+
+    def _index_members(self, path, members):
+        q = ("insert or ignore into xfeaturemembers (member, path) "
+             "values (?, ?)")
+        self.executemany(q, ((member, path) for member in set(members)))
+
+    def _unindex_paths(self, paths):
+        for chunk in chunks(list(paths), MAX_VARIABLES):
+            q = ("delete from xfeaturemembers where path in (%s)" %
+                 ','.join('?' for _ in chunk))
+            self.execute(q, chunk)
 
     def access_set(self, path, permissions):
         """Set permissions for path. The permissions dict
@@ -48,6 +77,7 @@ class Permissions(XFeatures, Groups, Public, Node):
 
         r = permissions.get('read', [])
         w = permissions.get('write', [])
+        self._unindex_paths([path])
         if not r and not w:
             self.xfeature_destroy(path)
             return
@@ -58,6 +88,7 @@ class Permissions(XFeatures, Groups, Public, Node):
             self.feature_setmany(feature, READ, r)
         if w:
             self.feature_setmany(feature, WRITE, w)
+        self._index_members(path, list(r) + list(w))
 
     def access_get_for_bulk(self, perms):
         """Get permissions for paths."""
@@ -77,6 +108,26 @@ class Permissions(XFeatures, Groups, Public, Node):
             del(permissions[WRITE])
         return (permissions, allowed)
 
+    def access_get_bulk(self, paths):
+        """Get permissions for paths.
+           Return a dict mapping each path with permissions
+           to its permissions, as returned by access_get.
+        """
+
+        if not paths:
+            return {}
+        perms = defaultdict(list)
+        for chunk in chunks(list(set(paths)), MAX_VARIABLES):
+            q = ("select v.value, f.path, v.key "
+                 "from xfeatures f, xfeaturevals v "
+                 "where f.feature_id = v.feature_id and f.path in (%s)" %
+                 ','.join('?' for _ in chunk))
+            self.execute(q, chunk)
+            for row in self.fetchall():
+                perms[row[1]].append(row)
+        return dict((path, self.access_get_for_bulk(rows)[0])
+                    for path, rows in perms.iteritems())
+
     def access_get(self, path):
         """Get permissions for path."""
 
@@ -113,21 +164,23 @@ class Permissions(XFeatures, Groups, Public, Node):
         """Revoke access to path (both permissions and public)."""
 
         self.xfeature_destroy(path)
+        self._unindex_paths([path])
         self.public_unset(path)
 
     def access_clear_bulk(self, paths):
         """Revoke access to path (both permissions and public)."""
 
         self.xfeature_destroy_bulk(paths)
+        self._unindex_paths(paths)
         self.public_unset_bulk(paths)
 
     def access_check(self, path, access, member):
         """Return true if the member has this access to the path."""
 
-        feature = self.xfeature_get(path)
-        if not feature:
+        feature = self.xfeature_lookup([path])[path]
+        if feature is None:
             return False
-        members = self.feature_get(feature, access)
+        members = feature.get(access, [])
         if member in members or '*' in members:
             return True
         for owner, group in self.group_parents(member):
@@ -170,7 +223,8 @@ class Permissions(XFeatures, Groups, Public, Node):
             valid.append(subp)
             if subp != path:
                 valid.append(subp + '/')
-        return [x for x in valid if self.xfeature_get(x)]
+        features = self.xfeature_lookup(valid)
+        return [x for x in valid if features[x] is not None]
 
     def access_inherit_bulk(self, paths):
         """Return the paths influencing the access for paths."""
@@ -184,11 +238,41 @@ class Permissions(XFeatures, Groups, Public, Node):
                 valid.append(subp)
                 if subp != path:
                     valid.append(subp + '/')
-        valid = self.xfeature_get_bulk(valid)
-        return [x[1] for x in valid]
+        features = self.xfeature_lookup(set(valid))
+        return sorted(x for x, f in features.iteritems() if f is not None)
+
+    def _granted_members(self, member):
+        """Return the members through which paths are granted to member:
+           the member itself, its groups and '*' (all).
+        """
+
+        members = ['*']
+        if member is not None:
+            members.append(member)
+            members.extend(owner + ':' + group for owner, group in
+                           self.group_parents(member))
+        return members
+
+    def _granted_paths(self, member):
+        members = self._granted_members(member)
+        q = ("select distinct path from xfeaturemembers "
+             "where member in (%s)") % ','.join('?' for _ in members)
+        return q, tuple(members)
+
+    def _prefix_ranges(self, prefix):
+        """Return a condition selecting the paths that start
+           with prefix or with a path it inherits access from.
+        """
+
+        paths = self.access_inherit(prefix) or [prefix]
+        q = ' or '.join("(path >= ? and path < ?)" for _ in paths)
+        args = ()
+        for path in paths:
+            args += (path, strnextling(path))
+        return '(%s)' % q, args
 
     def access_list_paths(self, member, prefix=None, include_owned=False,
-                          include_containers=True):
+                          include_containers=True, marker=None, limit=None):
         """Return the list of paths granted to member.
 
         Keyword arguments:
@@ -196,21 +280,25 @@ class Permissions(XFeatures, Groups, Public, Node):
         include_owned -- return also paths owned by member (default False)
         include_containers -- return also container paths owned by member
                               (default True)
+        marker -- return only granted paths after marker, in order
+                  (default None)
+        limit -- return up to limit granted paths, in order (default None)
 
         """
 
-        q = ("select distinct path from xfeatures inner join "
-             "  (select distinct feature_id, key from xfeaturevals inner join "
-             "     (select owner || ':' || name as value from groups "
-             "      where member = ? union select ? union select '*') "
-             "   using (value)) "
-             "using (feature_id)")
-        p = (member, member)
+        q, p = self._granted_paths(member)
         if prefix:
-            q += " where "
-            paths = self.access_inherit(prefix) or [prefix]
-            q += ' or '.join("path like ? escape '\\'" for _ in paths)
-            p += tuple(self.escape_like(path) + '%' for path in paths)
+            cond, args = self._prefix_ranges(prefix)
+            q += " and " + cond
+            p += args
+        if marker:
+            q += " and path > ?"
+            p += (marker,)
+        if marker or limit:
+            q += " order by path"
+        if limit:
+            q += " limit ?"
+            p += (limit,)
         self.execute(q, p)
 
         l = [r[0] for r in self.fetchall()]
@@ -227,12 +315,61 @@ class Permissions(XFeatures, Groups, Public, Node):
             l += [r[0] for r in self.fetchall() if r[0] not in l]
         return l
 
-    def access_list_shared(self, prefix=''):
-        """Return the list of shared paths."""
-
-        q = "select path from xfeatures where "
-        paths = self.access_inherit(prefix) or [prefix]
-        q += ' or '.join("path like ? escape '\\'" for _ in paths)
-        p = tuple(self.escape_like(path) + '%' for path in paths)
+    def access_list_shared(self, prefix='', marker=None, limit=None):
+        """Return the list of shared paths, after marker."""
+
+        cond, p = self._prefix_ranges(prefix)
+        q = "select path from xfeatures where " + cond
+        if marker:
+            q += " and path > ?"
+            p += (marker,)
+        q += " order by path"
+        if limit:
+            q += " limit ?"
+            p += (limit,)
         self.execute(q, p)
         return [r[0] for r in self.fetchall()]
+
+    def _list_path_parts(self, q, args, prefix, marker, limit):
+        """Return the distinct parts of the paths selected by q,
+           following prefix up to the next '/', after marker.
+
+           Parts are extracted, ordered and limited in a single query.
+        """
+
+        q = ("select distinct path_part(path, ?) as part "
+             "from (%s and path > ? and path < ?) " % q)
+        args = (len(prefix),) + tuple(args) + (prefix, strnextling(prefix))
+        if marker:
+            q = "select part from (%s) where part > ?" % q
+            args += (marker,)
+        q += " order by part limit ?"
+        args += (limit,)
+        self.execute(q, args)
+        return [r[0] for r in self.fetchall()]
+
+    def access_list_prefixes(self, member=None, prefix='', marker=None,
+                             limit=10000):
+        """Return the distinct parts of the paths granted to member
+           (or of all the shared paths, if member is None),
+           following prefix up to the next '/'.
+
+           Parts are ordered by name and start after marker.
+        """
+
+        if member is None:
+            q = "select path from xfeatures where 1"
+            args = ()
+        else:
+            q, args = self._granted_paths(member)
+        return self._list_path_parts(q, args, prefix, marker, limit)
+
+    def public_list_prefixes(self, prefix='', marker=None, limit=10000):
+        """Return the distinct parts of the public paths,
+           following prefix up to the next '/'.
+
+           Parts are ordered by name and start after marker.
+        """
+
+        q = "select path from public where active = 1"
+        return self._list_path_parts(q, (), prefix, marker, limit)
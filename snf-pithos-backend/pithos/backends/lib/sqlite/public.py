@@ -13,7 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from dbworker import DBWorker
+from dbworker import DBWorker, MAX_VARIABLES, chunks
 
 from pithos.backends.random_word import get_random_word
 
@@ -67,9 +67,10 @@ class Public(DBWorker):
             logger.info('Public url unset for path: %s' % path)
 
     def public_unset_bulk(self, paths):
-        placeholders = ','.join('?' for path in paths)
-        q = "delete from public where path in (%s)" % placeholders
-        self.execute(q, paths)
+        for chunk in chunks(list(paths), MAX_VARIABLES):
+            placeholders = ','.join('?' for path in chunk)
+            q = "delete from public where path in (%s)" % placeholders
+            self.execute(q, chunk)
 
     def public_get(self, path):
         q = "select url from public where path = ? and active = 1"
@@ -15,7 +15,7 @@
 
 from collections import defaultdict
 
-from dbworker import DBWorker
+from dbworker import DBWorker, MAX_VARIABLES, chunks
 
 
 class XFeatures(DBWorker):
@@ -25,6 +25,9 @@ class XFeatures(DBWorker):
 
     def __init__(self, **params):
         DBWorker.__init__(self, **params)
+        # Shared cache of features, set by the backend.
+        self.xfeature_cache = None
+        self.xfeature_reset_memo()
         execute = self.execute
 
         execute(""" pragma foreign_keys = on """)
@@ -44,6 +47,28 @@ class XFeatures(DBWorker):
                                 xfeatures(feature_id)
                             on delete cascade ) """)
 
+        # Denormalized (member, path) pairs of the features,
+        # for listing the paths granted to members in order.
+        execute(""" select 1 from sqlite_master
+                    where type = 'table' and name = 'xfeaturemembers' """)
+        exists = self.fetchone() is not None
+        execute(""" create table if not exists xfeaturemembers
+                          ( member     text,
+                            path       text,
+                            primary key (member, path) ) """)
+        execute(""" create index if not exists idx_xfeaturemembers_path
+                    on xfeaturemembers(path) """)
+        if not exists:
+            execute(""" insert or ignore into xfeaturemembers (member, path)
+                        select v.value, f.path from xfeatures f, xfeaturevals v
+                        where f.feature_id = v.feature_id """)
+
+        execute(""" create table if not exists xfeatures_version
+                          ( version integer not null default 0 ) """)
+        execute(""" insert into xfeatures_version (version)
+                    select 0 where not exists
+                    (select 1 from xfeatures_version) """)
+
 #     def xfeature_inherit(self, path):
 #         """Return the (path, feature) inherited by the path, or None."""
 #
@@ -54,6 +79,83 @@ class XFeatures(DBWorker):
 #         self.execute(q, (path, path))
 #         return self.fetchall()
 
+    def xfeature_reset_memo(self):
+        """Forget the features looked up so far.
+           Must be called at the start of each transaction.
+        """
+
+        self.xfeature_memo = {}
+        self.xfeature_memo_version = None
+        self.xfeature_memo_dirty = False
+
+    def xfeature_version(self):
+        """Return the version of the features,
+           increased whenever a feature changes.
+        """
+
+        self.execute("select version from xfeatures_version")
+        r = self.fetchone()
+        return r[0] if r else 0
+
+    def _xfeatures_changed(self, rowcount=1):
+        if not rowcount:
+            return
+        self.xfeature_memo.clear()
+        if self.xfeature_cache is None:
+            # Without a shared cache there are no cached features to
+            # invalidate, so do not serialize on the version row.
+            return
+        # Uncommitted changes must not reach the shared cache.
+        self.xfeature_memo_dirty = True
+        self.execute("update xfeatures_version set version = version + 1")
+
+    def xfeature_lookup(self, paths):
+        """Return a dict mapping each path to the dict of key, value list
+           pairs of its feature, or None if the path has no feature.
+           Features are remembered until xfeature_reset_memo is called
+           or a feature changes, and are shared among transactions
+           through xfeature_cache, if set.
+        """
+
+        memo = self.xfeature_memo
+        cache = self.xfeature_cache
+        if cache is not None and self.xfeature_memo_dirty:
+            cache = None
+        missing = set()
+        for path in paths:
+            if path in memo:
+                continue
+            if cache is not None:
+                if self.xfeature_memo_version is None:
+                    self.xfeature_memo_version = self.xfeature_version()
+                found, value = cache.get(path, self.xfeature_memo_version)
+                if found:
+                    memo[path] = value
+                    continue
+            missing.add(path)
+
+        if missing:
+            missing = list(missing)
+            features = dict((path, None) for path in missing)
+            q = ("select f.path, v.key, v.value from xfeatures f "
+                 "left outer join xfeaturevals v "
+                 "on f.feature_id = v.feature_id "
+                 "where f.path in (%s)") % ','.join('?' for _ in missing)
+            self.execute(q, missing)
+            for path, key, value in self.fetchall():
+                d = features[path]
+                if d is None:
+                    d = features[path] = defaultdict(list)
+                if key is not None:
+                    d[key].append(value)
+            for path, d in features.iteritems():
+                if d is not None:
+                    d = dict(d)
+                memo[path] = d
+                if cache is not None:
+                    cache.put(path, d, self.xfeature_memo_version)
+        return dict((path, memo[path]) for path in paths)
+
     def xfeature_get(self, path):
         """Return feature for path."""
 
@@ -87,6 +189,7 @@ class XFeatures(DBWorker):
             return feature
         q = "insert into xfeatures (path) values (?)"
         id = self.execute(q, (path,)).lastrowid
+        self._xfeatures_changed()
         return id
 
     def xfeature_destroy(self, path):
@@ -94,13 +197,16 @@ class XFeatures(DBWorker):
 
         q = "delete from xfeatures where path = ?"
         self.execute(q, (path,))
+        self._xfeatures_changed(self.cur.rowcount)
 
     def xfeature_destroy_bulk(self, paths):
         """Destroy features and all their key, value pairs."""
 
-        placeholders = ','.join('?' for path in paths)
-        q = "delete from xfeatures where path in (%s)" % placeholders
-        self.execute(q, paths)
+        for chunk in chunks(list(paths), MAX_VARIABLES):
+            placeholders = ','.join('?' for path in chunk)
+            q = "delete from xfeatures where path in (%s)" % placeholders
+            self.execute(q, chunk)
+            self._xfeatures_changed(self.cur.rowcount)
 
     def feature_dict(self, feature):
         """Return a dict mapping keys to list of values for feature."""
@@ -118,6 +224,7 @@ class XFeatures(DBWorker):
         q = ("insert or ignore into xfeaturevals (feature_id, key, value) "
              "values (?, ?, ?)")
         self.execute(q, (feature, key, value))
+        self._xfeatures_changed(self.cur.rowcount)
 
     def feature_setmany(self, feature, key, values):
         """Associate the given key, and values with a feature."""
@@ -125,6 +232,7 @@ class XFeatures(DBWorker):
         q = ("insert or ignore into xfeaturevals (feature_id, key, value) "
              "values (?, ?, ?)")
         self.executemany(q, ((feature, key, v) for v in values))
+        self._xfeatures_changed(self.cur.rowcount)
 
     def feature_unset(self, feature, key, value):
         """Disassociate a key, value pair from a feature."""
@@ -132,6 +240,7 @@ class XFeatures(DBWorker):
         q = ("delete from xfeaturevals where "
              "feature_id = ? and key = ? and value = ?")
         self.execute(q, (feature, key, value))
+        self._xfeatures_changed(self.cur.rowcount)
 
     def feature_unsetmany(self, feature, key, values):
         """Disassociate the key for the values given, from a feature."""
@@ -139,6 +248,7 @@ class XFeatures(DBWorker):
         q = ("delete from xfeaturevals where "
              "feature_id = ? and key = ? and value = ?")
         self.executemany(q, ((feature, key, v) for v in values))
+        self._xfeatures_changed(self.cur.rowcount)
 
     def feature_get(self, feature, key):
         """Return the list of values for a key of a feature."""
@@ -152,3 +262,4 @@ class XFeatures(DBWorker):
 
         q = "delete from xfeaturevals where feature_id = ? and key = ?"
         self.execute(q, (feature, key))
+        self._xfeatures_changed(self.cur.rowcount)
@@ -22,10 +22,10 @@ import binascii
 from collections import defaultdict, OrderedDict
 from functools import wraps, partial
 from traceback import format_exc
+from threading import Lock
 from time import time
 
 from pithos.workers import glue
-from archipelago.common import Segment, Xseg_ctx
 from objpool import ObjectPool
 
 
@@ -40,6 +40,8 @@ from pithos.backends.base import (
     BaseBackend, AccountExists, ContainerExists, AccountNotEmpty,
     ContainerNotEmpty, ItemNotExists, VersionNotExists,
     InvalidHash, IllegalOperationError)
+from pithos.backends.util import (BlockCache, PermissionsCache,
+                                  OperationStats, InstrumentedStore)
 
 
 class DisabledAstakosClient(object):
@@ -87,6 +89,8 @@ DEFAULT_DB_MODULE = 'pithos.backends.lib.sqlalchemy'
 DEFAULT_DB_CONNECTION = 'sqlite:///backend.db'
 DEFAULT_BLOCK_MODULE = 'pithos.backends.lib.hashfiler'
 DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024  # 4MB
+DEFAULT_BLOCK_CACHE_SIZE = 0  # disabled
+DEFAULT_PERMISSIONS_CACHE_SIZE = 0  # disabled
 DEFAULT_HASH_ALGORITHM = 'sha256'
 # DEFAULT_QUEUE_MODULE = 'pithos.backends.lib.rabbitmq'
 DEFAULT_BLOCK_PARAMS = {'mappool': None, 'blockpool': None}
@@ -110,6 +114,9 @@ PROJECT = 'project'
 
 inf = float('inf')
 
+# Objects handled together by the bulk (delimiter) operations.
+BULK_OPERATION_SIZE = 1000
+
 ULTIMATE_ANSWER = 42
 
 DEFAULT_DISKSPACE_RESOURCE = 'pithos.diskspace'
@@ -120,6 +127,33 @@ DEFAULT_MAPFILE_PREFIX = 'snf_file_'
 
 logger = logging.getLogger(__name__)
 
+# Block caches are shared among all backend instances of the process.
+_block_caches = {}
+_block_caches_lock = Lock()
+
+
+def _get_block_cache(block_module, hash_algorithm, size):
+    key = (block_module, hash_algorithm, size)
+    with _block_caches_lock:
+        cache = _block_caches.get(key)
+        if cache is None:
+            cache = _block_caches[key] = BlockCache(size)
+        return cache
+
+# Permissions caches are shared among all backend instances of the process
+# that use the same database.
+_permissions_caches = {}
+_permissions_caches_lock = Lock()
+
+
+def _get_permissions_cache(db_module, db_connection, size):
+    key = (db_module, db_connection, size)
+    with _permissions_caches_lock:
+        cache = _permissions_caches.get(key)
+        if cache is None:
+            cache = _permissions_caches[key] = PermissionsCache(size)
+        return cache
+
 _propnames = ('serial', 'node',  'hash', 'size', 'type', 'source', 'mtime',
               'muser', 'uuid', 'checksum', 'cluster', 'available',
               'map_check_timestamp', 'mapfile', 'is_snapshot')
@@ -201,17 +235,6 @@ def check_allowed_paths(action):
     return decorator
 
 
-def list_method(func):
-    @wraps(func)
-    def wrapper(self, *args, **kw):
-        marker = kw.get('marker')
-        limit = kw.get('limit')
-        result = func(self, *args, **kw)
-        start, limit = self._list_limits(result, marker, limit)
-        return result[start:start + limit]
-    return wrapper
-
-
 class ModularBackend(BaseBackend):
     """A modular backend.
 
@@ -219,7 +242,9 @@ class ModularBackend(BaseBackend):
     """
 
     def __init__(self, db_module=None, db_connection=None,
+                 db_pool_params=None,
                  block_module=None, block_size=None, hash_algorithm=None,
+                 block_cache_size=None, permissions_cache_size=None,
                  queue_module=None, queue_hosts=None, queue_exchange=None,
                  astakos_auth_url=None, service_token=None,
                  astakosclient_poolsize=None,
@@ -232,13 +257,17 @@ class ModularBackend(BaseBackend):
                  archipelago_conf_file=None,
                  xseg_pool_size=8,
                  map_check_interval=None,
-                 mapfile_prefix=None):
+                 mapfile_prefix=None,
+                 request_stats=False):
         db_module = db_module or DEFAULT_DB_MODULE
         db_connection = db_connection or DEFAULT_DB_CONNECTION
         block_module = block_module or DEFAULT_BLOCK_MODULE
         block_params = block_params or DEFAULT_BLOCK_PARAMS
         block_size = block_size or DEFAULT_BLOCK_SIZE
         hash_algorithm = hash_algorithm or DEFAULT_HASH_ALGORITHM
+        block_cache_size = block_cache_size or DEFAULT_BLOCK_CACHE_SIZE
+        permissions_cache_size = permissions_cache_size \
+            or DEFAULT_PERMISSIONS_CACHE_SIZE
         # queue_module = queue_module or DEFAULT_QUEUE_MODULE
         account_quota_policy = account_quota_policy or DEFAULT_ACCOUNT_QUOTA
         container_quota_policy = container_quota_policy \
@@ -277,7 +306,11 @@ class ModularBackend(BaseBackend):
             return sys.modules[m]
 
         self.db_module = load_module(db_module)
-        self.wrapper = self.db_module.DBWrapper(db_connection)
+        self.wrapper = self.db_module.DBWrapper(db_connection,
+                                                **(db_pool_params or {}))
+        # Account the statements and the store operations, if requested.
+        self.stats = OperationStats() if request_stats else None
+        self.wrapper.stats = self.stats
         params = {'wrapper': self.wrapper}
         self.config = self.db_module.Config(**params)
         self.commission_serials = self.db_module.QuotaholderSerial(**params)
@@ -286,6 +319,9 @@ class ModularBackend(BaseBackend):
         params.update({'mapfile_prefix': self.mapfile_prefix,
                        'props': _props(_propnames)})
         self.permissions = self.db_module.Permissions(**params)
+        if permissions_cache_size > 0:
+            self.permissions.xfeature_cache = _get_permissions_cache(
+                db_module, db_connection, permissions_cache_size)
         self.node = self.db_module.Node(**params)
         for x in ['ROOTNODE', 'MATCH_PREFIX', 'MATCH_EXACT']:
             setattr(self, x, getattr(self.db_module, x))
@@ -294,18 +330,28 @@ class ModularBackend(BaseBackend):
 
         self.ALLOWED = ['read', 'write']
 
-        glue.WorkerGlue.setupXsegPool(ObjectPool, Segment, Xseg_ctx,
-                                      cfile=archipelago_conf_file,
-                                      pool_size=xseg_pool_size)
+        self.block_module = load_module(block_module)
+        if getattr(self.block_module, 'USES_ARCHIPELAGO', True):
+            from archipelago.common import Segment, Xseg_ctx
+            glue.WorkerGlue.setupXsegPool(ObjectPool, Segment, Xseg_ctx,
+                                          cfile=archipelago_conf_file,
+                                          pool_size=xseg_pool_size)
 
         self.ioctx_pool = glue.WorkerGlue.ioctx_pool
-        self.block_module = load_module(block_module)
         self.block_params = block_params
         params = {'block_size': self.block_size,
                   'hash_algorithm': self.hash_algorithm,
                   'archipelago_cfile': archipelago_conf_file}
         params.update(self.block_params)
         self.store = self.block_module.Store(**params)
+        if self.stats is not None:
+            self.store = InstrumentedStore(self.store, self.stats)
+        if block_cache_size > 0:
+            self.block_cache = _get_block_cache(block_module,
+                                                self.hash_algorithm,
+                                                block_cache_size)
+        else:
+            self.block_cache = None
 
         if queue_module and queue_hosts:
             self.queue_module = load_module(queue_module)
@@ -358,6 +404,7 @@ class ModularBackend(BaseBackend):
         self.wrapper.execute()
         self.serials = []
         self._reset_allowed_paths()
+        self.permissions.access_reset_memo()
         self.in_transaction = True
 
     def post_exec(self, success_status=True):
@@ -405,11 +452,11 @@ class ModularBackend(BaseBackend):
 
     @debug_method
     @backend_method
-    @list_method
     def list_accounts(self, user, marker=None, limit=10000):
         """Return a list of accounts the user can access."""
 
-        return self._allowed_accounts(user)
+        limit = self._list_limit(limit)
+        return self._allowed_accounts(user, marker, limit)
 
     @debug_method
     @backend_method
@@ -560,25 +607,26 @@ class ModularBackend(BaseBackend):
 
     @debug_method
     @backend_method
-    @list_method
     def list_containers(self, user, account, marker=None, limit=10000,
                         shared=False, until=None, public=False):
         """Return a list of containers existing under an account."""
 
         self._can_read_account(user, account)
+        limit = self._list_limit(limit)
         if user != account:
             if until:
                 raise NotAllowedError
-            return self._allowed_containers(user, account)
+            return self._allowed_containers(user, account, marker, limit)
         if shared or public:
+            prefix = account + '/'
             allowed = set()
             if shared:
-                allowed.update([x.split('/', 2)[1] for x in
-                               self.permissions.access_list_shared(account)])
+                allowed.update(self.permissions.access_list_prefixes(
+                    None, prefix, marker, limit))
             if public:
-                allowed.update([x[0].split('/', 2)[1] for x in
-                               self.permissions.public_list(account)])
-            return sorted(allowed)
+                allowed.update(self.permissions.public_list_prefixes(
+                    prefix, marker, limit))
+            return sorted(allowed)[:limit]
         node = self.node.node_lookup(account)
         return [x[0] for x in self._list_object_properties(
             node, account, '', '/', marker, limit, False, None, [], until)]
@@ -731,11 +779,11 @@ class ModularBackend(BaseBackend):
         if until is not None:
             hashes, size, serials = self.node.node_purge_children(
                 node, until, CLUSTER_HISTORY,
-                update_statistics_ancestors_depth=0)
+                update_statistics_ancestors_depth=1)
             for h in hashes:
                 self.store.map_delete(h)
             self.node.node_purge_children(node, until, CLUSTER_DELETED,
-                                          update_statistics_ancestors_depth=0)
+                                          update_statistics_ancestors_depth=1)
             if not self.free_versioning:
                 self._report_size_change(
                     user, account, -size, project, {
@@ -751,11 +799,11 @@ class ModularBackend(BaseBackend):
                 raise ContainerNotEmpty('Container is not empty')
             hashes, size, serials = self.node.node_purge_children(
                 node, inf, CLUSTER_HISTORY,
-                update_statistics_ancestors_depth=0)
+                update_statistics_ancestors_depth=1)
             for h in hashes:
                 self.store.map_delete(h)
             self.node.node_purge_children(node, inf, CLUSTER_DELETED,
-                                          update_statistics_ancestors_depth=0)
+                                          update_statistics_ancestors_depth=1)
             self.node.node_remove(node, update_statistics_ancestors_depth=0)
             if not self.free_versioning:
                 self._report_size_change(
@@ -787,12 +835,12 @@ class ModularBackend(BaseBackend):
                     self._put_version_duplicate(
                         user, node, size=0, type='', hash=None, checksum='',
                         cluster=CLUSTER_DELETED,
-                        update_statistics_ancestors_depth=1,
+                        update_statistics_ancestors_depth=2,
                         keep_src_mapfile=True)
                 dest_versions.append(dest_version_id)
                 del_size = self._apply_versioning(
                     account, container, src_version_id,
-                    update_statistics_ancestors_depth=1)
+                    update_statistics_ancestors_depth=2)
                 freed_space += del_size
                 self._report_object_change(
                     user, account, path, details={'action': 'object delete'})
@@ -1032,9 +1080,9 @@ class ModularBackend(BaseBackend):
                                          lock_container=True)
         src_version_id, dest_version_id = self._put_metadata(
             user, node, domain, meta, replace,
-            update_statistics_ancestors_depth=1)
+            update_statistics_ancestors_depth=2)
         self._apply_versioning(account, container, src_version_id,
-                               update_statistics_ancestors_depth=1)
+                               update_statistics_ancestors_depth=2)
         return dest_version_id
 
     @debug_method
@@ -1211,7 +1259,7 @@ class ModularBackend(BaseBackend):
         pre_version_id, dest_version_id, mapfile = self._put_version_duplicate(
             user, node, src_node=src_node, size=size, type=type, hash=hash,
             checksum=checksum, is_copy=is_copy,
-            update_statistics_ancestors_depth=1,
+            update_statistics_ancestors_depth=2,
             available=available, keep_available=keep_available,
             force_mapfile=force_mapfile, is_snapshot=is_snapshot)
 
@@ -1222,32 +1270,10 @@ class ModularBackend(BaseBackend):
             src_version_id, dest_version_id, domain, node, meta, replace_meta)
 
         del_size = self._apply_versioning(account, container, pre_version_id,
-                                          update_statistics_ancestors_depth=1)
+                                          update_statistics_ancestors_depth=2)
         size_delta = size - del_size
         if size_delta > 0:
-            # Check account quota.
-            if not self.using_external_quotaholder:
-                account_quota = long(self._get_policy(
-                    account_node, is_account_policy=True)[QUOTA_POLICY])
-                account_usage = self._get_statistics(account_node,
-                                                     compute=True)[1]
-                if (account_quota > 0 and account_usage > account_quota):
-                    raise QuotaError(
-                        'Account quota exceeded: limit: %s, usage: %s' % (
-                            account_quota, account_usage))
-
-            # Check container quota.
-            container_quota = long(self._get_policy(
-                container_node, is_account_policy=False)[QUOTA_POLICY])
-            container_usage = self._get_statistics(container_node)[1]
-            if (container_quota > 0 and container_usage > container_quota):
-                # This must be executed in a transaction, so the version is
-                # never created if it fails.
-                raise QuotaError(
-                    'Container quota exceeded: limit: %s, usage: %s' % (
-                        container_quota, container_usage
-                    )
-                )
+            self._check_quota(account_node, container_node)
 
         if report_size_change:
             self._report_size_change(
@@ -1265,6 +1291,30 @@ class ModularBackend(BaseBackend):
             details={'version': dest_version_id, 'action': 'object update'})
         return dest_version_id, size_delta, mapfile
 
+    def _check_quota(self, account_node, container_node):
+        # Check account quota.
+        if not self.using_external_quotaholder:
+            account_quota = long(self._get_policy(
+                account_node, is_account_policy=True)[QUOTA_POLICY])
+            account_usage = self._get_statistics(account_node)[1]
+            if (account_quota > 0 and account_usage > account_quota):
+                raise QuotaError(
+                    'Account quota exceeded: limit: %s, usage: %s' % (
+                        account_quota, account_usage))
+
+        # Check container quota.
+        container_quota = long(self._get_policy(
+            container_node, is_account_policy=False)[QUOTA_POLICY])
+        container_usage = self._get_statistics(container_node)[1]
+        if (container_quota > 0 and container_usage > container_quota):
+            # This must be executed in a transaction, so the version is
+            # never created if it fails.
+            raise QuotaError(
+                'Container quota exceeded: limit: %s, usage: %s' % (
+                    container_quota, container_usage
+                )
+            )
+
     @debug_method
     @backend_method
     def register_object_map(self, user, account, container, name, size, type,
@@ -1361,6 +1411,19 @@ class ModularBackend(BaseBackend):
             self.store.map_put(mapfile, map_, size, self.block_size)
         return dest_version_id, hexlified
 
+    @debug_method
+    @backend_method
+    def lookup_object_checksum(self, hashmap, size):
+        """Return the checksum of any object with the same hashmap and size.
+
+        Return None if the checksum is not known.
+        """
+
+        map_ = HashMap(self.block_size, self.hash_algorithm)
+        map_.extend([self._unhexlify_hash(x) for x in hashmap])
+        hash_ = binascii.hexlify(map_.hash())
+        return self.node.version_lookup_checksum(hash_, size)
+
     @debug_method
     @backend_method
     def update_object_checksum(self, user, account, container, name, version,
@@ -1478,62 +1541,59 @@ class ModularBackend(BaseBackend):
                 virtual=False, domain=None, keys=[], shared=False, until=None,
                 size_range=None, all_props=True, public=False,
                 listing_limit=listing_limit)
-            src_names.sort(key=lambda x: x[2])  # order by nodes
-            paths = [elem[0] for elem in src_names]
-            nodes = [elem[2] for elem in src_names]
-            # TODO: Will do another fetch of the properties
-            # in duplicate version...
-            props = self._get_versions(nodes)
-
-            for prop, path, node in zip(props, paths, nodes):
-                src_version_id = prop[self.SERIAL]
-                hash = prop[self.HASH]
-                vtype = prop[self.TYPE]
-                size = prop[self.SIZE]
-                is_snapshot = prop[self.IS_SNAPSHOT]
-                dest_prefix = dest_name + delimiter if not dest_name.endswith(
-                    delimiter) else dest_name
-                vdest_name = path.replace(prefix, dest_prefix, 1)
-
-                if is_copy and not prop[self.AVAILABLE]:
-                    raise NotAllowedError('Copying objects not available in '
-                                          'the storage backend is forbidden.')
-
-                src_mapfile = prop[self.MAPFILE]
-                force_mapfile = src_mapfile if not is_copy else None
-
-                # _update_object_hash() locks destination path
-                dest_version_id, size_delta, dest_mapfile = \
-                    self._update_object_hash(
-                        user, dest_account, dest_container, vdest_name, size,
-                        vtype, hash, None, dest_domain, meta={},
-                        replace_meta=False, permissions=None, src_node=node,
-                        src_version_id=src_version_id, is_copy=is_copy,
-                        report_size_change=(not bulk_report_size_change),
-                        keep_available=True, is_snapshot=is_snapshot,
-                        force_mapfile=force_mapfile)
-
-                # store destination mapfile
-                if size != 0 and src_mapfile != dest_mapfile:
-                    try:
-                        hashmap = self._get_object_hashmap(
-                            prop, update_available=False)
-                    except:
-                        raise NotAllowedError(
-                            "Copy is not permitted: failed to get "
-                            "source object's mapfile: %s" % src_mapfile)
-                    hashmap = map(self._unhexlify_hash, hashmap)
-                    self.store.map_put(dest_mapfile, hashmap, size,
-                                       self.block_size)
-
-                dest_versions.append(dest_version_id)
-                occupied_space += size_delta
-                if is_move and (src_account, src_container, path) != (
-                        dest_account, dest_container, vdest_name):
-                    del_size = self._delete_object(
-                        user, src_account, src_container, path,
-                        report_size_change=(not bulk_report_size_change))
+            src_paths = dict((elem[2], elem[0]) for elem in src_names)
+            # order by nodes
+            props = sorted(self._get_versions(src_paths.keys()),
+                           key=lambda x: x[self.NODE])
+            dest_prefix = dest_name + delimiter if not dest_name.endswith(
+                delimiter) else dest_name
+            objects = [(prop, src_paths[prop[self.NODE]].replace(
+                prefix, dest_prefix, 1)) for prop in props]
+
+            for i in xrange(0, len(objects), BULK_OPERATION_SIZE):
+                batch = objects[i:i + BULK_OPERATION_SIZE]
+                copied = self._copy_objects_bulk(
+                    user, dest_account, dest_container, batch, is_copy)
+                deleted = {}
+                if is_move:
+                    moved = []
+                    for prop, vdest_name in batch:
+                        node = prop[self.NODE]
+                        path = src_paths[node]
+                        if (src_account, src_container, path) != (
+                                dest_account, dest_container, vdest_name):
+                            moved.append(
+                                ('/'.join((src_container_path, path)), node))
+                    deleted = dict(
+                        (path, (dest_version_id, del_size))
+                        for path, dest_version_id, del_size in
+                        self._delete_objects_bulk(
+                            user, src_account, src_container, moved))
+
+                for (prop, vdest_name), (dest_version_id, size_delta) in zip(
+                        batch, copied):
+                    dest_versions.append(dest_version_id)
+                    occupied_space += size_delta
+                    if not bulk_report_size_change:
+                        self._report_size_change(
+                            user, dest_account, size_delta, dest_project,
+                            {'action': 'object update',
+                             'path': '/'.join((dest_container_path,
+                                               vdest_name)),
+                             'versions': str(dest_version_id)})
+                    path = '/'.join((src_container_path,
+                                     src_paths[prop[self.NODE]]))
+                    if path not in deleted:
+                        continue
+                    del_version_id, del_size = deleted[path]
                     freed_space += del_size
+                    if not bulk_report_size_change:
+                        self._report_size_change(
+                            user, src_account, -del_size,
+                            self._get_project(src_container_node),
+                            {'action': 'object delete',
+                             'path': path,
+                             'versions': str(del_version_id)})
 
         if bulk_report_size_change:     # bulk report size change
             dest_obj_path = '/'.join((dest_container_path, dest_name))
@@ -1600,12 +1660,12 @@ class ModularBackend(BaseBackend):
             size = 0
             serials = []
             h, s, v = self.node.node_purge(node, until, CLUSTER_NORMAL,
-                                           update_statistics_ancestors_depth=1)
+                                           update_statistics_ancestors_depth=2)
             hashes += h
             size += s
             serials += v
             h, s, v = self.node.node_purge(node, until, CLUSTER_HISTORY,
-                                           update_statistics_ancestors_depth=1)
+                                           update_statistics_ancestors_depth=2)
             hashes += h
             if not self.free_versioning:
                 size += s
@@ -1613,7 +1673,7 @@ class ModularBackend(BaseBackend):
             for h in hashes:
                 self.store.map_delete(h)
             self.node.node_purge(node, until, CLUSTER_DELETED,
-                                 update_statistics_ancestors_depth=1)
+                                 update_statistics_ancestors_depth=2)
             try:
                 self._get_version(node)
             except NameError:
@@ -1634,10 +1694,10 @@ class ModularBackend(BaseBackend):
         # in case we will want to delete them in the future
         src_version_id, dest_version_id, _ = self._put_version_duplicate(
             user, node, size=0, type='', hash=None, checksum='',
-            cluster=CLUSTER_DELETED, update_statistics_ancestors_depth=1,
+            cluster=CLUSTER_DELETED, update_statistics_ancestors_depth=2,
             keep_src_mapfile=True)
         del_size = self._apply_versioning(account, container, src_version_id,
-                                          update_statistics_ancestors_depth=1)
+                                          update_statistics_ancestors_depth=2)
 
         freed_space = del_size
         dest_versions = []
@@ -1652,30 +1712,15 @@ class ModularBackend(BaseBackend):
                 virtual=False, domain=None, keys=[], shared=False, until=None,
                 size_range=None, all_props=True, public=False,
                 listing_limit=listing_limit)
-            paths = []
-            for t in src_names:
-                path = '/'.join((account, container, t[0]))
-                node = t[2]
-                if not self._exists(node):
-                    continue
-
-                # keep reference to the mapfile
-                # in case we will want to delete them in the future
-                src_version_id, dest_version_id, _ = \
-                    self._put_version_duplicate(
-                        user, node, size=0, type='', hash=None, checksum='',
-                        cluster=CLUSTER_DELETED,
-                        update_statistics_ancestors_depth=1,
-                        keep_src_mapfile=True)
-                del_size = self._apply_versioning(
-                    account, container, src_version_id,
-                    update_statistics_ancestors_depth=1)
-                freed_space += del_size
-                dest_versions.append(dest_version_id)
-                self._report_object_change(
-                    user, account, path, details={'action': 'object delete'})
-                paths.append(path)
-            self.permissions.access_clear_bulk(paths)
+            objects = [('/'.join((account, container, t[0])), t[2])
+                       for t in src_names]
+            for i in xrange(0, len(objects), BULK_OPERATION_SIZE):
+                for path, dest_version_id, del_size in \
+                        self._delete_objects_bulk(
+                            user, account, container,
+                            objects[i:i + BULK_OPERATION_SIZE]):
+                    freed_space += del_size
+                    dest_versions.append(dest_version_id)
 
         if report_size_change:
             path = '/'.join([account, container, name])
@@ -1692,6 +1737,115 @@ class ModularBackend(BaseBackend):
         self._reset_allowed_paths()
         return freed_space
 
+    def _copy_objects_bulk(self, user, account, container, objects,
+                           is_copy):
+        """Copy (or move) objects to the container in bulk.
+
+        The objects are given as (props, name) tuples, with the properties
+        of the source version and the destination name of each object.
+        Return a list with the serial of the new version and the size
+        delta of each object.
+        """
+
+        for props, name in objects:
+            if is_copy and not props[self.AVAILABLE]:
+                raise NotAllowedError('Copying objects not available in '
+                                      'the storage backend is forbidden.')
+            self._can_write_object(user, account, container, name)
+
+        account_path, account_node = self._lookup_account(account, True)
+        container_path, container_node = self._lookup_container(
+            account, container)
+        dest = [self._put_object_node(container_path, container_node, name)
+                for props, name in objects]
+        nodes = [node for path, node in dest]
+
+        pre_versions = dict(
+            (props[self.NODE], (props[self.SERIAL], props[self.SIZE]))
+            for props in self._get_versions(nodes))
+        self.node.version_recluster_bulk(
+            [serial for serial, size in pre_versions.itervalues()],
+            CLUSTER_HISTORY, update_statistics_ancestors_depth=2)
+        src_versions = [props[self.SERIAL] for props, name in objects]
+        created = self.node.version_create_bulk(
+            [(serial, node, self._generate_uuid() if is_copy else None)
+             for serial, node in zip(src_versions, nodes)],
+            user, CLUSTER_NORMAL, update_statistics_ancestors_depth=2,
+            new_mapfiles=is_copy)
+        dest_versions = [serial for serial, mtime, mapfile in created]
+        self.node.attribute_copy_bulk(zip(src_versions, dest_versions))
+        self.node.attribute_unset_is_latest_bulk(nodes, dest_versions)
+
+        del_sizes = self._apply_versioning_bulk(
+            account, container, pre_versions.values(),
+            update_statistics_ancestors_depth=2)
+        size_deltas = []
+        for (props, name), node in zip(objects, nodes):
+            pre_version_id = pre_versions.get(node, (None, 0))[0]
+            size_deltas.append(props[self.SIZE] -
+                               del_sizes.get(pre_version_id, 0))
+        if any(size_delta > 0 for size_delta in size_deltas):
+            self._check_quota(account_node, container_node)
+
+        for (props, name), (path, node), (serial, mtime, mapfile) in zip(
+                objects, dest, created):
+            # store destination mapfile
+            size = props[self.SIZE]
+            if size != 0 and props[self.MAPFILE] != mapfile:
+                try:
+                    hashmap = self._get_object_hashmap(
+                        props, update_available=False)
+                except:
+                    raise NotAllowedError(
+                        "Copy is not permitted: failed to get "
+                        "source object's mapfile: %s" % props[self.MAPFILE])
+                hashmap = map(self._unhexlify_hash, hashmap)
+                self.store.map_put(mapfile, hashmap, size, self.block_size)
+            self._report_object_change(
+                user, account, path,
+                details={'version': serial, 'action': 'object update'})
+        return zip(dest_versions, size_deltas)
+
+    def _delete_objects_bulk(self, user, account, container, objects):
+        """Delete objects of the container in bulk.
+
+        The objects are given as (path, node) tuples.
+        Objects already deleted are skipped.
+        Return a list with the path, the serial of the new version
+        and the freed space of each object deleted.
+        """
+
+        if user != account:
+            raise NotAllowedError
+
+        paths = dict((node, path) for path, node in objects)
+        props = list(self._get_versions(paths.keys()))
+        if not props:
+            return []
+        nodes = [p[self.NODE] for p in props]
+        src_versions = [(p[self.SERIAL], p[self.SIZE]) for p in props]
+        self.node.version_recluster_bulk(
+            [serial for serial, size in src_versions], CLUSTER_HISTORY,
+            update_statistics_ancestors_depth=2)
+        created = self.node.version_create_bulk(
+            [(p[self.SERIAL], p[self.NODE], None) for p in props], user,
+            CLUSTER_DELETED, update_statistics_ancestors_depth=2,
+            hash=None, size=0, type='', checksum='')
+        dest_versions = [serial for serial, mtime, mapfile in created]
+        self.node.attribute_unset_is_latest_bulk(nodes, dest_versions)
+        del_sizes = self._apply_versioning_bulk(
+            account, container, src_versions,
+            update_statistics_ancestors_depth=2)
+
+        deleted = [paths[node] for node in nodes]
+        for path in deleted:
+            self._report_object_change(
+                user, account, path, details={'action': 'object delete'})
+        self.permissions.access_clear_bulk(deleted)
+        self._reset_allowed_paths()
+        return zip(deleted, dest_versions,
+                   [del_sizes.get(serial, 0) for serial, size in src_versions])
+
     @debug_method
     @backend_method
     def delete_object(self, user, account, container, name, until=None,
@@ -1766,9 +1920,16 @@ class ModularBackend(BaseBackend):
         """Return a block's data."""
 
         logger.debug("get_block: %s", hash)
+        cache = self.block_cache
+        if cache is not None:
+            block = cache.get(hash)
+            if block is not None:
+                return block
         block = self.store.block_get_archipelago(hash)
         if not block:
             raise ItemNotExists('Block does not exist')
+        if cache is not None:
+            cache.put(hash, block)
         return block
 
     def put_block(self, data):
@@ -2021,6 +2182,11 @@ class ModularBackend(BaseBackend):
             src_version_id, dest_version_id, domain, node, meta, replace)
         return src_version_id, dest_version_id
 
+    def _list_limit(self, limit):
+        if not limit or limit > 10000:
+            limit = 10000
+        return limit
+
     def _list_limits(self, listing, marker, limit):
         start = 0
         if marker:
@@ -2028,9 +2194,7 @@ class ModularBackend(BaseBackend):
                 start = listing.index(marker) + 1
             except ValueError:
                 pass
-        if not limit or limit > 10000:
-            limit = 10000
-        return start, limit
+        return start, self._list_limit(limit)
 
     def _list_object_properties(self, parent, path, prefix='', delimiter=None,
                                 marker=None, limit=10000, virtual=True,
@@ -2065,7 +2229,7 @@ class ModularBackend(BaseBackend):
             return
 
         account_node = self._lookup_account(account, True)[1]
-        total = self._get_statistics(account_node, compute=True)[1]
+        total = self._get_statistics(account_node)[1]
         details.update({'user': user, 'total': total})
         self.messages.append(
             (QUEUE_MESSAGE_KEY_PREFIX % ('resource.diskspace',),
@@ -2184,6 +2348,30 @@ class ModularBackend(BaseBackend):
                 version_id, keys=('size',))[0]
         return 0
 
+    def _apply_versioning_bulk(self, account, container, versions,
+                               update_statistics_ancestors_depth=None):
+        """Delete the provided versions, given as (serial, size) tuples,
+           if such is the policy.
+           Return a dict with the size of each object removed, by serial.
+        """
+
+        if not versions:
+            return {}
+        path, node = self._lookup_container(account, container)
+        versioning = self._get_policy(
+            node, is_account_policy=False)[VERSIONING_POLICY]
+        if versioning != 'auto':
+            removed = {}
+            for serial, hash, size in self.node.version_remove_bulk(
+                    [serial for serial, size in versions],
+                    update_statistics_ancestors_depth):
+                self.store.map_delete(hash)
+                removed[serial] = size
+            return removed
+        elif self.free_versioning:
+            return dict(versions)
+        return {}
+
     # Access control functions.
 
     def _check_groups(self, groups):
@@ -2268,7 +2456,8 @@ class ModularBackend(BaseBackend):
     @check_allowed_paths(action=0)
     def _can_read_account(self, user, account):
         if user != account:
-            if account not in self._allowed_accounts(user):
+            if not self.permissions.access_list_prefixes(
+                    user, account + '/', limit=1):
                 raise NotAllowedError
 
     @check_allowed_paths(action=1)
@@ -2279,7 +2468,8 @@ class ModularBackend(BaseBackend):
     @check_allowed_paths(action=0)
     def _can_read_container(self, user, account, container):
         if user != account:
-            if container not in self._allowed_containers(user, account):
+            if not self.permissions.access_list_prefixes(
+                    user, '/'.join((account, container, '')), limit=1):
                 raise NotAllowedError
 
     @check_allowed_paths(action=1)
@@ -2315,43 +2505,47 @@ class ModularBackend(BaseBackend):
         if not self.permissions.access_check(path, self.WRITE, user):
             raise NotAllowedError
 
-    def _allowed_accounts(self, user):
-        allow = set()
-        for path in self.permissions.access_list_paths(user):
-            p = path.split('/', 1)[0]
-            allow.add(p)
-        self.read_allowed_paths[user] |= allow
-        return sorted(allow)
-
-    def _allowed_containers(self, user, account):
-        allow = set()
-        for path in self.permissions.access_list_paths(user, account):
-            p = path.split('/', 2)[1]
-            allow.add(p)
-        self.read_allowed_paths[user] |= allow
-        return sorted(allow)
+    def _allowed_accounts(self, user, marker=None, limit=10000):
+        allow = self.permissions.access_list_prefixes(user, '', marker, limit)
+        self.read_allowed_paths[user] |= set(allow)
+        return allow
+
+    def _allowed_containers(self, user, account, marker=None, limit=10000):
+        allow = self.permissions.access_list_prefixes(user, account + '/',
+                                                      marker, limit)
+        self.read_allowed_paths[user] |= set(allow)
+        return allow
 
     # Domain functions
 
     @debug_method
     @backend_method
-    def get_domain_objects(self, domain, user=None):
+    def get_domain_objects(self, domain, user=None, filterq=None,
+                           sizeq=None, available=None, sort_key=None,
+                           reverse=False, marker=None, limit=None):
         allowed_paths = self.permissions.access_list_paths(
             user, include_owned=user is not None, include_containers=False)
         if not allowed_paths:
             return []
         obj_list = self.node.domain_object_list(
-            domain, allowed_paths, CLUSTER_NORMAL)
+            domain, allowed_paths, CLUSTER_NORMAL, filterq=filterq,
+            sizeq=sizeq, available=available, sort_key=sort_key,
+            reverse=reverse, marker=marker, limit=limit)
+        permissions = self.permissions.access_get_bulk(
+            [path for path, _, _ in obj_list])
+        # Do not check the maps of unavailable objects while listing,
+        # this is deferred until each object is accessed.
         return [(path,
-                 self._build_metadata(props, user_defined_meta),
-                 self.permissions.access_get(path)) for
+                 self._build_metadata(props, user_defined_meta,
+                                      update_available=False),
+                 permissions.get(path, {})) for
                 path, props, user_defined_meta in obj_list]
 
     # util functions
 
     def _build_metadata(self, props, user_defined=None,
-                        include_user_defined=True):
-        if not props[self.AVAILABLE]:
+                        include_user_defined=True, update_available=True):
+        if not props[self.AVAILABLE] and update_available:
             self._update_available(props)
             available = self.node.version_get_properties(
                 props[self.SERIAL], keys=('available',))[0]
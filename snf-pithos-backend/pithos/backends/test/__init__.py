@@ -17,6 +17,16 @@ from .common import CommonMixin
 from .quota import TestQuotaMixin
 from .delete_by_uuid import TestDeleteByUUIDMixin
 from .snapshots import TestSnapshotsMixin
+from .checksum import TestChecksumMixin
+from .listing import TestListingMixin
+from .statistics import TestStatisticsMixin
+from .permissions import TestPermissionsMixin
+from .dbpool import TestDBPoolMixin
+from .stats import TestRequestStatsMixin
+from .filestore import TestFileStore
+from .blockcache import TestBlockCache
+from .workerpool import TestWorkerPool
+from .benchmark import TestBenchmark
 
 from sqlalchemy import create_engine
 
@@ -24,7 +34,10 @@ import os
 import time
 
 class TestSQLAlchemyBackend(CommonMixin, TestDeleteByUUIDMixin,
-                            TestQuotaMixin, TestSnapshotsMixin):
+                            TestQuotaMixin, TestSnapshotsMixin,
+                            TestChecksumMixin, TestListingMixin,
+                            TestStatisticsMixin, TestPermissionsMixin,
+                            TestDBPoolMixin, TestRequestStatsMixin):
     db_module = 'pithos.backends.lib.sqlalchemy'
     db_connection_str = '%(scheme)s://%(user)s:%(pwd)s@%(host)s:%(port)s/%(name)s'
     scheme = os.environ.get('DB_SCHEME', 'postgres')
@@ -59,7 +72,9 @@ class TestSQLAlchemyBackend(CommonMixin, TestDeleteByUUIDMixin,
         c.connection.connection.set_isolation_level(1)
 
 class TestSQLiteBackend(CommonMixin, TestDeleteByUUIDMixin, TestQuotaMixin,
-                        TestSnapshotsMixin):
+                        TestSnapshotsMixin, TestChecksumMixin,
+                        TestListingMixin, TestStatisticsMixin,
+                        TestPermissionsMixin, TestRequestStatsMixin):
     db_module = 'pithos.backends.lib.sqlite'
     db_connection = location = '/tmp/test_pithos_backend.db'
     mapfile_prefix ='snf_test_pithos_backend_sqlite_%s_' % time.time()
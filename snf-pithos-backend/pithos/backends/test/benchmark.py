@@ -0,0 +1,70 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pithos.backends.benchmark import percentile, compare, main
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = range(1, 11)
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 90), 9)
+        self.assertEqual(percentile(values, 99), 10)
+        self.assertEqual(percentile(values, 1), 1)
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 7), 7)
+        self.assertEqual(percentile([3], 50), 3)
+        self.assertEqual(percentile([], 50), None)
+
+    def test_compare(self):
+        op = lambda p50: {'p50': p50}
+        base = {'operations': {'get': op(1.0), 'put': op(1.0),
+                               'list': op(0), 'removed': op(1.0)}}
+        results = {'operations': {'get': op(1.1), 'put': op(1.5),
+                                  'list': op(1.0), 'added': op(1.0)}}
+        self.assertEqual(compare(results, base, 0.2), [('put', 1.0, 1.5)])
+        self.assertEqual(compare(results, base, 0.05),
+                         [('get', 1.0, 1.1), ('put', 1.0, 1.5)])
+
+    def test_main(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            output = os.path.join(tmpdir, 'results.json')
+            args = ['--objects', '8', '--depth', '2', '--fanout', '2',
+                    '--size', '10', '--block-size', '4', '--samples', '2',
+                    '--share', '0.5', '--seed', '1', '--output', output]
+            self.assertEqual(main(args), 0)
+            with open(output) as f:
+                results = json.load(f)
+            operations = results['operations']
+            self.assertEqual(operations['put']['count'], 8)
+            for op in ('get_meta', 'list_delimiter', 'access_allowed',
+                       'list_shared', 'copy_tree'):
+                self.assertTrue(op in operations)
+            # The default database and block store are removed
+            self.assertFalse(os.path.exists(results['config']['blocks']))
+
+            self.assertEqual(main(args + ['--compare', output,
+                                          '--threshold', '1000']), 0)
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,49 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pithos.backends.util import BlockCache
+
+import unittest
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_get_put(self):
+        c = BlockCache(10)
+        self.assertEqual(c.get('a'), None)
+        c.put('a', 'aaaa')
+        self.assertEqual(c.get('a'), 'aaaa')
+        stats = c.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['used'], 4)
+
+    def test_lru_eviction(self):
+        c = BlockCache(10)
+        c.put('a', 'aaaa')
+        c.put('b', 'bbbb')
+        c.get('a')  # 'b' is now the least recently used
+        c.put('c', 'cccc')
+        self.assertEqual(c.get('b'), None)
+        self.assertEqual(c.get('a'), 'aaaa')
+        self.assertEqual(c.get('c'), 'cccc')
+        stats = c.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['used'], 8)
+
+    def test_oversized_block(self):
+        c = BlockCache(3)
+        c.put('a', 'aaaa')
+        self.assertEqual(c.get('a'), None)
+        self.assertEqual(c.stats()['used'], 0)
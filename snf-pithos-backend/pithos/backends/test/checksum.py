@@ -0,0 +1,51 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from pithos.backends.random_word import get_random_word
+
+import hashlib
+
+get_random_data = lambda length: get_random_word(length)[:length]
+get_random_name = partial(get_random_word, length=8)
+
+
+class TestChecksumMixin(object):
+    def test_lookup_object_checksum(self):
+        container = get_random_name()
+        t = self.account, self.account, container
+        self.b.put_container(*t)
+
+        obj = get_random_name()
+        data = self.upload_object(*(t + (obj,)))
+        _, size, hashmap = self.b.get_object_hashmap(*(t + (obj,)))
+        self.assertEqual(self.b.lookup_object_checksum(hashmap, size), None)
+
+        checksum = hashlib.md5(data).hexdigest()
+        meta = self.b.get_object_meta(*(t + (obj,)),
+                                      include_user_defined=False)
+        self.b.update_object_checksum(*(t + (obj, meta['version'],
+                                              checksum)))
+        self.assertEqual(self.b.lookup_object_checksum(hashmap, size),
+                         checksum)
+
+        # identical content under another name shares the checksum
+        self.upload_object(*(t + (get_random_name(),)), data=data,
+                           length=len(data))
+        self.assertEqual(self.b.lookup_object_checksum(hashmap, size),
+                         checksum)
+        self.assertEqual(self.b.lookup_object_checksum(hashmap, size + 1),
+                         None)
@@ -0,0 +1,41 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pithos.backends.util import connect_backend
+
+
+class TestDBPoolMixin(object):
+    def test_pooled_connections(self):
+        params = {'pool_size': 1, 'pool_pre_ping': True}
+        backends = [connect_backend(db_connection=self.db_connection,
+                                    db_module=self.db_module,
+                                    db_pool_params=params,
+                                    block_size=self.block_size,
+                                    hash_algorithm=self.hash_algorithm,
+                                    mapfile_prefix=self.mapfile_prefix)
+                    for i in range(2)]
+        engine = backends[0].wrapper.engine
+        try:
+            self.assertTrue(backends[1].wrapper.engine is engine)
+            for b in backends:
+                self.assertEqual(b.list_containers(self.account,
+                                                   self.account), [])
+                # The connection returns to the pool after the transaction.
+                self.assertEqual(b.wrapper._conn, None)
+                self.assertEqual(engine.pool.checkedout(), 0)
+        finally:
+            for b in backends:
+                b.close()
+            engine.dispose()
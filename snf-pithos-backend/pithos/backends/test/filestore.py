@@ -0,0 +1,83 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from binascii import hexlify
+
+from pithos.backends.lib.filestore import Store
+
+from .util import get_random_data
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestFileStore(unittest.TestCase):
+    block_size = 1024
+    hash_algorithm = 'sha256'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='snf_test_pithos_filestore_')
+        self.store = Store(path=self.path, block_size=self.block_size,
+                           hash_algorithm=self.hash_algorithm)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_block_put_get(self):
+        data = get_random_data(self.block_size / 2)
+        h = self.store.block_put(data)
+        self.assertEqual(self.store.block_search([h]), [])
+        block = self.store.block_get(h)
+        self.assertEqual(len(block), self.block_size)
+        self.assertEqual(block.rstrip('\x00'), data)
+        self.assertEqual(self.store.block_get_archipelago(hexlify(h)), block)
+
+        # blocks are sharded by their hash
+        hexhash = hexlify(h)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.path, 'blocks', hexhash[:2], hexhash[2:4], hexhash)))
+
+        # no temporary files are left behind
+        shard = os.path.join(self.path, 'blocks', hexhash[:2], hexhash[2:4])
+        self.assertEqual(os.listdir(shard), [hexhash])
+
+    def test_block_missing(self):
+        h = self.store.blocker.block_hash(get_random_data(10))
+        self.assertEqual(self.store.block_search([h, h]), [h])
+        self.assertEqual(self.store.block_get(h), None)
+
+    def test_empty_block(self):
+        h = self.store.block_put('')
+        self.assertEqual(self.store.block_get(h), '\x00' * self.block_size)
+
+    def test_block_update(self):
+        data = get_random_data(self.block_size)
+        h = self.store.block_put(data)
+        h2 = self.store.block_update(h, 10, 'abc')
+        block = self.store.block_get(h2)
+        self.assertEqual(block, data[:10] + 'abc' + data[13:])
+        self.assertEqual(self.store.block_get(h), data)
+
+    def test_map_put_get(self):
+        hashes = [self.store.block_put(get_random_data(self.block_size))
+                  for i in range(3)]
+        name = 'snf_file_1'
+        self.store.map_put(name, hashes, 3 * self.block_size,
+                           self.block_size)
+        self.assertEqual(self.store.map_get(name, 3 * self.block_size),
+                         [hexlify(h) for h in hashes])
+        self.assertRaises(Exception, self.store.map_get, 'snf_file_2', 0)
@@ -0,0 +1,178 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from pithos.backends.base import NotAllowedError
+from pithos.backends.modular import CLUSTER_DELETED
+from pithos.backends.random_word import get_random_word
+
+get_random_name = partial(get_random_word, length=8)
+
+
+class TestListingMixin(object):
+    def test_list_shared(self):
+        other = get_random_name()
+        containers = sorted(get_random_name() for i in range(3))
+        for c in containers:
+            self.b.put_container(self.account, self.account, c)
+            for i in range(2):
+                self.upload_object(self.account, self.account, c,
+                                   get_random_name(),
+                                   permissions={'read': [other]})
+        private = get_random_name()
+        self.b.put_container(self.account, self.account, private)
+        self.upload_object(self.account, self.account, private,
+                           get_random_name())
+
+        self.assertTrue(self.account in self.b.list_accounts(other))
+        self.assertEqual(self.b.list_containers(other, self.account),
+                         containers)
+        self.assertEqual(self.b.list_containers(self.account, self.account,
+                                                shared=True),
+                         containers)
+        self.assertEqual(self.b.list_containers(other, self.account,
+                                                limit=2),
+                         containers[:2])
+        self.assertEqual(self.b.list_containers(other, self.account,
+                                                marker=containers[0],
+                                                limit=1),
+                         containers[1:2])
+        self.assertEqual(self.b.list_containers(other, self.account,
+                                                marker=containers[-1]),
+                         [])
+
+        self.assertRaises(NotAllowedError, self.b.get_container_meta,
+                          other, self.account, private)
+        self.assertRaises(NotAllowedError, self.b.list_containers,
+                          get_random_name(), self.account)
+
+    def test_list_shared_order(self):
+        other = get_random_name()
+        base = get_random_name()
+        # '-' and '.' sort before '/', so the parts of the paths must be
+        # compared by name, not by full path.
+        containers = [base, base + '-x', base + '.y', base + '0']
+        for c in containers:
+            self.b.put_container(self.account, self.account, c)
+            self.upload_object(self.account, self.account, c, 'o/1',
+                               permissions={'read': [other]})
+
+        owned = self.b.list_containers(self.account, self.account)
+        self.assertEqual(sorted(owned), sorted(containers))
+        self.assertEqual(self.b.list_containers(other, self.account), owned)
+        self.assertEqual(self.b.list_containers(self.account, self.account,
+                                                shared=True),
+                         owned)
+        for i, marker in enumerate(owned):
+            self.assertEqual(self.b.list_containers(other, self.account,
+                                                    marker=marker),
+                             owned[i + 1:])
+            self.assertEqual(self.b.list_containers(other, self.account,
+                                                    marker=marker, limit=1),
+                             owned[i + 1:i + 2])
+
+    def test_list_delimiter(self):
+        container = get_random_name()
+        t = self.account, self.account, container
+        self.b.put_container(*t)
+        names = ['a', 'b/1', 'b/2', 'b/3', 'b/4', 'c/1', 'c/2', 'd', 'e/1',
+                 'f', 'g']
+        for name in names:
+            self.upload_object(*(t + (name,)))
+
+        path, node = self.b._lookup_container(self.account, container)
+        prefix = path + '/'
+        for limit, matches, prefixes in (
+                (1, ['a'], []),
+                (3, ['a', 'd', 'f'], ['b/', 'c/', 'e/']),
+                (10, ['a', 'd', 'f', 'g'], ['b/', 'c/', 'e/'])):
+            objects, common = self.b.node.latest_version_list(
+                node, prefix, '/', limit=limit,
+                except_cluster=CLUSTER_DELETED)
+            self.assertEqual([o[0][len(prefix):] for o in objects], matches)
+            self.assertEqual([p[len(prefix):] for p in common], prefixes)
+
+        self.assertEqual(self.b.list_objects(*t, delimiter='/',
+                                             marker='a', limit=2),
+                         self.b.list_objects(*t, delimiter='/')[1:3])
+
+    def test_get_domain_objects(self):
+        other = get_random_name()
+        container = get_random_name()
+        t = self.account, self.account, container
+        self.b.put_container(*t)
+        shared, private = sorted(get_random_name() for i in range(2))
+        self.upload_object(*(t + (shared,)), permissions={'read': [other]})
+        self.upload_object(*(t + (private,)))
+        for name in (shared, private):
+            self.b.update_object_meta(*(t + (name, 'test', {'key': name})))
+
+        path = lambda name: '/'.join((self.account, container, name))
+        objects = self.b.get_domain_objects('test', other)
+        self.assertEqual([(o[0], o[2]) for o in objects],
+                         [(path(shared), {'read': [other]})])
+        objects = sorted(self.b.get_domain_objects('test', self.account))
+        self.assertEqual([(o[0], o[1]['key'], o[2]) for o in objects],
+                         [(path(shared), shared, {'read': [other]}),
+                          (path(private), private, {})])
+
+    def test_get_domain_objects_query(self):
+        container = get_random_name()
+        t = self.account, self.account, container
+        self.b.put_container(*t)
+        names = [get_random_name() for i in range(3)]
+        for i, (name, key) in enumerate(zip(names, 'cab')):
+            self.upload_object(*(t + (name,)), length=i + 1)
+            meta = {'key': key, 'kind': 'odd' if i % 2 else 'even'}
+            self.b.update_object_meta(*(t + (name, 'test', meta)))
+
+        def query(**kwargs):
+            objects = self.b.get_domain_objects('test', self.account,
+                                                **kwargs)
+            return [o[0].rsplit('/', 1)[1] for o in objects]
+
+        self.assertEqual(query(sort_key='key'),
+                         [names[1], names[2], names[0]])
+        self.assertEqual(query(sort_key='key', reverse=True),
+                         [names[0], names[2], names[1]])
+        self.assertEqual(query(sort_key='size', reverse=True),
+                         [names[2], names[1], names[0]])
+        self.assertEqual(query(filterq=[('kind', 'even')], sort_key='key'),
+                         [names[2], names[0]])
+        self.assertEqual(query(sizeq=(2, 3), sort_key='key'), [names[1]])
+        self.assertEqual(query(available=False), [])
+
+        uuid = lambda name: self.b.get_object_meta(
+            *(t + (name, 'test')))['uuid']
+        self.assertEqual(query(sort_key='key', marker=uuid(names[1]),
+                               limit=1), [names[2]])
+        self.assertEqual(query(sort_key='key', reverse=True,
+                               marker=uuid(names[2])), [names[1]])
+        self.assertRaises(ValueError, query, sort_key='key',
+                          marker=get_random_name())
+
+        # Objects without the attribute are ordered by their mtime
+        others = [get_random_name() for i in range(3)]
+        for name, key in zip(others, ('0', None, 'a')):
+            self.upload_object(*(t + (name,)))
+            meta = {'kind': 'other'}
+            if key is not None:
+                meta['key'] = key
+            self.b.update_object_meta(*(t + (name, 'test', meta)))
+        self.assertEqual(query(filterq=[('kind', 'other')], sort_key='key'),
+                         others)
+        self.assertEqual(query(filterq=[('kind', 'other')], sort_key='key',
+                               marker=uuid(others[0])), others[1:])
@@ -0,0 +1,159 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from mock import patch
+
+from pithos.backends.base import NotAllowedError
+from pithos.backends.random_word import get_random_word
+from pithos.backends.util import PermissionsCache
+
+get_random_name = partial(get_random_word, length=8)
+
+
+class TestPermissionsMixin(object):
+    def _shared_object(self):
+        container, obj = get_random_name(), get_random_name()
+        t = self.account, self.account, container, obj
+        self.b.put_container(*t[:3])
+        self.upload_object(*t)
+        return t
+
+    def test_access_check_group(self):
+        t = self._shared_object()
+        member = get_random_name()
+        self.b.update_account_groups(self.account, self.account,
+                                     {'group': [member]})
+        self.b.update_object_permissions(
+            *(t + ({'read': [self.account + ':group']},)))
+        args = (member,) + t[1:] + ('test',)
+        read = lambda: self.b.get_object_meta(*args)
+        self.assertEqual(read()['name'], t[3])
+
+        self.b.update_account_groups(self.account, self.account, {},
+                                     replace=True)
+        self.assertRaises(NotAllowedError, read)
+
+    def test_permissions_cache(self):
+        cache = PermissionsCache(100)
+        self.b.permissions.xfeature_cache = cache
+        t = self._shared_object()
+        member = get_random_name()
+        self.b.update_object_permissions(*(t + ({'read': [member]},)))
+        args = (member,) + t[1:] + ('test',)
+        read = lambda: self.b.get_object_meta(*args)
+        read()
+        read()
+        self.assertTrue(cache.stats()['hits'] > 0)
+
+        # A change invalidates the cache.
+        self.b.update_object_permissions(*(t + ({},)))
+        self.assertRaises(NotAllowedError, read)
+        self.assertTrue(cache.stats()['invalidations'] > 0)
+
+        cache.put('path', {}, cache.version + 1)
+        self.assertEqual(cache.get('path', cache.version - 1), (False, None))
+        self.assertEqual(cache.get('path', cache.version), (True, {}))
+
+    def test_permissions_version(self):
+        p = self.b.permissions
+        version = p.xfeature_version()
+        # Without a shared cache, changes do not touch the version.
+        t = self._shared_object()
+        self.b.update_object_permissions(*(t + ({'read': ['*']},)))
+        self.assertEqual(p.xfeature_version(), version)
+
+        p.xfeature_cache = PermissionsCache(100)
+        # Deleting an object without permissions changes nothing.
+        u = self._shared_object()
+        self.b.delete_object(*u)
+        self.assertEqual(p.xfeature_version(), version)
+        self.b.update_object_permissions(*(t + ({},)))
+        self.assertTrue(p.xfeature_version() > version)
+
+    def test_access_list_paths(self):
+        container = get_random_name()
+        t = self.account, self.account, container
+        self.b.put_container(*t)
+        member = get_random_name()
+        self.b.update_account_groups(self.account, self.account,
+                                     {'group': [member]})
+        names = sorted(get_random_name() for i in range(4))
+        grants = [[member], [self.account + ':group'], ['*'],
+                  [get_random_name()]]
+        for name, grant in zip(names, grants):
+            self.upload_object(*(t + (name,)))
+            self.b.update_object_permissions(*(t + (name, {'read': grant})))
+
+        path = lambda name: '/'.join(t[1:] + (name,))
+        prefix = path('')
+        p = self.b.permissions
+        self.assertEqual(sorted(p.access_list_paths(member, prefix)),
+                         map(path, names[:3]))
+        self.assertEqual(p.access_list_paths(member, prefix,
+                                             marker=path(names[0]), limit=1),
+                         [path(names[1])])
+        self.assertEqual(p.access_list_shared(prefix, marker=path(names[1])),
+                         map(path, names[2:]))
+
+        self.b.update_object_permissions(*(t + (names[0], {})))
+        self.b.delete_object(*(t + (names[1],)))
+        self.assertEqual(p.access_list_paths(member, prefix),
+                         [path(names[2])])
+
+    @patch('pithos.backends.lib.sqlite.permissions.MAX_VARIABLES', 2)
+    def test_access_get_bulk(self):
+        container = get_random_name()
+        t = self.account, self.account, container
+        self.b.put_container(*t)
+        members = sorted(get_random_name() for i in range(2))
+        names = sorted(get_random_name() for i in range(5))
+        grants = {}
+        for i, name in enumerate(names[:4]):
+            self.upload_object(*(t + (name,)))
+            grants[name] = {'read': members[:i % 2 + 1]}
+            if i == 3:
+                grants[name]['write'] = [members[0]]
+            self.b.update_object_permissions(*(t + (name, grants[name])))
+        self.upload_object(*(t + (names[4],)))
+
+        path = lambda name: '/'.join(t[1:] + (name,))
+        p = self.b.permissions
+        perms = p.access_get_bulk(map(path, names))
+        self.assertEqual(sorted(perms), map(path, names[:4]))
+        for name, grant in grants.iteritems():
+            self.assertEqual(
+                dict((k, sorted(v)) for k, v in perms[path(name)].items()),
+                grant)
+        self.assertEqual(p.access_get_bulk([]), {})
+
+    @patch('pithos.backends.lib.sqlite.permissions.MAX_VARIABLES', 2)
+    def test_access_clear_bulk(self):
+        container = get_random_name()
+        t = self.account, self.account, container
+        self.b.put_container(*t)
+        member = get_random_name()
+        names = sorted(get_random_name() for i in range(5))
+        for name in names:
+            self.upload_object(*(t + (name,)))
+            self.b.update_object_permissions(*(t + (name,
+                                                    {'read': [member]})))
+
+        path = lambda name: '/'.join(t[1:] + (name,))
+        p = self.b.permissions
+        p.access_clear_bulk(map(path, names[:4]))
+        self.assertEqual(p.access_list_paths(member, path('')),
+                         [path(names[4])])
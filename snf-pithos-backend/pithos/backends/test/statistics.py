@@ -0,0 +1,184 @@
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+from time import time
+
+from mock import patch
+
+from pithos.backends.modular import CLUSTER_NORMAL, CLUSTER_HISTORY
+from pithos.backends.random_word import get_random_word
+
+get_random_name = partial(get_random_word, length=8)
+
+
+def bulk_limits(f):
+    """Process the objects in more than one batch, and the SQLite
+       statements in more than one chunk.
+    """
+
+    f = patch('pithos.backends.modular.BULK_OPERATION_SIZE', 2)(f)
+    max_variables = 'pithos.backends.lib.sqlite.%s.MAX_VARIABLES'
+    f = patch(max_variables % 'node', 3)(f)
+    for module in ('permissions', 'xfeatures', 'public'):
+        f = patch(max_variables % module, 1)(f)
+    return f
+
+
+class TestStatisticsMixin(object):
+    def test_statistics_update_ancestors(self):
+        account = get_random_name()
+        containers = [get_random_name() for i in range(2)]
+        t = account, account
+        sizes = {}
+        for c in containers:
+            self.b.put_container(*(t + (c,)))
+            for i in range(2):
+                obj = get_random_name()
+                data = self.upload_object(*(t + (c, obj)))
+                sizes[c, obj] = len(data)
+        total = lambda c=None: sum(v for k, v in sizes.iteritems()
+                                   if c in (None, k[0]))
+
+        node = self.b.node
+        get = lambda n: tuple(node.statistics_get(n, CLUSTER_NORMAL)[:2])
+        account_node = self.b._lookup_account(account)[1]
+        path, container_node = self.b._lookup_container(account,
+                                                        containers[0])
+        ancestors = node.node_get_ancestors(container_node)
+        self.assertEqual(len(ancestors), 2)
+        self.assertEqual(ancestors[0], account_node)
+        self.assertEqual(node.node_get_ancestors(container_node, 1),
+                         [account_node])
+        self.assertEqual(get(container_node), (2, total(containers[0])))
+        self.assertEqual(get(account_node)[1], total())
+        self.assertEqual(
+            [x[1:4] for x in node.statistics_compute(account_node)],
+            sorted(('/'.join((account, c)), 2, total(c))
+                   for c in containers))
+
+        obj = self.b.list_objects(*(t + (containers[0],)))[0][0]
+        self.b.delete_object(*(t + (containers[0], obj)))
+        del sizes[containers[0], obj]
+        self.assertEqual(get(container_node), (1, total(containers[0])))
+        self.assertEqual(get(account_node)[1], total())
+
+        # update all the ancestors of an object
+        obj = self.b.list_objects(*(t + (containers[0],)))[0][0]
+        path, obj_node = self.b._lookup_object(account, containers[0], obj)
+        prepopulation, presize = get(account_node)
+        node.statistics_update_ancestors(obj_node, 1, 10, time(),
+                                         CLUSTER_NORMAL)
+        self.assertEqual(get(container_node), (2, total(containers[0]) + 10))
+        self.assertEqual(get(account_node), (prepopulation, presize + 10))
+        node.statistics_update_ancestors(obj_node, -3, -10, time(),
+                                         CLUSTER_NORMAL)
+        self.assertEqual(get(container_node), (0, total(containers[0])))
+        self.assertEqual(get(account_node), (prepopulation, presize))
+
+        for c in containers:
+            self.b.delete_container(*(t + (c,)), delimiter='/')
+            self.b.delete_container(*(t + (c,)))
+
+    @bulk_limits
+    def test_statistics_bulk_operations(self):
+        self._test_statistics_bulk_operations()
+
+    @bulk_limits
+    def test_statistics_bulk_operations_without_versioning(self):
+        self._test_statistics_bulk_operations({'versioning': 'none'})
+
+    def _test_statistics_bulk_operations(self, policy=None):
+        account = get_random_name()
+        container = get_random_name()
+        t = account, account, container
+        self.b.put_container(*t, policy=policy)
+        folder = get_random_name()
+        self.create_folder(*(t + (folder,)))
+        objects = ['/'.join((folder, get_random_name())) for i in range(3)]
+        size = sum(len(self.upload_object(*(t + (obj,)))) for obj in objects)
+        self.b.update_object_meta(*(t + (objects[0], 'test', {'k': 'v'})))
+
+        node = self.b.node
+        path, container_node = self.b._lookup_container(account, container)
+        account_node = self.b._lookup_account(account)[1]
+        get = lambda n: tuple(node.statistics_get(n, CLUSTER_NORMAL)[:2])
+        history = lambda n: (node.statistics_get(n, CLUSTER_HISTORY) or
+                             (0,))[0]
+        self.assertEqual(get(container_node), (4, size))
+
+        copy = get_random_name()
+        self.b.copy_object(*(t + (folder, account, container, copy,
+                                  'application/directory', 'test')),
+                           delimiter='/')
+        self.assertEqual(get(container_node), (8, 2 * size))
+        self.assertEqual(get(account_node)[1], 2 * size)
+        name = objects[0].replace(folder, copy, 1)
+        self.assertEqual(
+            self.b.get_object_meta(*(t + (name, 'test')))['k'], 'v')
+        self.assertNotEqual(
+            self.b.get_object_meta(*(t + (name, 'test')))['uuid'],
+            self.b.get_object_meta(*(t + (objects[0], 'test')))['uuid'])
+
+        # Copy over the existing copies
+        self.b.copy_object(*(t + (folder, account, container, copy,
+                                  'application/directory', 'test')),
+                           delimiter='/')
+        self.assertEqual(get(container_node), (8, 2 * size))
+        self.assertEqual(get(account_node)[1], 2 * size)
+        self.assertEqual(len(self.b.list_objects(*t, prefix=copy)), 4)
+
+        moved = get_random_name()
+        self.b.move_object(*(t + (copy, account, container, moved,
+                                  'application/directory', 'test')),
+                           delimiter='/')
+        self.assertEqual(get(container_node), (8, 2 * size))
+        name = objects[0].replace(folder, moved, 1)
+        self.assertEqual(
+            self.b.get_object_meta(*(t + (name, 'test')))['k'], 'v')
+        self.assertEqual(self.b.list_objects(*t, prefix=copy), [])
+
+        # Share and publish the objects to delete
+        member = get_random_name()
+        paths = []
+        for obj in objects:
+            name = obj.replace(folder, moved, 1)
+            self.b.update_object_permissions(*(t + (name,
+                                                    {'read': [member]})))
+            self.b.update_object_public(*(t + (name, True)))
+            paths.append('/'.join((account, container, name)))
+        p = self.b.permissions
+        prefix = '/'.join((account, container, moved))
+        self.assertEqual(sorted(p.access_list_paths(member, prefix)),
+                         sorted(paths))
+
+        self.b.delete_object(*(t + (moved,)), delimiter='/')
+        self.assertEqual(p.access_list_paths(member, prefix), [])
+        self.assertEqual(p.xfeature_lookup(paths),
+                         dict.fromkeys(paths))
+        self.assertEqual([p.public_get(path) for path in paths],
+                         [None] * 3)
+        self.assertEqual(get(container_node), (4, size))
+        self.assertEqual(get(account_node)[1], size)
+        self.assertEqual(self.b.list_objects(*t, prefix=moved), [])
+        self.assertEqual(len(self.b.list_objects(*t, prefix=folder)), 4)
+        if policy:
+            # The previous versions are removed
+            self.assertEqual(history(container_node), 0)
+        else:
+            self.assertEqual(history(container_node), 13)
+
+        self.b.delete_container(*t, delimiter='/')
+        self.b.delete_container(*t)
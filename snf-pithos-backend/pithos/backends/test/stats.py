@@ -0,0 +1,70 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Thread
+
+from pithos.backends.util import connect_backend, OperationStats
+
+from .util import get_random_data
+
+
+class TestRequestStatsMixin(object):
+    def test_request_stats(self):
+        b = connect_backend(db_connection=self.db_connection,
+                            db_module=self.db_module,
+                            block_size=self.block_size,
+                            hash_algorithm=self.hash_algorithm,
+                            mapfile_prefix=self.mapfile_prefix,
+                            request_stats=True)
+        try:
+            account = self.account
+            b.put_container(account, account, 'stats')
+            self.assertTrue(b.stats.counts['sql'] > 0)
+
+            b.stats.reset()
+            data = get_random_data(self.block_size)
+            hashmap = [b.put_block(data)]
+            self.assertEqual(b.stats.summary().keys(), ['block'])
+            self.assertEqual(b.stats.counts['block'], 1)
+
+            b.stats.reset()
+            b.update_object_hashmap(account, account, 'stats', 'o',
+                                    len(data), 'application/octet-stream',
+                                    hashmap, checksum='', domain='pithos')
+            summary = b.stats.summary()
+            self.assertTrue(summary['sql']['count'] > 0)
+            self.assertTrue(summary['sql']['time'] >= 0)
+            self.assertEqual(summary['block']['count'], 1)  # block search
+            self.assertEqual(summary['map']['count'], 1)  # map put
+
+            b.stats.reset()
+            self.assertEqual(b.stats.summary(), {})
+        finally:
+            b.close()
+
+    def test_request_stats_threads(self):
+        stats = OperationStats()
+
+        def add():
+            for i in xrange(1000):
+                stats.add('block', 0.5)
+
+        threads = [Thread(target=add) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(stats.summary(),
+                         {'block': {'count': 8000, 'time': 4000.0}})
@@ -0,0 +1,49 @@
+# Copyright (C) 2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Event
+
+from pithos.backends.util import WorkerPool
+
+import unittest
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_submit(self):
+        pool = WorkerPool(2)
+        tasks = [pool.submit(pow, 2, i) for i in range(10)]
+        self.assertEqual([t.result() for t in tasks],
+                         [2 ** i for i in range(10)])
+        task = pool.submit(int, 'x')
+        self.assertRaises(ValueError, task.result)
+
+    def test_cancel(self):
+        pool = WorkerPool(1)
+        started = Event()
+        release = Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        blocking = pool.submit(block)
+        started.wait()
+        calls = []
+        task = pool.submit(calls.append, 1)
+        task.cancel()
+        release.set()
+        self.assertEqual(task.result(), None)
+        self.assertEqual(calls, [])
+        self.assertTrue(blocking.done())
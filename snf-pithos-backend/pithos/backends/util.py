@@ -13,9 +13,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import sys
+
 from objpool import ObjectPool
 from new import instancemethod
 from select import select
+from threading import Thread, Event, Lock
+from Queue import Queue
+from collections import OrderedDict, defaultdict
+from time import time
 from traceback import print_exc
 from pithos.backends import connect_backend
 
@@ -24,7 +30,9 @@ USAGE_LIMIT = 500
 
 class PithosBackendPool(ObjectPool):
     def __init__(self, size=None, db_module=None, db_connection=None,
+                 db_pool_params=None,
                  block_module=None, block_size=None, hash_algorithm=None,
+                 block_cache_size=None, permissions_cache_size=None,
                  queue_module=None, queue_hosts=None,
                  queue_exchange=None, free_versioning=True,
                  astakos_auth_url=None, service_token=None,
@@ -38,13 +46,17 @@ class PithosBackendPool(ObjectPool):
                  archipelago_conf_file=None,
                  xseg_pool_size=8,
                  map_check_interval=None,
-                 mapfile_prefix=None):
+                 mapfile_prefix=None,
+                 request_stats=False):
         super(PithosBackendPool, self).__init__(size=size)
         self.db_module = db_module
         self.db_connection = db_connection
+        self.db_pool_params = db_pool_params
         self.block_module = block_module
         self.block_size = block_size
         self.hash_algorithm = hash_algorithm
+        self.block_cache_size = block_cache_size
+        self.permissions_cache_size = permissions_cache_size
         self.queue_module = queue_module
         self.block_params = block_params
         self.queue_hosts = queue_hosts
@@ -62,14 +74,18 @@ class PithosBackendPool(ObjectPool):
         self.xseg_pool_size = xseg_pool_size
         self.map_check_interval = map_check_interval
         self.mapfile_prefix = mapfile_prefix
+        self.request_stats = request_stats
 
     def _pool_create(self):
         backend = connect_backend(
             db_module=self.db_module,
             db_connection=self.db_connection,
+            db_pool_params=self.db_pool_params,
             block_module=self.block_module,
             block_size=self.block_size,
             hash_algorithm=self.hash_algorithm,
+            block_cache_size=self.block_cache_size,
+            permissions_cache_size=self.permissions_cache_size,
             queue_module=self.queue_module,
             block_params=self.block_params,
             queue_hosts=self.queue_hosts,
@@ -86,7 +102,8 @@ class PithosBackendPool(ObjectPool):
             archipelago_conf_file=self.archipelago_conf_file,
             xseg_pool_size=self.xseg_pool_size,
             map_check_interval=self.map_check_interval,
-            mapfile_prefix=self.mapfile_prefix)
+            mapfile_prefix=self.mapfile_prefix,
+            request_stats=self.request_stats)
 
         backend._real_close = backend.close
         backend.close = instancemethod(_pooled_backend_close, backend,
@@ -98,6 +115,9 @@ class PithosBackendPool(ObjectPool):
 
     def _pool_verify(self, backend):
         wrapper = backend.wrapper
+        if wrapper.pooled:
+            # Connections are checked out (and tested) per transaction.
+            return True
         conn = wrapper.conn
         if conn.closed:
             return False
@@ -151,3 +171,248 @@ class PithosBackendPool(ObjectPool):
 
 def _pooled_backend_close(backend):
     backend._pool.pool_put(backend)
+
+
+class WorkerTask(object):
+    """The pending result of a call submitted to a WorkerPool."""
+
+    __slots__ = ("func", "args", "_done", "_result", "_exc_info",
+                 "_cancelled")
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self._done = Event()
+        self._result = None
+        self._exc_info = None
+        self._cancelled = False
+
+    def run(self):
+        if self._cancelled:
+            self._done.set()
+            return
+        try:
+            self._result = self.func(*self.args)
+        except:
+            self._exc_info = sys.exc_info()
+        finally:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """Skip the call, if it has not started yet.
+           The result of a skipped call is None.
+        """
+        self._cancelled = True
+
+    def result(self):
+        """Wait for the call to complete and return its result,
+           or re-raise the exception it raised.
+        """
+        self._done.wait()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+class WorkerPool(object):
+    """A fixed number of daemon threads executing submitted calls.
+
+    Threads are started lazily on the first submission, so that a pool
+    created at import time picks up any later monkey patching (e.g. by
+    the gevent workers).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._queue = None
+        self._lock = Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._queue is not None:
+                return
+            queue = Queue()
+            for i in xrange(self.size):
+                t = Thread(target=self._work, args=(queue,))
+                t.daemon = True
+                t.start()
+            self._queue = queue
+
+    @staticmethod
+    def _work(queue):
+        while True:
+            queue.get().run()
+
+    def submit(self, func, *args):
+        """Schedule func(*args) and return a WorkerTask for its result."""
+        if self._queue is None:
+            self._start()
+        task = WorkerTask(func, args)
+        self._queue.put(task)
+        return task
+
+
+class BlockCache(object):
+    """A thread-safe LRU cache of blocks, keyed by their hash.
+
+    Blocks are immutable by hash, so entries never have to be invalidated.
+    The cache holds at most size bytes of block data.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._blocks = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, hash):
+        with self._lock:
+            block = self._blocks.pop(hash, None)
+            if block is None:
+                self.misses += 1
+                return None
+            self._blocks[hash] = block  # move to the most recent end
+            self.hits += 1
+            return block
+
+    def put(self, hash, block):
+        length = len(block)
+        if length > self.size:
+            return
+        with self._lock:
+            old = self._blocks.pop(hash, None)
+            if old is not None:
+                self.used -= len(old)
+            while self._blocks and self.used + length > self.size:
+                _, evicted = self._blocks.popitem(last=False)
+                self.used -= len(evicted)
+                self.evictions += 1
+            self._blocks[hash] = block
+            self.used += length
+
+    def stats(self):
+        with self._lock:
+            return {'size': self.size,
+                    'used': self.used,
+                    'blocks': len(self._blocks),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+class PermissionsCache(object):
+    """A thread-safe LRU cache of path permissions.
+
+    Entries are stamped with the permissions version of the database when
+    they were read. A newer version invalidates the whole cache and lookups
+    with an older version are missed. The cache holds at most size paths.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._paths = OrderedDict()
+        self._lock = Lock()
+
+    def _check_version(self, version):
+        if self.version is None or version > self.version:
+            if self._paths:
+                self._paths.clear()
+                self.invalidations += 1
+            self.version = version
+        return version == self.version
+
+    def get(self, path, version):
+        """Return a (found, value) tuple for path."""
+        with self._lock:
+            if not self._check_version(version) or path not in self._paths:
+                self.misses += 1
+                return False, None
+            value = self._paths.pop(path)
+            self._paths[path] = value  # move to the most recent end
+            self.hits += 1
+            return True, value
+
+    def put(self, path, value, version):
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._paths.pop(path, None)
+            while len(self._paths) >= self.size:
+                self._paths.popitem(last=False)
+            self._paths[path] = value
+
+    def stats(self):
+        with self._lock:
+            return {'size': self.size,
+                    'paths': len(self._paths),
+                    'version': self.version,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'invalidations': self.invalidations}
+
+
+class OperationStats(object):
+    """Counters and timings of the database and block store operations
+       of a backend, grouped by kind (e.g. 'sql', 'block', 'map').
+
+    The block store operations of a request may run in worker threads
+    (e.g. when prefetching or uploading blocks), so the counters are
+    updated under a lock.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.times = defaultdict(float)
+        self._lock = Lock()
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.times.clear()
+
+    def add(self, kind, elapsed):
+        with self._lock:
+            self.counts[kind] += 1
+            self.times[kind] += elapsed
+
+    def timed(self, kind, func):
+        """Return func, accounting its calls to kind."""
+        def timed_func(*args, **kwargs):
+            start = time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(kind, time() - start)
+        return timed_func
+
+    def summary(self):
+        with self._lock:
+            return dict((kind, {'count': count, 'time': self.times[kind]})
+                        for kind, count in self.counts.iteritems())
+
+
+class InstrumentedStore(object):
+    """A block store proxy accounting the block and map operations."""
+
+    def __init__(self, store, stats):
+        self.store = store
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        kind = 'map' if name.startswith('map_') else 'block'
+        attr = self.stats.timed(kind, attr)
+        setattr(self, name, attr)  # skip the lookup next time
+        return attr
@@ -175,7 +175,8 @@ setup(
 
     entry_points={
         'console_scripts': [
-            'pithos-migrate = pithos.backends.migrate:main'
+            'pithos-migrate = pithos.backends.migrate:main',
+            'pithos-benchmark = pithos.backends.benchmark:main'
         ],
     },
 )